@@ -1 +1,97 @@
-MODEL_PATH = 'model.pt'
\ No newline at end of file
+import os
+
+MODEL_PATH = 'model.pt'
+
+# Micro-batching of concurrent predict_anomaly calls
+BATCH_MAX_SIZE = 64       # Max requests scored in one forward pass
+BATCH_MAX_WAIT_MS = 2.0   # Max time the first request waits for company
+
+# Memoized scores for repeated feature vectors, e.g. steady telemetry from idle hosts
+SCORE_CACHE_ENABLED = False
+SCORE_CACHE_SIZE = 100000       # Cached vectors; least recently used are evicted first
+SCORE_CACHE_TTL_SECONDS = 300   # Entries older than this are rescored; None keeps them until reload
+SCORE_CACHE_PRECISION = 1e-3    # Vectors equal after rounding every feature to this step share a score
+SCORE_CACHE_MAX_BATCH_ROWS = 4096  # Bigger bulk batches bypass the cache
+
+# Bulk scoring via /predict-anomaly/batch/
+MAX_BATCH_ROWS = 100000   # Largest N x D matrix accepted per request
+
+# Dedicated inference pool keeping torch off the event loop
+INFERENCE_EXECUTOR = "thread"   # "thread" or "process"
+INFERENCE_WORKERS = 1           # Pool size
+TORCH_NUM_THREADS = 1           # Pinned torch intra-op threads per worker
+
+# Scoring runtime: "torch", "torchscript", "quantized", "numpy" or "auto"
+INFERENCE_BACKEND = "auto"
+
+# Per-source models: models/<source>.pt, else models/<group>.pt, else MODEL_PATH
+SOURCE_MODELS_DIR = "models"
+SOURCE_GROUPS = {}              # fnmatch pattern -> group, e.g. {"web-*": "web"}; first match wins
+MODEL_CACHE_BYTES = 256 * 1024 * 1024  # Memory budget for loaded per-source models
+
+# Anomaly threshold: a fixed cutoff, or a streaming percentile of observed scores
+ANOMALY_THRESHOLD = 0.05        # Used until the estimator warms up, or always if not adaptive
+ADAPTIVE_THRESHOLD = True
+THRESHOLD_PERCENTILE = 99.0     # Scores above this percentile are anomalous
+HIGH_SCORE_PERCENTILE = 99.9    # Scores above this percentile raise HIGH_ANOMALY_SCORE
+THRESHOLD_MIN_SAMPLES = 100     # Scores observed before the percentile is trusted
+THRESHOLD_MAX_BATCH_UPDATES = 1024  # Bulk batches feed an evenly strided sample of this size
+
+# Per-client WebSocket send queues
+WS_SEND_QUEUE_SIZE = 256        # Messages buffered per client before the drop policy applies
+WS_DROP_POLICY = "drop_oldest"  # "drop_oldest", "coalesce" or "disconnect"
+WS_SEND_TIMEOUT = 5.0           # Seconds a single send may take before the client is dropped
+
+# Dashboard stream topics and prediction coalescing
+TOPICS = ("alerts", "predictions", "stats", "status")
+STREAM_TICK_MS = 250            # Predictions are flushed as one batched frame per tick
+STREAM_TICK_MAX_ITEMS = 500     # Items kept per frame; older ones are counted as skipped
+
+# Server-side rollups of prediction counts, anomaly rate and score percentiles
+ROLLUP_RESOLUTIONS = ((1, 300), (10, 360), (60, 1440))  # (bucket seconds, buckets kept): 5 min, 1 h, 1 day
+ROLLUP_SCORE_RANGE = (1e-4, 1e4)  # Score histogram range; percentiles are exact to one bin
+ROLLUP_BINS_PER_DECADE = 10
+
+# Alerting windows
+ALERT_TIME_WINDOW_SECONDS = 60  # Trailing window for time-based alert rules and stats
+ALERT_COOLDOWN_SECONDS = 30     # Default minimum gap between two alerts with the same dedup key
+ALERT_STORM_THRESHOLD = 20      # Rule hits within the storm window that switch to storm mode
+ALERT_STORM_WINDOW_SECONDS = 10
+ALERT_MAX_SOURCES = 1000        # Per-source alert windows kept; least recently seen are dropped
+
+# Agent ingestion over the /ws/ingest WebSocket
+AGENT_MAX_IN_FLIGHT = 4         # Scoring batches pipelined per connection
+AGENT_MAX_BATCH_ROWS = 1024     # Queued frames coalesced into one scoring batch, up to this many rows
+AGENT_WINDOW_ROWS = 8192        # Unacknowledged rows per connection before its socket stops being read
+AGENT_ACK_INTERVAL_MS = 50      # Minimum gap between two reply frames to one agent
+
+# Log ingestion for the real-time streamer
+FEATURE_NAMES = ("CPU", "Memory", "Disk", "Network", "ProcessCount")
+INGEST_QUEUE_BATCHES = 64       # Parsed batches buffered between a source and the scorer
+INGEST_BATCH_SIZE = 256         # Max log entries parsed and scored together
+INGEST_POLL_INTERVAL = 0.5      # Seconds between checks for new lines in tailed files
+SIMULATED_INTERVAL = 1.0        # Seconds between simulated log entries
+SYSLOG_HOST = "127.0.0.1"
+SYSLOG_PORT = 5140
+
+# SHAP explanations of flagged anomalies, computed off the request path
+EXPLAIN_ENABLED = True
+EXPLAIN_WORKERS = 1             # Explainer processes
+EXPLAIN_MAX_PENDING = 8         # Explanations in flight; further anomalies are skipped
+EXPLAIN_BACKGROUND_PATH = "data/logs.csv"  # Reference rows; all-zero if missing
+EXPLAIN_BACKGROUND_SIZE = 50    # Reference rows sampled from that file
+EXPLAIN_NSAMPLES = 200          # KernelExplainer evaluations per explanation
+
+# Durable prediction and alert history (SQLite in WAL mode)
+STORE_ENABLED = True
+STORE_PATH = os.getenv("ZTA_STORE_PATH", "data/events.db")
+STORE_FLUSH_INTERVAL = 0.5      # Seconds between batched writes
+STORE_FLUSH_ROWS = 5000         # Buffered predictions that trigger an early write
+STORE_MAX_PENDING = 200000      # Unwritten predictions kept before the oldest are dropped
+STORE_RETENTION_SECONDS = 7 * 24 * 3600  # Rows older than this are pruned; None keeps everything
+
+# Multiple uvicorn workers share broadcasts and alert state over a UNIX socket
+WORKERS = int(os.getenv("ZTA_WORKERS", "1")) or os.cpu_count() or 1  # 0 = one per core
+PUBSUB_ENABLED = WORKERS > 1
+PUBSUB_SOCKET = os.getenv("ZTA_PUBSUB_SOCKET", "/tmp/zta-atds.sock")
+PUBSUB_MAX_BUFFER = 4 * 1024 * 1024  # Bytes queued for one worker before the broker drops its frames
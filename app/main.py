@@ -1,11 +1,10 @@
+from typing import Optional
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from app.routes import anomaly
+from app.utils.agent_ingest import agents
 from app.utils.connection_manager import manager
-import asyncio
-import json
-from typing import List
 
 app = FastAPI(title="ZTA-ATDS API")
 
@@ -25,32 +24,67 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_text()
-            # Echo back for testing
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            # Topic subscription requests, e.g. {"action": "subscribe", "topics": ["alerts"]}
+            reply = manager.handle_client_message(websocket, data)
+            if reply is None:
+                # Echo back for testing
+                reply = f"Message received: {data}"
+            await manager.send_personal_message(reply, websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also reached when the manager dropped a slow client and closed its socket
         manager.disconnect(websocket)
 
+@app.websocket("/ws/ingest")
+async def ingest_endpoint(websocket: WebSocket, source: Optional[str] = None, mode: str = "ack"):
+    # Agents stream feature rows in and get batched acks ("ack") or scores ("results") back
+    await agents.serve(websocket, source, mode)
+
 # Background task for real-time monitoring
 @app.on_event("startup")
 async def startup_event():
-    # Start background monitoring task
-    asyncio.create_task(background_monitoring())
+    # With several workers, join the others before anything is broadcast
+    from app.utils.pubsub import start_pubsub
+    
+    await start_pubsub()
     
     # Start alerting system only (streaming will be controlled by user)
     from app.utils.alerting import start_alerting
     
-    asyncio.create_task(start_alerting())
-
-async def background_monitoring():
-    """Background task for continuous monitoring"""
-    while True:
-        # Simulate real-time data processing
-        await asyncio.sleep(5)  # Check every 5 seconds
-        # In a real implementation, this would process actual log data
-        monitoring_data = {
-            "timestamp": asyncio.get_event_loop().time(),
-            "status": "monitoring",
-            "processed_logs": 0,
-            "anomalies_detected": 0
-        }
-        await manager.broadcast(json.dumps(monitoring_data))
\ No newline at end of file
+    await start_alerting()
+    
+    # Prediction and alert history survives restarts
+    from app.utils.storage import start_event_store
+    
+    await start_event_store()
+    
+    # Periodic jobs: rollup deltas, alert summaries, stats; each also samples event loop lag
+    from app.utils.scheduler import start_scheduler
+    
+    await start_scheduler()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Periodic jobs and background tasks, including a running streamer, go first
+    from app.utils.scheduler import stop_scheduler
+    
+    await stop_scheduler()
+    
+    # Let in-flight inference finish before the pool goes away
+    from app.utils.inference_executor import shutdown_inference_executor
+    
+    shutdown_inference_executor()
+    
+    from app.utils.attribution import shutdown_explainer
+    
+    shutdown_explainer()
+    
+    # Write out buffered history before exiting
+    from app.utils.storage import stop_event_store
+    
+    await stop_event_store()
+    
+    from app.utils.pubsub import stop_pubsub
+    
+    await stop_pubsub()
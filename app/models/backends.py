@@ -0,0 +1,131 @@
+import time
+import warnings
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import torch
+import torch.nn as nn
+from app.models.autoencoder import LogAutoEncoder
+
+class InferenceBackend:
+    """Reconstructs N x D float32 batches with a particular runtime"""
+    
+    name = "base"
+    scale: Optional[np.ndarray] = None
+    offset: Optional[np.ndarray] = None
+    
+    def set_scaler(self, scale: np.ndarray, offset: np.ndarray):
+        """Normalize raw features as x * scale + offset before scoring"""
+        self.scale = scale
+        self.offset = offset
+    
+    def reconstruct(self, x: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+    
+    def feature_errors(self, x: np.ndarray) -> np.ndarray:
+        """N x D squared reconstruction error of each feature"""
+        if self.scale is not None:
+            # One fused affine pass over the whole batch
+            x = x * self.scale + self.offset
+        recon = self.reconstruct(x)
+        return (x - recon) ** 2
+    
+    def score(self, x: np.ndarray) -> np.ndarray:
+        """Per-row mean squared reconstruction error"""
+        return self.feature_errors(x).mean(axis=1)
+
+class TorchBackend(InferenceBackend):
+    """Eager PyTorch forward pass"""
+    
+    name = "torch"
+    
+    def __init__(self, model: LogAutoEncoder):
+        self.model = model
+    
+    def reconstruct(self, x: np.ndarray) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(torch.from_numpy(x)).numpy()
+
+class ScriptedBackend(TorchBackend):
+    """Traced and frozen TorchScript graph, optionally int8 dynamically quantized"""
+    
+    def __init__(self, model: LogAutoEncoder, quantize: bool = False):
+        self.name = "quantized" if quantize else "torchscript"
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        example = torch.zeros(1, model.encoder[0].in_features)
+        with torch.no_grad(), warnings.catch_warnings():
+            # Newer torch releases flag TorchScript as deprecated in favour of torch.compile
+            warnings.simplefilter("ignore", FutureWarning)
+            traced = torch.jit.freeze(torch.jit.trace(model, example).eval())
+        super().__init__(traced)
+
+class NumpyBackend(InferenceBackend):
+    """Plain NumPy matmuls over weights exported from the state dict"""
+    
+    name = "numpy"
+    
+    def __init__(self, model: LogAutoEncoder):
+        self.layers: List[Tuple[np.ndarray, np.ndarray, bool]] = []
+        modules = list(model.encoder) + list(model.decoder)
+        for index, module in enumerate(modules):
+            if isinstance(module, nn.Linear):
+                # Pre-transpose so each layer is a single x @ W + b
+                weight = module.weight.detach().numpy().T.copy()
+                bias = module.bias.detach().numpy().copy()
+                relu = index + 1 < len(modules) and isinstance(modules[index + 1], nn.ReLU)
+                self.layers.append((weight, bias, relu))
+            elif not isinstance(module, nn.ReLU):
+                raise TypeError(f"NumPy backend cannot export layer {type(module).__name__}")
+    
+    def reconstruct(self, x: np.ndarray) -> np.ndarray:
+        h = x
+        for weight, bias, relu in self.layers:
+            h = h @ weight
+            h += bias
+            if relu:
+                np.maximum(h, 0, out=h)
+        return h
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "torchscript": ScriptedBackend,
+    "quantized": lambda model: ScriptedBackend(model, quantize=True),
+    "numpy": NumpyBackend
+}
+
+# Backends "auto" chooses from; quantized is opt-in since it trades accuracy for speed
+EXACT_BACKENDS = ("torch", "torchscript", "numpy")
+
+# Quantized scores stay within this fraction of the batch's largest eager score
+QUANTIZED_RTOL = 0.01
+
+def compare_backends(model: LogAutoEncoder, x: np.ndarray, names=tuple(BACKENDS)) -> Dict[str, Dict[str, float]]:
+    """Max score deviation from eager torch and mean latency for each backend"""
+    reference = TorchBackend(model).score(x)
+    results = {}
+    for name in names:
+        backend = BACKENDS[name](model)
+        backend.score(x)  # Warm up
+        rounds = 50
+        start = time.perf_counter()
+        for _ in range(rounds):
+            scores = backend.score(x)
+        results[name] = {
+            "max_abs_error": float(np.abs(scores - reference).max()),
+            "latency_us": (time.perf_counter() - start) / rounds * 1e6
+        }
+    return results
+
+def create_backend(name: str, model: LogAutoEncoder, rtol: float = 1e-4) -> InferenceBackend:
+    """Build the named backend; "auto" picks the fastest exact one on this CPU"""
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {name}")
+        return BACKENDS[name](model)
+    
+    sample = np.random.default_rng(0).random((1, model.encoder[0].in_features), dtype=np.float32)
+    results = compare_backends(model, sample, EXACT_BACKENDS)
+    tolerance = rtol * max(1.0, float(TorchBackend(model).score(sample).max()))
+    candidates = [name for name, result in results.items() if result["max_abs_error"] <= tolerance]
+    fastest = min(candidates, key=lambda name: results[name]["latency_us"])
+    return BACKENDS[fastest](model)
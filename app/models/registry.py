@@ -0,0 +1,212 @@
+import fnmatch
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import torch
+from app.models.autoencoder import LogAutoEncoder
+from app.models.backends import InferenceBackend, create_backend
+from app.utils.preprocessing import load_scaler, scaler_path_for
+from app.config import MODEL_PATH, INFERENCE_BACKEND, SOURCE_MODELS_DIR, SOURCE_GROUPS, MODEL_CACHE_BYTES
+
+def infer_input_dim(state_dict: Dict[str, torch.Tensor]) -> int:
+    """Read the feature count off the first encoder layer of a checkpoint"""
+    return state_dict["encoder.0.weight"].shape[1]
+
+def load_model(path: str) -> LogAutoEncoder:
+    """Build a LogAutoEncoder sized to, and loaded from, a checkpoint"""
+    state_dict = torch.load(path, map_location="cpu", weights_only=True)
+    model = LogAutoEncoder(infer_input_dim(state_dict))
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+class LoadedModel:
+    """An immutable snapshot of the model currently being served"""
+    
+    def __init__(self, model: LogAutoEncoder, path: str, version: int, backend: str = INFERENCE_BACKEND):
+        self.model = model
+        self.path = path
+        self.version = version
+        self.input_dim = model.encoder[0].in_features
+        self.backend: InferenceBackend = create_backend(backend, model)
+        # Checkpoints trained on normalized features ship a scaler beside them
+        scaler = load_scaler(scaler_path_for(path))
+        if scaler is not None:
+            self.backend.set_scaler(*scaler)
+        self.normalized = scaler is not None
+        self.loaded_at = time.time()
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size: the weights plus one backend copy of them"""
+        return 2 * sum(p.numel() * p.element_size() for p in self.model.parameters())
+
+class ModelRegistry:
+    """Shared, lazily-loaded model with atomic hot-reload"""
+    
+    def __init__(self, path: str = MODEL_PATH):
+        self.path = path
+        self._current: Optional[LoadedModel] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[LoadedModel], None]] = []
+    
+    def current(self) -> LoadedModel:
+        """Get the served model, loading it on first use"""
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = LoadedModel(load_model(self.path), self.path, 1)
+                current = self._current
+        return current
+    
+    @property
+    def model(self) -> LogAutoEncoder:
+        return self.current().model
+    
+    @property
+    def input_dim(self) -> int:
+        return self.current().input_dim
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._current is not None
+    
+    def reload(self, path: Optional[str] = None) -> LoadedModel:
+        """Load a checkpoint and swap it in; in-flight batches finish on the old model"""
+        path = path or self.path
+        # Build the replacement outside the lock so readers are never blocked
+        model = load_model(path)
+        with self._lock:
+            version = self._current.version + 1 if self._current else 1
+            self._current = LoadedModel(model, path, version)
+            self.path = path
+            current = self._current
+        
+        for listener in self._listeners:
+            listener(current)
+        return current
+    
+    def on_reload(self, listener: Callable[[LoadedModel], None]):
+        """Register a callback run after every successful reload"""
+        self._listeners.append(listener)
+    
+    def get_info(self):
+        """Get details of the served model without forcing a load"""
+        current = self._current
+        if current is None:
+            return {"loaded": False, "path": self.path}
+        return {
+            "loaded": True,
+            "path": current.path,
+            "version": current.version,
+            "input_dim": current.input_dim,
+            "backend": current.backend.name,
+            "normalized": current.normalized,
+            "loaded_at": current.loaded_at
+        }
+
+class SourceModelCache:
+    """Per-source and per-group models, loaded lazily into a memory-bounded LRU
+
+    A source uses models/<source>.pt if it exists, else the model of the first
+    SOURCE_GROUPS pattern it matches, else the registry's global model.
+    """
+    
+    def __init__(self, registry: ModelRegistry, models_dir: str = SOURCE_MODELS_DIR,
+                 groups: Optional[Dict[str, str]] = None, max_bytes: int = MODEL_CACHE_BYTES):
+        self.registry = registry
+        self.models_dir = models_dir
+        self.groups = dict(SOURCE_GROUPS if groups is None else groups)
+        self.max_bytes = max_bytes
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.models_dir, f"{key}.pt")
+    
+    def resolve(self, source: Optional[str]) -> Optional[str]:
+        """The model key serving `source`, or None for the global model"""
+        if source is None:
+            return None
+        try:
+            return self._resolved[source]
+        except KeyError:
+            pass
+        key = None
+        # Keys become file names, so anything path-like falls back to the global model
+        if os.sep not in source and not source.startswith(".") and os.path.exists(self._path(source)):
+            key = source
+        else:
+            for pattern, group in self.groups.items():
+                if fnmatch.fnmatchcase(source, pattern):
+                    key = group if os.path.exists(self._path(group)) else None
+                    break
+        if len(self._resolved) >= 10000:
+            # Sources come from clients; don't let arbitrary names grow this forever
+            self._resolved.clear()
+        self._resolved[source] = key
+        return key
+    
+    def get(self, source: Optional[str]) -> LoadedModel:
+        """The model for a source, loading and caching it on first use"""
+        key = self.resolve(source)
+        if key is None:
+            return self.registry.current()
+        
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return loaded
+        
+        # Load outside the lock; two threads racing on one key just load it twice
+        path = self._path(key)
+        loaded = LoadedModel(load_model(path), path, 1, self.registry.current().backend.name)
+        with self._lock:
+            self.misses += 1
+            if key not in self._models:
+                self._models[key] = loaded
+                self._bytes += loaded.nbytes
+                # Always keep the model just loaded, even if it alone exceeds the budget
+                while self._bytes > self.max_bytes and len(self._models) > 1:
+                    _, evicted = self._models.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+                    self.evictions += 1
+            return self._models[key]
+    
+    def invalidate(self, key: Optional[str] = None):
+        """Forget one cached model, or all of them, and re-check which files exist"""
+        with self._lock:
+            if key is None:
+                self._models.clear()
+                self._bytes = 0
+            elif key in self._models:
+                self._bytes -= self._models.pop(key).nbytes
+            self._resolved.clear()
+    
+    def get_stats(self):
+        return {
+            "models_dir": self.models_dir,
+            "loaded": list(self._models),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sources_resolved": len(self._resolved)
+        }
+
+# Global model registry instance
+registry = ModelRegistry()
+
+# Per-source models falling back to the global one
+source_models = SourceModelCache(registry)
@@ -1,56 +1,145 @@
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, WebSocket, Request, HTTPException
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
-import torch
+from datetime import datetime
+from typing import Optional, Tuple
+import numpy as np
+import io
 import json
+import math
 import asyncio
-from app.models.autoencoder import LogAutoEncoder
+import time
+from app.models.registry import registry, source_models
 from app.utils.connection_manager import manager
-from app.utils.alerting import process_anomaly_alert
+from app.utils.alerting import alert_manager, get_alert_stats, update_alert_rule
 from app.utils.realtime_streamer import streamer, get_streamer_stats
-from app.utils.prediction import predict_anomaly
+from app.utils.sources import create_source
+from app.utils.agent_ingest import agents
+from app.utils.attribution import explainer
+from app.utils.prediction import invalidate_source_model, predict_anomaly, predict_anomaly_batch
+from app.utils.metrics import metrics
+from app.utils.pubsub import bus
+from app.utils.quantiles import anomaly_threshold, reset_thresholds, threshold_for
+from app.utils.rollups import rollups
+from app.utils.score_cache import score_cache
+from app.utils.scheduler import scheduler
+from app.utils.storage import SEVERITIES, event_store
+from app.config import MAX_BATCH_ROWS
 
 router = APIRouter()
 
-INPUT_DIM = 5  # Update based on your dataset
-model = LogAutoEncoder(INPUT_DIM)
-model.load_state_dict(torch.load("model.pt"))
-model.eval()
-
 class LogData(BaseModel):
     features: list[float]
+    source: Optional[str] = None  # Host or source key routing to a per-source model
+    
+    def finite_features(self) -> list[float]:
+        """The features, or a 400 if any is NaN or infinite"""
+        if not np.isfinite(self.features).all():
+            raise HTTPException(status_code=400, detail="Features contain NaN or infinite values")
+        return self.features
+
+class ModelReload(BaseModel):
+    path: Optional[str] = None
+    source: Optional[str] = None  # Reload only this per-source model key
+
+class MonitoringSource(BaseModel):
+    source: str = "simulated"  # simulated, file, udp, tcp or load
+    path: Optional[str] = None
+    from_start: bool = False
+    host: Optional[str] = None
+    port: Optional[int] = None
+    interval: Optional[float] = None
+    rate: Optional[float] = None
+    shape: Optional[str] = None
+    anomaly_ratio: Optional[float] = None
+
+class AlertRuleUpdate(BaseModel):
+    threshold: Optional[float] = None
+    comparison: Optional[str] = None
+    severity: Optional[str] = None
+    cooldown: Optional[float] = None
+    enabled: Optional[bool] = None
+    message: Optional[str] = None
 
 @router.post("/predict-anomaly/")
 async def predict_anomaly_endpoint(data: LogData):
     """Predict anomaly for given data"""
-    result = await predict_anomaly(data.features)
+    result = await predict_anomaly(data.finite_features(), data.source)
     return result
 
+def _parse_feature_matrix(body: bytes, content_type: str, dim: int) -> Tuple[np.ndarray, Optional[list]]:
+    """Decode a JSON, raw float32 or .npy request body into an N x D matrix, plus any per-row sources"""
+    sources = None
+    try:
+        if content_type in ("application/octet-stream", "application/x-float32"):
+            if len(body) % (4 * dim):
+                raise ValueError(f"body of {len(body)} bytes is not a whole number of {dim}-float32 rows")
+            x = np.frombuffer(body, dtype="<f4").reshape(-1, dim)
+        elif content_type in ("application/x-npy", "application/vnd.numpy"):
+            x = np.load(io.BytesIO(body), allow_pickle=False)
+            # Strings, booleans, complex or structured arrays would get past the shape checks
+            if x.dtype.kind not in "iuf":
+                raise ValueError(f"array dtype must be integer or float, got {x.dtype}")
+        else:
+            payload = json.loads(body)
+            rows = payload["features"] if isinstance(payload, dict) else payload
+            x = np.asarray(rows, dtype=np.float32)
+            if isinstance(payload, dict) and payload.get("sources") is not None:
+                sources = [None if source is None else str(source) for source in payload["sources"]]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid feature matrix: {e}")
+    
+    if x.ndim != 2 or x.shape[1] != dim:
+        raise HTTPException(status_code=400, detail=f"Expected an N x {dim} matrix, got shape {list(x.shape)}")
+    if len(x) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(x)} rows exceeds limit of {MAX_BATCH_ROWS}")
+    if not np.isfinite(x).all():
+        raise HTTPException(status_code=400, detail="Feature matrix contains NaN or infinite values")
+    if sources is not None and len(sources) != len(x):
+        raise HTTPException(status_code=400, detail=f"Got {len(sources)} sources for {len(x)} rows")
+    return x.astype(np.float32, copy=False), sources
+
+@router.post("/predict-anomaly/batch/")
+async def predict_anomaly_batch_endpoint(request: Request, source: Optional[str] = None):
+    """Predict anomalies for an N x D matrix sent as JSON, raw float32 or .npy
+
+    `?source=` routes the whole batch; a JSON body may instead carry one source per row.
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    x, sources = _parse_feature_matrix(await request.body(), content_type, registry.input_dim)
+    return await predict_anomaly_batch(x, sources if sources is not None else source)
+
 @router.post("/stream-predict/")
 async def stream_predict(data: LogData):
     """Real-time streaming prediction endpoint"""
-    result = await predict_anomaly(data.features)
+    result = await predict_anomaly(data.finite_features(), data.source)
     
-    # Always broadcast real-time predictions
-    stream_data = {
-        "type": "prediction",
-        "data": result
-    }
-    await manager.broadcast(json.dumps(stream_data))
+    # Always stream real-time predictions, batched into one frame per tick
+    manager.publish_prediction({
+        "source": "api",
+        "host": data.source,
+        "prediction": result
+    })
     
     return result
 
 @router.post("/start-monitoring/")
-async def start_monitoring():
-    """Start real-time monitoring"""
+async def start_monitoring(data: Optional[MonitoringSource] = None):
+    """Start real-time monitoring from simulated data, tailed files or a syslog listener"""
     try:
         if not streamer.is_running:
-            asyncio.create_task(streamer.start_streaming())
+            data = data or MonitoringSource()
+            options = data.model_dump(exclude={"source"}, exclude_none=True)
+            if data.source != "file":
+                options.pop("from_start", None)
+            source = create_source(data.source, **options)
+            scheduler.spawn(streamer.start_streaming(source), name="streamer")
             await manager.broadcast(json.dumps({
                 "type": "monitoring_status",
                 "status": "started",
-                "message": "Real-time monitoring started"
-            }))
-            return {"status": "success", "message": "Monitoring started"}
+                "message": f"Real-time monitoring started ({source.name})"
+            }), topic="status")
+            return {"status": "success", "message": f"Monitoring started ({source.name})"}
         else:
             return {"status": "already_running", "message": "Monitoring already running"}
     except Exception as e:
@@ -66,7 +155,7 @@ async def stop_monitoring():
                 "type": "monitoring_status",
                 "status": "stopped",
                 "message": "Real-time monitoring stopped"
-            }))
+            }), topic="status")
             return {"status": "success", "message": "Monitoring stopped"}
         else:
             return {"status": "not_running", "message": "Monitoring not running"}
@@ -81,6 +170,9 @@ async def get_monitoring_status():
         "is_running": stats["is_running"],
         "processed_count": stats["processed_count"],
         "anomaly_count": stats["anomaly_count"],
+        "rejected_count": stats["rejected_count"],
+        "queued_batches": stats["queued_batches"],
+        "source": stats["source"],
         "uptime": stats["uptime"]
     }
 
@@ -95,15 +187,155 @@ async def test_anomaly():
         "type": "test_anomaly",
         "data": result,
         "message": f"Test anomaly detected: Score={result['anomaly_score']:.4f}"
-    }))
+    }), topic="alerts")
     
     return result
 
+@router.post("/reload-model/")
+async def reload_model(data: Optional[ModelReload] = None):
+    """Hot-swap the served model from a checkpoint without a restart"""
+    if data and data.source:
+        # Per-source models reload lazily from models/<key>.pt on next use
+        invalidate_source_model(data.source)
+        bus.publish("model.invalidate", {"key": data.source})
+        return {"status": "success", "source_models": source_models.get_stats()}
+    
+    path = data.path if data else None
+    try:
+        # Load off the event loop; requests keep using the old model meanwhile
+        loaded = await asyncio.get_running_loop().run_in_executor(None, registry.reload, path)
+    except Exception as e:
+        return {"status": "error", "message": str(e), "model": registry.get_info()}
+    
+    # Other workers load the same checkpoint
+    bus.publish("model.reload", {"path": loaded.path})
+    await manager.broadcast(json.dumps({
+        "type": "model_reloaded",
+        "version": loaded.version,
+        "path": loaded.path,
+        "message": f"Model v{loaded.version} loaded from {loaded.path}"
+    }), topic="status")
+    return {"status": "success", "model": registry.get_info()}
+
+@router.get("/threshold/")
+async def get_threshold(source: Optional[str] = None):
+    """Get the current anomaly threshold and score quantiles, for one source's model if given"""
+    return threshold_for(source_models.resolve(source)).get_stats()
+
+@router.post("/threshold/reset/")
+async def reset_threshold():
+    """Forget the learned score distributions, e.g. after a workload change"""
+    reset_thresholds()
+    bus.publish("threshold.reset", None)
+    return {"status": "success", "threshold": anomaly_threshold.get_stats()}
+
+@router.get("/alerts/stats/")
+async def alert_stats(source: Optional[str] = None):
+    """Get alerting window, suppression and storm statistics"""
+    if source is None:
+        return get_alert_stats()
+    stats = alert_manager.get_anomaly_stats(source)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No alert state for source: {source}")
+    return {"source": source, "anomaly_stats": stats}
+
+@router.get("/alert-rules/")
+async def list_alert_rules():
+    """List the declarative alert rules"""
+    return {name: rule.to_dict() for name, rule in alert_manager.alert_rules.items()}
+
+@router.post("/alert-rules/{name}/")
+async def edit_alert_rule(name: str, data: AlertRuleUpdate):
+    """Change one alert rule's threshold, cooldown, severity or enabled state"""
+    if name not in alert_manager.alert_rules:
+        raise HTTPException(status_code=404, detail=f"Unknown alert rule: {name}")
+    try:
+        rule = update_alert_rule(name, **data.model_dump(exclude_unset=True))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "rule": rule.to_dict()}
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds or an ISO 8601 timestamp"""
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        if not math.isfinite(seconds):
+            raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+        return seconds
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+
+@router.get("/history/alerts/")
+async def alert_history(start: Optional[str] = None, end: Optional[str] = None, severity: Optional[str] = None,
+                        limit: int = 100, cursor: Optional[str] = None):
+    """Page through stored alerts, newest first, by time range and severity"""
+    severities = [level.strip().upper() for level in severity.split(",")] if severity else None
+    if severities and not set(severities) <= set(SEVERITIES):
+        raise HTTPException(status_code=400, detail=f"Severity must be one of {', '.join(SEVERITIES)}")
+    try:
+        return await event_store.query_alerts(_parse_time(start), _parse_time(end), severities,
+                                              max(1, min(limit, 1000)), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/history/scores/")
+async def score_history(start: Optional[str] = None, end: Optional[str] = None, anomalous_only: bool = False,
+                        source: Optional[str] = None, limit: int = 1000, cursor: Optional[str] = None):
+    """Page through stored prediction scores, newest first, by time range"""
+    try:
+        return await event_store.query_scores(_parse_time(start), _parse_time(end), anomalous_only, source,
+                                              max(1, min(limit, 10000)), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/rollups/")
+async def rollup_snapshot():
+    """Every retained rollup bucket at each resolution, as sent to a newly connected dashboard"""
+    return Response(rollups.snapshot_message(), media_type="application/json")
+
+@router.get("/rollups/timeseries/")
+async def rollup_timeseries(start: Optional[str] = None, end: Optional[str] = None, points: int = 300,
+                            resolution: Optional[int] = None):
+    """Counts, anomaly rate and score percentiles over a time range, downsampled to `points` points"""
+    end_time = _parse_time(end)
+    if end_time is None:
+        end_time = time.time()
+    start_time = _parse_time(start)
+    if start_time is None:
+        start_time = end_time - 300
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution is not None and resolution not in rollups.series:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {sorted(rollups.series)}")
+    return rollups.timeseries(start_time, end_time, max(1, min(points, 2000)), resolution)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint for real-time monitoring"""
     return {
         "status": "healthy",
-        "model_loaded": True,
-        "active_connections": len(manager.active_connections)
+        "model_loaded": registry.is_loaded,
+        "model": registry.get_info(),
+        "active_connections": len(manager.active_connections),
+        "websocket": manager.get_stats(),
+        "agents": agents.get_stats(),
+        "source_models": source_models.get_stats(),
+        "explainer": explainer.get_stats(),
+        "rollups": rollups.get_stats(),
+        "score_cache": score_cache.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "storage": event_store.get_stats(),
+        "pubsub": bus.get_stats()
     }
\ No newline at end of file
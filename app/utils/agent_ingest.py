@@ -0,0 +1,307 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+import numpy as np
+from fastapi import WebSocket
+from app.models.registry import registry
+from app.utils.connection_manager import manager
+from app.utils.metrics import metrics
+from app.utils.prediction import predict_anomaly_batch
+from app.config import (AGENT_MAX_IN_FLIGHT, AGENT_MAX_BATCH_ROWS, AGENT_WINDOW_ROWS,
+                        AGENT_ACK_INTERVAL_MS, MAX_BATCH_ROWS)
+
+ACK_MODES = ("ack", "results")
+
+Sources = Union[None, str, List[Optional[str]]]
+
+def parse_frame(message: Dict[str, Any], dim: int, source: Optional[str]) -> Tuple[np.ndarray, Sources]:
+    """Rows of one WebSocket frame: packed little-endian float32, or JSON lines
+
+    A JSON line is either a feature list or {"features": [...], "source": "..."};
+    rows without a source use the connection's.
+    """
+    if message.get("bytes") is not None:
+        body = message["bytes"]
+        if len(body) % (4 * dim):
+            raise ValueError(f"frame of {len(body)} bytes is not a whole number of {dim}-float32 rows")
+        x = np.frombuffer(body, dtype="<f4").reshape(-1, dim)
+        _check_finite(x)
+        return x, source
+
+    lines = [line for line in (message.get("text") or "").splitlines() if line.strip()]
+    # One C-level parse for the whole frame instead of one per line
+    rows = json.loads("[" + ",".join(lines) + "]")
+    if not rows:
+        return np.zeros((0, dim), dtype=np.float32), source
+    features, sources = [], []
+    for row in rows:
+        if isinstance(row, dict):
+            row_source = row.get("source", source)
+            if row_source is not None and not isinstance(row_source, str):
+                # Caught here, it costs one frame instead of the whole coalesced batch
+                raise ValueError(f"source must be a string, got {type(row_source).__name__}")
+            features.append(row["features"])
+            sources.append(row_source)
+        else:
+            features.append(row)
+            sources.append(source)
+    x = np.asarray(features, dtype=np.float32).reshape(len(features), -1)
+    if x.shape[1] != dim:
+        raise ValueError(f"expected rows of {dim} features, got {x.shape[1]}")
+    _check_finite(x)
+    return x, sources if any(row_source != source for row_source in sources) else source
+
+def _check_finite(x: np.ndarray):
+    if not np.isfinite(x).all():
+        raise ValueError("frame contains NaN or infinite values")
+
+def _concat_sources(chunks: Sequence[Tuple[int, np.ndarray, Sources]]) -> Sources:
+    """One source for the coalesced batch if every chunk agrees, else one per row"""
+    first = chunks[0][2]
+    if all(isinstance(sources, (str, type(None))) and sources == first for _, _, sources in chunks):
+        return first
+    rows = []
+    for _, x, sources in chunks:
+        rows.extend(sources if isinstance(sources, list) else [sources] * len(x))
+    return rows
+
+class AgentSession:
+    """One agent's ingestion socket: frames in, pipelined scoring, batched replies out
+
+    Every row gets the next sequence number of the connection, starting at 1.
+    Up to `max_in_flight` scoring batches run at once; frames arriving
+    meanwhile are coalesced into the next batch. Replies go out in sequence
+    order, at most one frame per `ack_interval`, and acknowledge every row up
+    to "seq". Once `window` rows are unacknowledged the socket is not read
+    until replies catch up, so a chatty agent is held back by TCP instead of
+    filling the inference queue ahead of everyone else.
+    """
+
+    def __init__(self, websocket: WebSocket, source: Optional[str] = None, mode: str = "ack",
+                 max_in_flight: int = AGENT_MAX_IN_FLIGHT, max_batch_rows: int = AGENT_MAX_BATCH_ROWS,
+                 window: int = AGENT_WINDOW_ROWS, ack_interval_ms: float = AGENT_ACK_INTERVAL_MS):
+        self.websocket = websocket
+        self.source = source
+        self.mode = mode
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.window = max(1, window)
+        self.ack_interval = ack_interval_ms / 1000
+        self.received = 0
+        self.acked = 0
+        self.anomalies = 0
+        self.rejected_frames = 0
+        self.pauses = 0
+        self._chunks: deque = deque()
+        self._chunks_ready = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        # Scoring tasks in sequence order, and parse errors not yet reported
+        self._results: deque = deque()
+        self._errors: List[Dict[str, Any]] = []
+        self._results_ready = asyncio.Event()
+        self._window_open = asyncio.Event()
+        self._window_open.set()
+        # Set once a reply fails to send: the agent is gone
+        self.closed = False
+
+    async def run(self):
+        """Serve the socket until the agent disconnects"""
+        await self.websocket.send_text(json.dumps({
+            "type": "ready",
+            "dim": registry.input_dim,
+            "mode": self.mode,
+            "window": self.window,
+            "max_in_flight": self.max_in_flight
+        }))
+        tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._reply())]
+        try:
+            await self._read()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self):
+        while True:
+            while self.received - self.acked >= self.window:
+                # Stop reading; the agent's sends back up once the socket buffers fill
+                self.pauses += 1
+                self._window_open.clear()
+                await self._window_open.wait()
+                if self.closed:
+                    return
+
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                x, sources = parse_frame(message, registry.input_dim, self.source)
+                if len(x) > MAX_BATCH_ROWS:
+                    raise ValueError(f"frame of {len(x)} rows exceeds limit of {MAX_BATCH_ROWS}")
+            except (ValueError, KeyError, TypeError) as e:
+                # Rejected frames consume no sequence numbers
+                self.rejected_frames += 1
+                self._errors.append({"after_seq": self.received, "detail": f"Invalid frame: {e}"})
+                self._results_ready.set()
+                continue
+            if not len(x):
+                continue
+            self._chunks.append((self.received + 1, x, sources))
+            self.received += len(x)
+            self._chunks_ready.set()
+
+    async def _dispatch(self):
+        """Start a scoring batch whenever a slot is free, from everything queued by then"""
+        while True:
+            while not self._chunks:
+                self._chunks_ready.clear()
+                await self._chunks_ready.wait()
+            await self._slots.acquire()
+            chunks = [self._chunks.popleft()]
+            rows = len(chunks[0][1])
+            while self._chunks and rows + len(self._chunks[0][1]) <= self.max_batch_rows:
+                chunks.append(self._chunks.popleft())
+                rows += len(chunks[-1][1])
+            x = chunks[0][1] if len(chunks) == 1 else np.concatenate([chunk[1] for chunk in chunks])
+            task = asyncio.create_task(self._score(chunks[0][0], x, _concat_sources(chunks)))
+            task.add_done_callback(lambda _: self._slots.release())
+            self._results.append(task)
+            self._results_ready.set()
+
+    async def _score(self, first_seq: int, x: np.ndarray, sources: Sources) -> Dict[str, Any]:
+        try:
+            result = await predict_anomaly_batch(x, sources)
+        except Exception as e:
+            return {"first_seq": first_seq, "count": len(x), "error": str(e)}
+        self.anomalies += result["anomaly_count"]
+        self._publish(first_seq, sources, result)
+        return {"first_seq": first_seq, "count": len(x), "result": result}
+
+    def _publish(self, first_seq: int, sources: Sources, result: Dict[str, Any]):
+        """Feed the dashboards' predictions frame; only its last items would be sent anyway"""
+        if not manager.has_subscribers("predictions"):
+            return
+        thresholds = result["threshold"]
+        keep = manager.predictions.items.maxlen
+        for row in range(max(0, result["count"] - keep), result["count"]):
+            manager.publish_prediction({
+                "source": "agent",
+                "host": sources[row] if isinstance(sources, list) else sources,
+                "seq": first_seq + row,
+                "prediction": {
+                    "anomaly_score": result["anomaly_scores"][row],
+                    "is_anomalous": result["is_anomalous"][row],
+                    "threshold": thresholds[row] if isinstance(thresholds, list) else thresholds,
+                    "top_feature": result["top_features"][row],
+                    "timestamp": result["timestamp"]
+                }
+            })
+
+    async def _reply(self):
+        """Acknowledge finished batches in sequence order, several per frame"""
+        loop = asyncio.get_running_loop()
+        last_sent = 0.0
+        while True:
+            while not self._results and not self._errors:
+                self._results_ready.clear()
+                await self._results_ready.wait()
+            if self._results:
+                await asyncio.wait([self._results[0]])
+            delay = last_sent + self.ack_interval - loop.time()
+            if delay > 0:
+                # Whatever else finishes meanwhile goes out in the same frame
+                await asyncio.sleep(delay)
+
+            done = []
+            while self._results and self._results[0].done():
+                done.append(self._results.popleft().result())
+            errors, self._errors = self._errors, []
+            frame = self._frame(done, errors)
+            try:
+                await self.websocket.send_text(json.dumps(frame))
+            except Exception:
+                # Wake the reader if it is waiting for this window to open, so it can stop
+                self.closed = True
+                self._window_open.set()
+                return
+            last_sent = loop.time()
+            if self.received - self.acked < self.window:
+                self._window_open.set()
+
+    def _frame(self, done: List[Dict[str, Any]], errors: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if done:
+            self.acked = done[-1]["first_seq"] + done[-1]["count"] - 1
+        frame = {"type": self.mode, "seq": self.acked, "count": sum(batch["count"] for batch in done)}
+        scored = [batch for batch in done if "result" in batch]
+        if self.mode == "results":
+            # Rows of failed batches are listed under "errors" and missing here
+            frame["first_seq"] = done[0]["first_seq"] if done else self.acked + 1
+            for key in ("anomaly_scores", "is_anomalous", "top_features"):
+                frame[key] = [value for batch in scored for value in batch["result"][key]]
+            frame["threshold"] = [threshold for batch in scored for threshold in (
+                batch["result"]["threshold"] if isinstance(batch["result"]["threshold"], list)
+                else [batch["result"]["threshold"]] * batch["count"])]
+        else:
+            frame["anomalies"] = [{
+                "seq": batch["first_seq"] + row,
+                "anomaly_score": batch["result"]["anomaly_scores"][row],
+                "top_feature": batch["result"]["top_features"][row]
+            } for batch in scored for row in np.flatnonzero(batch["result"]["is_anomalous"]).tolist()]
+        errors = errors + [{"first_seq": batch["first_seq"], "seq": batch["first_seq"] + batch["count"] - 1,
+                            "detail": batch["error"]} for batch in done if "error" in batch]
+        if errors:
+            frame["errors"] = errors
+        return frame
+
+    def get_stats(self):
+        return {
+            "source": self.source,
+            "mode": self.mode,
+            "received": self.received,
+            "acked": self.acked,
+            "in_flight": len(self._results),
+            "queued_rows": sum(len(chunk[1]) for chunk in self._chunks),
+            "anomalies": self.anomalies,
+            "rejected_frames": self.rejected_frames,
+            "window_pauses": self.pauses
+        }
+
+class AgentIngest:
+    """Tracks the connected agents' ingestion sessions"""
+
+    def __init__(self):
+        self.sessions: Set[AgentSession] = set()
+        self.connections = 0
+        self.rows = 0
+
+    async def serve(self, websocket: WebSocket, source: Optional[str] = None, mode: str = "ack"):
+        """Run one agent's session; returns once it disconnects"""
+        if mode not in ACK_MODES:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        session = AgentSession(websocket, source, mode)
+        self.sessions.add(session)
+        self.connections += 1
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+            self.rows += session.received
+
+    def get_stats(self):
+        return {
+            "active_connections": len(self.sessions),
+            "total_connections": self.connections,
+            "rows_received": self.rows + sum(session.received for session in self.sessions),
+            "sessions": [session.get_stats() for session in self.sessions]
+        }
+
+# Global agent ingestion instance
+agents = AgentIngest()
+
+metrics.gauge("ztaatds_agent_connections", "Agents streaming features over /ws/ingest",
+              lambda: len(agents.sessions))
+metrics.gauge("ztaatds_agent_unacked_rows", "Rows received from agents and not yet acknowledged",
+              lambda: sum(session.received - session.acked for session in agents.sessions))
@@ -1,99 +1,404 @@
 import asyncio
 import json
 import time
-from typing import Dict, Any, List
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Any, Iterable, List, Optional
+from app.models.registry import source_models
 from app.utils.connection_manager import manager
+from app.utils.metrics import alerts_suppressed_total, alerts_total
+from app.utils.pubsub import bus, is_follower
+from app.utils.scheduler import scheduler
+from app.utils.quantiles import anomaly_threshold, threshold_for
+from app.utils.storage import event_store
+from app.utils.windows import CountWindow, TimeWindow
+from app.config import (ALERT_TIME_WINDOW_SECONDS, ALERT_COOLDOWN_SECONDS,
+                        ALERT_STORM_THRESHOLD, ALERT_STORM_WINDOW_SECONDS, ALERT_MAX_SOURCES,
+                        PUBSUB_ENABLED)
 
-class AlertManager:
-    """Real-time alerting system for anomaly detection"""
+WINDOW_FLAGS = ("anomalous", "high")
+
+# Values a rule can test; each reads the O(1) window state. None means "not enough data yet".
+RULE_METRICS = {
+    "score": lambda state, data: data.get("anomaly_score", 0),
+    "consecutive_anomalies": lambda state, data: state.consecutive_window.counts["anomalous"],
+    "anomaly_rate": lambda state, data: state.rate_window.rate("anomalous") if state.rate_window.full else None,
+    "window_anomalies": lambda state, data: state.time_window.counts["anomalous"]
+}
+
+DEFAULT_ALERT_RULES = [
+    {
+        "name": "high_anomaly_score",
+        "alert_type": "HIGH_ANOMALY_SCORE",
+        "metric": "score",
+        "comparison": ">",
+        "threshold": None,  # None tracks HIGH_SCORE_PERCENTILE of observed scores
+        "severity": "HIGH",
+        "value_key": "score",
+        "message": "High anomaly score detected: {value:.4f}"
+    },
+    {
+        "name": "consecutive_anomalies",
+        "alert_type": "CONSECUTIVE_ANOMALIES",
+        "metric": "consecutive_anomalies",
+        "comparison": ">=",
+        "threshold": 3,
+        "severity": "MEDIUM",
+        "value_key": "count",
+        "message": "Multiple consecutive anomalies detected: {value}"
+    },
+    {
+        "name": "anomaly_rate_threshold",
+        "alert_type": "HIGH_ANOMALY_RATE",
+        "metric": "anomaly_rate",
+        "comparison": ">",
+        "threshold": 0.5,
+        "severity": "HIGH",
+        "value_key": "rate",
+        "message": "High anomaly rate detected: {value:.2%}"
+    },
+    {
+        "name": "anomalies_per_window",
+        "alert_type": "ANOMALY_BURST",
+        "metric": "window_anomalies",
+        "comparison": ">=",
+        "threshold": 30,
+        "severity": "HIGH",
+        "value_key": "count",
+        "message": "Anomaly burst detected: {value} in the last " + str(ALERT_TIME_WINDOW_SECONDS) + "s"
+    }
+]
+
+class AlertRule:
+    """A declarative alert condition: metric, comparison, threshold and cooldown"""
+    
+    def __init__(self, name: str, alert_type: str, metric: str, threshold: Optional[float],
+                 comparison: str = ">", severity: str = "MEDIUM", value_key: str = "value",
+                 message: str = "{alert_type}: {value}", cooldown: float = ALERT_COOLDOWN_SECONDS,
+                 enabled: bool = True):
+        if metric not in RULE_METRICS:
+            raise ValueError(f"Unknown alert metric: {metric}")
+        if comparison not in (">", ">="):
+            raise ValueError(f"Unknown alert comparison: {comparison}")
+        self.name = name
+        self.alert_type = alert_type
+        self.metric = metric
+        self.threshold = threshold
+        self.comparison = comparison
+        self.severity = severity
+        self.value_key = value_key
+        self.message = message
+        self.cooldown = cooldown
+        self.enabled = enabled
+    
+    def evaluate(self, state: "AlertState", data: Dict[str, Any],
+                 high_threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Alert payload if the rule fires for this event, else None"""
+        if not self.enabled:
+            return None
+        value = RULE_METRICS[self.metric](state, data)
+        threshold = self.threshold
+        if threshold is None:
+            # Only score rules may leave the threshold to the adaptive estimator
+            threshold = anomaly_threshold.high_threshold if high_threshold is None else high_threshold
+        if value is None or not (value > threshold if self.comparison == ">" else value >= threshold):
+            return None
+        return {
+            self.value_key: value,
+            "threshold": threshold,
+            "message": self.message.format(value=value, threshold=threshold, alert_type=self.alert_type)
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+class AlertSuppressor:
+    """Per-key cooldowns, plus storm mode that rolls a burst into one aggregated alert"""
+    
+    def __init__(self, storm_threshold: int = ALERT_STORM_THRESHOLD, storm_window: float = ALERT_STORM_WINDOW_SECONDS):
+        self.storm_threshold = storm_threshold
+        self.storm_window = storm_window
+        self._hits = TimeWindow(storm_window, flags=())
+        # Keys include client-supplied sources, so entries past every cooldown are pruned
+        self._last_sent: Dict[str, float] = {}
+        self._longest_cooldown = 0.0
+        self._last_prune = float("-inf")
+        self._suppressed: Counter = Counter()
+        self.in_storm = False
+        self.storm_started = None
+        self.storm_counts: Counter = Counter()
+        self.total_suppressed = 0
+    
+    def admit(self, key: str, cooldown: float, now: float) -> Optional[int]:
+        """Whether to send an alert for `key` now; returns hits suppressed since the last one, or None"""
+        self._hits.add(now)
+        self._longest_cooldown = max(self._longest_cooldown, cooldown)
+        if now - self._last_prune >= self.storm_window:
+            self.prune(now)
+        if self.in_storm or self._hits.count >= self.storm_threshold:
+            self.storm_counts[key] += 1
+            self.total_suppressed += 1
+            return None
+        if now - self._last_sent.get(key, float("-inf")) < cooldown:
+            self._suppressed[key] += 1
+            self.total_suppressed += 1
+            return None
+        self._last_sent[key] = now
+        return self._suppressed.pop(key, 0)
+    
+    def prune(self, now: float):
+        """Forget keys quiet for two of the longest cooldowns
+
+        One cooldown would do for the cooldown itself; the second keeps the
+        suppressed count around to report when the key fires again soon after.
+        """
+        self._last_prune = now
+        expired = [key for key, sent in self._last_sent.items() if now - sent >= 2 * self._longest_cooldown]
+        for key in expired:
+            del self._last_sent[key]
+            self._suppressed.pop(key, None)
+    
+    def forget(self, keys: Iterable[str]):
+        """Drop the cooldowns of keys that can no longer fire, e.g. an evicted source's"""
+        for key in keys:
+            self._last_sent.pop(key, None)
+            self._suppressed.pop(key, None)
+    
+    def storm_transition(self, now: float) -> Optional[str]:
+        """Report "started" or "ended" when storm mode flips, else None"""
+        hits = self._hits.snapshot(now)["total"]
+        if not self.in_storm and hits >= self.storm_threshold:
+            self.in_storm = True
+            self.storm_started = now
+            return "started"
+        if self.in_storm and hits < self.storm_threshold:
+            self.in_storm = False
+            self.storm_counts.clear()
+            return "ended"
+        return None
+    
+    def get_stats(self):
+        return {
+            "in_storm": self.in_storm,
+            "storm_counts": dict(self.storm_counts),
+            "pending_suppressed": dict(self._suppressed),
+            "total_suppressed": self.total_suppressed
+        }
+
+class AlertState:
+    """Rolling windows for one stream of predictions: the whole fleet, or one source"""
     
     def __init__(self):
-        self.alerts = []
-        self.alert_rules = {
-            "high_anomaly_score": 0.1,
-            "consecutive_anomalies": 3,
-            "anomaly_rate_threshold": 0.5
+        # Ring buffers with running counters: every rule check is O(1)
+        self.consecutive_window = CountWindow(10, WINDOW_FLAGS)
+        self.rate_window = CountWindow(20, WINDOW_FLAGS)
+        self.recent_window = CountWindow(100, WINDOW_FLAGS)
+        self.time_window = TimeWindow(ALERT_TIME_WINDOW_SECONDS, flags=WINDOW_FLAGS)
+    
+    def record(self, score: float, is_anomalous: bool, is_high: bool, timestamp: float = None):
+        self.consecutive_window.add(score, anomalous=is_anomalous, high=is_high)
+        self.rate_window.add(score, anomalous=is_anomalous, high=is_high)
+        self.recent_window.add(score, anomalous=is_anomalous, high=is_high)
+        self.time_window.add(timestamp, anomalous=is_anomalous, high=is_high)
+    
+    def record_summary(self, scores: List[float], flags: List[bool], high: List[bool],
+                       total: int, anomalous: int, high_count: int):
+        for window in (self.consecutive_window, self.rate_window, self.recent_window):
+            start = max(0, len(scores) - window.size)
+            for score, is_anomalous, is_high in zip(scores[start:], flags[start:], high[start:]):
+                window.add(score, anomalous=is_anomalous, high=is_high)
+        self.time_window.add_counts(total, anomalous=anomalous, high=high_count)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        window = self.recent_window
+        return {
+            "total": window.count,
+            "high_score": window.counts["high"],
+            "rate": window.rate("anomalous"),
+            "time_window": self.time_window.snapshot()
         }
-        self.recent_anomalies = []
+
+class AlertManager:
+    """Real-time alerting system for anomaly detection"""
+    
+    def __init__(self, max_sources: int = ALERT_MAX_SOURCES):
+        self.alerts = deque(maxlen=50)
+        self.alert_rules: Dict[str, AlertRule] = {}
+        self.configure_rules(DEFAULT_ALERT_RULES)
+        self.suppressor = AlertSuppressor()
+        # Fleet-wide windows see every prediction; per-source ones only their own
+        self.state = AlertState()
+        self.source_states: "OrderedDict[str, AlertState]" = OrderedDict()
+        self.max_sources = max_sources
         self.is_running = False
     
     async def start_alerting(self):
-        """Start the alerting system"""
+        """Start the alerting system; its periodic jobs run on the scheduler"""
         self.is_running = True
-        asyncio.create_task(self._monitor_alerts())
+        scheduler.wake()
     
     async def stop_alerting(self):
         """Stop the alerting system"""
         self.is_running = False
     
+    def state_for(self, source: Optional[str]) -> AlertState:
+        """Windows for one source, or the fleet-wide ones for None"""
+        if source is None:
+            return self.state
+        state = self.source_states.get(source)
+        if state is None:
+            state = self.source_states[source] = AlertState()
+            if len(self.source_states) > self.max_sources:
+                # Forget the source that has been quiet the longest, and its cooldowns
+                evicted, _ = self.source_states.popitem(last=False)
+                self.suppressor.forget(self._dedup_key(rule, {"source": evicted})
+                                       for rule in self.alert_rules.values())
+        else:
+            self.source_states.move_to_end(source)
+        return state
+    
+    def record(self, score: float, is_anomalous: bool, timestamp: float = None, source: Optional[str] = None):
+        """Record any prediction in the rolling windows; O(1) and allocation-free"""
+        is_high = score > self._high_score_threshold(source)
+        self.state.record(score, is_anomalous, is_high, timestamp)
+        if source is not None:
+            self.state_for(source).record(score, is_anomalous, is_high, timestamp)
+    
+    def record_batch(self, scores, flags, source: Optional[str] = None):
+        """Record a scored batch; count windows only ever need its newest rows"""
+        self.record_summary(**self.summarize_batch(scores, flags, source))
+    
+    def summarize_batch(self, scores, flags, source: Optional[str] = None) -> Dict[str, Any]:
+        """A batch reduced to what the windows need: its newest rows and its totals"""
+        high = scores > self._high_score_threshold(source)
+        tail = slice(max(0, len(scores) - self.state.recent_window.size), len(scores))
+        return {
+            "scores": scores[tail].tolist(),
+            "flags": flags[tail].tolist(),
+            "high": high[tail].tolist(),
+            "total": int(len(scores)),
+            "anomalous": int(flags.sum()),
+            "high_count": int(high.sum()),
+            "source": source
+        }
+    
+    def record_summary(self, scores: List[float], flags: List[bool], high: List[bool],
+                       total: int, anomalous: int, high_count: int, source: Optional[str] = None):
+        """Record a batch summary, possibly produced by another worker"""
+        self.state.record_summary(scores, flags, high, total, anomalous, high_count)
+        if source is not None:
+            self.state_for(source).record_summary(scores, flags, high, total, anomalous, high_count)
+    
+    async def process_batch(self, scores, flags, anomaly_data: Dict[str, Any]):
+        """Process a scored batch, checking alert conditions once for its worst row"""
+        self.record_batch(scores, flags, anomaly_data.get("source"))
+        if flags.any():
+            await self._check_alert_conditions(anomaly_data)
+    
     async def process_anomaly(self, anomaly_data: Dict[str, Any]):
         """Process a new anomaly detection"""
-        timestamp = time.time()
-        
-        # Add to recent anomalies list
-        self.recent_anomalies.append({
-            "timestamp": timestamp,
-            "score": anomaly_data.get("anomaly_score", 0),
-            "data": anomaly_data
-        })
-        
-        # Keep only last 100 anomalies
-        if len(self.recent_anomalies) > 100:
-            self.recent_anomalies = self.recent_anomalies[-100:]
+        self.record(anomaly_data.get("anomaly_score", 0), anomaly_data.get("is_anomalous", True),
+                    source=anomaly_data.get("source"))
         
         # Check alert conditions
         await self._check_alert_conditions(anomaly_data)
     
+    def configure_rules(self, rules: List[Dict[str, Any]]):
+        """Replace the rule set with declarative rule definitions"""
+        self.alert_rules = {rule["name"]: AlertRule(**rule) for rule in rules}
+    
+    def update_rule(self, name: str, **changes) -> AlertRule:
+        """Change settings (threshold, cooldown, enabled, ...) of one rule"""
+        rule = self.alert_rules[name]
+        updated = AlertRule(**{**rule.to_dict(), **changes})
+        self.alert_rules[name] = updated
+        return updated
+    
+    def _high_score_threshold(self, source: Optional[str] = None) -> float:
+        """Fixed high-score rule if configured, otherwise the source model's adaptive one"""
+        rule = self.alert_rules.get("high_anomaly_score")
+        if rule is None or rule.threshold is None:
+            return threshold_for(source_models.resolve(source)).high_threshold
+        return rule.threshold
+    
     async def _check_alert_conditions(self, anomaly_data: Dict[str, Any]):
-        """Check if alert conditions are met"""
-        score = anomaly_data.get("anomaly_score", 0)
-        
-        # High anomaly score alert
-        if score > self.alert_rules["high_anomaly_score"]:
-            await self._send_alert("HIGH_ANOMALY_SCORE", {
-                "score": score,
-                "threshold": self.alert_rules["high_anomaly_score"],
-                "message": f"High anomaly score detected: {score:.4f}"
-            })
+        """Check if alert conditions are met, against the event's source's own windows"""
+        now = time.time()
+        source = anomaly_data.get("source")
+        state = self.state_for(source)
+        high_threshold = threshold_for(source_models.resolve(source)).high_threshold
+        for rule in self.alert_rules.values():
+            alert_data = rule.evaluate(state, anomaly_data, high_threshold)
+            if alert_data is None:
+                continue
+            if source is not None:
+                alert_data["source"] = source
+                alert_data["message"] = f"[{source}] {alert_data['message']}"
+            feature_errors = anomaly_data.get("feature_errors")
+            if feature_errors:
+                # Name the feature the model failed to reconstruct worst
+                top_feature = max(feature_errors, key=feature_errors.get)
+                alert_data["feature_errors"] = feature_errors
+                alert_data["top_feature"] = top_feature
+                alert_data["message"] += f" (top feature: {top_feature})"
+            
+            suppressed = self.suppressor.admit(self._dedup_key(rule, anomaly_data), rule.cooldown, now)
+            if suppressed is not None:
+                if suppressed:
+                    alert_data["suppressed"] = suppressed
+                    alert_data["message"] += f" ({suppressed} repeats suppressed)"
+                await self._send_alert(rule.alert_type, alert_data, rule.severity)
+            else:
+                alerts_suppressed_total.inc(rule.alert_type)
         
-        # Consecutive anomalies alert
-        recent_count = len([a for a in self.recent_anomalies[-10:] if a["score"] > 0.05])
-        if recent_count >= self.alert_rules["consecutive_anomalies"]:
-            await self._send_alert("CONSECUTIVE_ANOMALIES", {
-                "count": recent_count,
-                "threshold": self.alert_rules["consecutive_anomalies"],
-                "message": f"Multiple consecutive anomalies detected: {recent_count}"
-            })
+        await self._check_storm(now)
+    
+    def _dedup_key(self, rule: AlertRule, anomaly_data: Dict[str, Any]) -> str:
+        # Cooldowns are per source, so one noisy host cannot mute the others
+        source = anomaly_data.get("source")
+        return rule.alert_type if source is None else f"{rule.alert_type}:{source}"
+    
+    async def _check_storm(self, now: float):
+        """Announce storm mode once on entry and once, with counts, on exit"""
+        # Read before the transition: ending a storm clears its counts
+        counts = dict(self.suppressor.storm_counts)
+        transition = self.suppressor.storm_transition(now)
+        if transition is None:
+            return
         
-        # Anomaly rate alert
-        if len(self.recent_anomalies) >= 20:
-            recent_anomalies = [a for a in self.recent_anomalies[-20:] if a["score"] > 0.05]
-            anomaly_rate = len(recent_anomalies) / 20
-            if anomaly_rate > self.alert_rules["anomaly_rate_threshold"]:
-                await self._send_alert("HIGH_ANOMALY_RATE", {
-                    "rate": anomaly_rate,
-                    "threshold": self.alert_rules["anomaly_rate_threshold"],
-                    "message": f"High anomaly rate detected: {anomaly_rate:.2%}"
-                })
-    
-    async def _send_alert(self, alert_type: str, alert_data: Dict[str, Any]):
+        total = sum(counts.values())
+        if transition == "ended":
+            duration = now - self.suppressor.storm_started
+            message = f"Alert storm ended after {duration:.0f}s: {total} alerts suppressed"
+        else:
+            duration = 0.0
+            message = f"Alert storm: suppressing individual alerts ({total} so far)"
+            # Unpark the expiry check: the storm must end even if alerts stop coming
+            scheduler.wake()
+        await self._send_alert("ALERT_STORM", {
+            "status": transition,
+            "counts": counts,
+            "total": total,
+            "duration": duration,
+            "message": message
+        })
+    
+    async def _send_alert(self, alert_type: str, alert_data: Dict[str, Any], severity: str = None):
         """Send an alert to connected clients"""
         alert = {
             "type": "alert",
             "alert_type": alert_type,
             "timestamp": time.time(),
-            "severity": self._get_severity(alert_type),
+            "severity": severity or self._get_severity(alert_type),
             "data": alert_data
         }
         
+        # Bounded deque keeps only the last 50 alerts
         self.alerts.append(alert)
-        
-        # Keep only last 50 alerts
-        if len(self.alerts) > 50:
-            self.alerts = self.alerts[-50:]
+        alerts_total.inc(alert_type, alert["severity"])
+        event_store.add_alert(alert)
         
         # Broadcast alert
-        await manager.broadcast(json.dumps(alert))
+        await manager.broadcast(json.dumps(alert), topic="alerts")
         
         # Log alert
         print(f"ALERT: {alert_type} - {alert_data.get('message', '')}")
@@ -103,50 +408,126 @@ class AlertManager:
         severity_map = {
             "HIGH_ANOMALY_SCORE": "HIGH",
             "CONSECUTIVE_ANOMALIES": "MEDIUM",
-            "HIGH_ANOMALY_RATE": "HIGH"
+            "HIGH_ANOMALY_RATE": "HIGH",
+            "ANOMALY_BURST": "HIGH",
+            "ALERT_STORM": "CRITICAL"
         }
         return severity_map.get(alert_type, "LOW")
     
-    async def _monitor_alerts(self):
-        """Background task for alert monitoring"""
-        while self.is_running:
-            # Send periodic alert summary
-            if self.alerts:
-                summary = {
-                    "type": "alert_summary",
-                    "timestamp": time.time(),
-                    "total_alerts": len(self.alerts),
-                    "recent_alerts": self.alerts[-5:],  # Last 5 alerts
-                    "anomaly_stats": {
-                        "total_recent": len(self.recent_anomalies),
-                        "high_score_count": len([a for a in self.recent_anomalies if a["score"] > 0.1])
-                    }
-                }
-                await manager.broadcast(json.dumps(summary))
-            
-            await asyncio.sleep(30)  # Send summary every 30 seconds
+    async def end_idle_storm(self):
+        """A storm also ends when alerts stop arriving altogether"""
+        await self._check_storm(time.time())
+    
+    async def send_summary(self):
+        """Send a periodic alert summary"""
+        summary = {
+            "type": "alert_summary",
+            "timestamp": time.time(),
+            "total_alerts": len(self.alerts),
+            "recent_alerts": self.get_alert_history(5),  # Last 5 alerts
+            "anomaly_stats": {
+                "total_recent": self.state.recent_window.count,
+                "high_score_count": self.state.recent_window.counts["high"]
+            }
+        }
+        await manager.broadcast(json.dumps(summary), key="alert_summary", topic="alerts")
     
     def get_alert_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get alert history"""
-        return self.alerts[-limit:] if self.alerts else []
+        start = max(0, len(self.alerts) - limit)
+        return [self.alerts[i] for i in range(start, len(self.alerts))]
     
-    def get_anomaly_stats(self) -> Dict[str, Any]:
-        """Get anomaly statistics"""
-        if not self.recent_anomalies:
-            return {"total": 0, "high_score": 0, "rate": 0}
-        
-        total = len(self.recent_anomalies)
-        high_score = len([a for a in self.recent_anomalies if a["score"] > 0.1])
-        rate = len([a for a in self.recent_anomalies if a["score"] > 0.05]) / total
-        
-        return {
-            "total": total,
-            "high_score": high_score,
-            "rate": rate
-        }
+    def get_anomaly_stats(self, source: Optional[str] = None) -> Dict[str, Any]:
+        """Get anomaly statistics, fleet-wide or for one source"""
+        if source is not None and source not in self.source_states:
+            return None
+        return self.state_for(source).get_stats()
+
+class AlertForwarder:
+    """Ships a follower worker's alert inputs to the leader, which owns the windows"""
+    
+    def __init__(self, alerts: AlertManager, flush_interval: float = 0.05):
+        self.alerts = alerts
+        self.flush_interval = flush_interval
+        # Single predictions are buffered per source and sent as batch summaries per interval
+        self._buffers: Dict[Optional[str], Dict[str, Any]] = {}
+        self._timer = None
+    
+    def record(self, score: float, is_anomalous: bool, source: Optional[str] = None):
+        is_high = score > self.alerts._high_score_threshold(source)
+        buffer = self._buffers.get(source)
+        if buffer is None:
+            buffer = self._buffers[source] = {
+                "tail": deque(maxlen=self.alerts.state.recent_window.size),
+                "total": 0,
+                "anomalous": 0,
+                "high_count": 0
+            }
+        buffer["tail"].append((score, is_anomalous, is_high))
+        buffer["total"] += 1
+        buffer["anomalous"] += is_anomalous
+        buffer["high_count"] += is_high
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+    
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for source, buffer in self._buffers.items():
+            scores, flags, high = (list(column) for column in zip(*buffer.pop("tail")))
+            bus.publish("alerts.record", {**buffer, "scores": scores, "flags": flags, "high": high, "source": source})
+        self._buffers.clear()
+    
+    def process_anomaly(self, anomaly_data: Dict[str, Any]):
+        self.record(anomaly_data.get("anomaly_score", 0), anomaly_data.get("is_anomalous", True),
+                    anomaly_data.get("source"))
+        # Flush first so the leader's windows include this anomaly when it checks
+        self.flush()
+        bus.publish("alerts.check", anomaly_data)
+    
+    def process_batch(self, scores, flags, anomaly_data: Dict[str, Any]):
+        self.flush()
+        bus.publish("alerts.record", self.alerts.summarize_batch(scores, flags, anomaly_data.get("source")))
+        if flags.any():
+            bus.publish("alerts.check", anomaly_data)
 
 # Global alert manager instance
 alert_manager = AlertManager()
+alert_forwarder = AlertForwarder(alert_manager)
+
+def _share_state():
+    """As leader, keep follower workers' view of the alert state current"""
+    bus.publish("alerts.state", _local_alert_stats())
+
+scheduler.every(30.0, alert_manager.send_summary, name="alert_summary", topic="alerts",
+                when=lambda: alert_manager.is_running and bool(alert_manager.alerts))
+# Parked outside storms; _check_storm wakes it when one starts
+scheduler.every(ALERT_STORM_WINDOW_SECONDS, alert_manager.end_idle_storm, name="alert_storm_check",
+                active=lambda: alert_manager.is_running and alert_manager.suppressor.in_storm)
+if PUBSUB_ENABLED:
+    scheduler.every(1.0, _share_state, name="alert_state_share",
+                    when=lambda: alert_manager.is_running and bus.is_leader and bus.connected)
+
+# Alert state as last shared by the leader, for follower workers
+_leader_state: Optional[Dict[str, Any]] = None
+
+def _on_remote_record(summary: Dict[str, Any]):
+    if bus.is_leader:
+        alert_manager.record_summary(**summary)
+
+async def _on_remote_check(anomaly_data: Dict[str, Any]):
+    if bus.is_leader:
+        await alert_manager._check_alert_conditions(anomaly_data)
+
+def _on_leader_state(state: Dict[str, Any]):
+    global _leader_state
+    _leader_state = state
+
+bus.subscribe("alerts.record", _on_remote_record)
+bus.subscribe("alerts.check", _on_remote_check)
+bus.subscribe("alerts.state", _on_leader_state)
+bus.subscribe("alerts.rule", lambda update: alert_manager.update_rule(update["name"], **update["changes"]))
 
 async def start_alerting():
     """Start the alerting system"""
@@ -158,12 +539,42 @@ async def stop_alerting():
 
 async def process_anomaly_alert(anomaly_data: Dict[str, Any]):
     """Process an anomaly for alerting"""
+    if is_follower():
+        alert_forwarder.process_anomaly(anomaly_data)
+        return
     await alert_manager.process_anomaly(anomaly_data)
 
+async def process_batch_alert(scores, flags, anomaly_data: Dict[str, Any]):
+    """Process a scored batch for alerting"""
+    if is_follower():
+        alert_forwarder.process_batch(scores, flags, anomaly_data)
+        return
+    await alert_manager.process_batch(scores, flags, anomaly_data)
+
+def record_prediction(score: float, is_anomalous: bool, source: Optional[str] = None):
+    """Count a normal prediction towards the alerting windows"""
+    if is_follower():
+        alert_forwarder.record(score, is_anomalous, source)
+        return
+    alert_manager.record(score, is_anomalous, source=source)
+
+def update_alert_rule(name: str, **changes) -> AlertRule:
+    """Change a rule here and in every other worker"""
+    rule = alert_manager.update_rule(name, **changes)
+    bus.publish("alerts.rule", {"name": name, "changes": changes})
+    return rule
+
 def get_alert_stats():
-    """Get alerting statistics"""
+    """Get alerting statistics; followers report the leader's aggregated state"""
+    if is_follower() and _leader_state is not None:
+        return _leader_state
+    return _local_alert_stats()
+
+def _local_alert_stats():
     return {
         "is_running": alert_manager.is_running,
         "total_alerts": len(alert_manager.alerts),
-        "anomaly_stats": alert_manager.get_anomaly_stats()
+        "anomaly_stats": alert_manager.get_anomaly_stats(),
+        "sources_tracked": len(alert_manager.source_states),
+        "suppression": alert_manager.suppressor.get_stats()
     } 
\ No newline at end of file
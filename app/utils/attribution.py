@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import factorial
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.models.registry import source_models
+from app.utils.connection_manager import manager
+from app.utils.inference_executor import _pin_torch_threads
+from app.config import (FEATURE_NAMES, EXPLAIN_ENABLED, EXPLAIN_WORKERS, EXPLAIN_MAX_PENDING,
+                        EXPLAIN_BACKGROUND_PATH, EXPLAIN_BACKGROUND_SIZE, EXPLAIN_NSAMPLES)
+
+# shap is heavy and only needed inside explainer processes, so it is imported there
+
+def feature_labels(dim: int) -> List[str]:
+    """Configured feature names, or positional ones for models of another width"""
+    return list(FEATURE_NAMES) if len(FEATURE_NAMES) == dim else [f"feature_{i}" for i in range(dim)]
+
+def breakdown(errors: Sequence[float]) -> Dict[str, float]:
+    """Per-feature reconstruction errors of one row, keyed by feature name"""
+    return dict(zip(feature_labels(len(errors)), map(float, errors)))
+
+def top_features(errors: np.ndarray) -> List[str]:
+    """Name of the feature with the largest reconstruction error, per row"""
+    labels = feature_labels(errors.shape[1])
+    return [labels[index] for index in errors.argmax(axis=1).tolist()]
+
+# Per explainer process caches, filled on first use
+_background: Optional[np.ndarray] = None
+_explainers: Dict[int, Any] = {}
+
+def _load_background(path: str, size: int, dim: int) -> np.ndarray:
+    """A fixed sample of reference rows; all-zero if there is no usable data"""
+    global _background
+    if _background is None or _background.shape[1] != dim:
+        rows = np.zeros((0, dim), dtype=np.float32)
+        if os.path.exists(path):
+            import pandas as pd
+            data = pd.read_csv(path, nrows=100 * size).select_dtypes("number").to_numpy(dtype=np.float32)
+            if data.ndim == 2 and data.shape[1] == dim:
+                rows = data
+        if len(rows) > size:
+            rows = rows[np.random.default_rng(0).choice(len(rows), size, replace=False)]
+        _background = rows if len(rows) else np.zeros((1, dim), dtype=np.float32)
+    return _background
+
+def exact_shapley(score_fn, x: np.ndarray, background: np.ndarray):
+    """Shapley values by enumerating every feature coalition against the background
+
+    2^D coalitions times the background size rows, scored in one pass; cheap
+    for the handful of features these models take.
+    """
+    dim = len(x)
+    masks = ((np.arange(2 ** dim)[:, None] >> np.arange(dim)) & 1).astype(bool)
+    rows = np.where(masks[:, None, :], x, background[None, :, :]).reshape(-1, dim)
+    values = score_fn(np.ascontiguousarray(rows, dtype=np.float32)).reshape(len(masks), -1).mean(axis=1)
+
+    sizes = masks.sum(axis=1)
+    weights = np.array([factorial(k) * factorial(dim - k - 1) / factorial(dim) for k in range(dim)])
+    shap_values = np.zeros(dim)
+    for feature in range(dim):
+        without = ~masks[:, feature]
+        with_feature = np.nonzero(without)[0] | (1 << feature)
+        shap_values[feature] = (weights[sizes[without]] * (values[with_feature] - values[without])).sum()
+    return float(values[0]), shap_values
+
+def _explain(features: List[float], source: Optional[str], background_path: str,
+             background_size: int, nsamples: int) -> Dict[str, Any]:
+    """Runs in an explainer process: SHAP values of one row's anomaly score"""
+    loaded = source_models.get(source)
+    score_fn = loaded.backend.score
+    x = np.asarray(features, dtype=np.float32)
+    background = _load_background(background_path, background_size, len(x))
+    start = time.perf_counter()
+    try:
+        import shap
+    except ImportError:
+        if len(x) > 12:
+            raise RuntimeError("Install shap to explain models with more than 12 features")
+        base_value, values = exact_shapley(score_fn, x, background)
+        method = "exact"
+    else:
+        explainer = _explainers.get(id(loaded))
+        if explainer is None:
+            explainer = _explainers[id(loaded)] = shap.KernelExplainer(
+                lambda rows: score_fn(np.ascontiguousarray(rows, dtype=np.float32)), background)
+        values = np.ravel(explainer.shap_values(x[None, :], nsamples=nsamples, silent=True))
+        base_value = float(np.ravel(explainer.expected_value)[0])
+        method = "kernel_shap"
+    return {
+        "method": method,
+        "base_value": base_value,
+        "shap_values": dict(zip(feature_labels(len(x)), map(float, values))),
+        "explain_seconds": time.perf_counter() - start
+    }
+
+class AnomalyExplainer:
+    """Explains flagged anomalies on a background process pool and pushes the results
+
+    Only anomalies are explained, at most `max_pending` at a time; anything
+    flagged beyond that is skipped rather than queued, so an anomaly storm
+    cannot build an unbounded backlog.
+    """
+
+    def __init__(self, workers: int = EXPLAIN_WORKERS, max_pending: int = EXPLAIN_MAX_PENDING,
+                 background_path: str = EXPLAIN_BACKGROUND_PATH,
+                 background_size: int = EXPLAIN_BACKGROUND_SIZE, nsamples: int = EXPLAIN_NSAMPLES):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.background_path = background_path
+        self.background_size = background_size
+        self.nsamples = nsamples
+        self.enabled = EXPLAIN_ENABLED
+        self._pool = None
+        self._tasks = set()
+        self.submitted = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_pin_torch_threads,
+                                             initargs=(1,))
+        return self._pool
+
+    def submit(self, features: Sequence[float], source: Optional[str], prediction: Dict[str, Any]) -> bool:
+        """Queue one flagged row for explanation; False if it was skipped"""
+        if not self.enabled:
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self.skipped += 1
+            return False
+        self.submitted += 1
+        task = asyncio.create_task(self._run([float(value) for value in features], source, prediction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, features: List[float], source: Optional[str], prediction: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        try:
+            explanation = await loop.run_in_executor(
+                self._ensure_pool(), _explain, features, source,
+                self.background_path, self.background_size, self.nsamples)
+        except Exception as e:
+            self.failed += 1
+            print(f"Anomaly explanation failed: {e}")
+            return
+        self.completed += 1
+        explanation.update({
+            "features": features,
+            "anomaly_score": prediction["anomaly_score"],
+            "timestamp": prediction["timestamp"]
+        })
+        if source is not None:
+            explanation["source"] = source
+        await manager.broadcast(json.dumps({
+            "type": "anomaly_explanation",
+            "data": explanation
+        }), topic="alerts")
+
+    def restart(self):
+        """Replace the pool so workers pick up reloaded models"""
+        if self._pool is not None:
+            old_pool, self._pool = self._pool, None
+            old_pool.shutdown(wait=False)
+
+    def shutdown(self):
+        """Stop the pool; pending and running explanations are dropped"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            # Prefork workers leave with os._exit, which skips the executor's own
+            # cleanup, so its processes would outlive them. SIGKILL because they
+            # were forked with the worker's SIGTERM handler.
+            processes = list((self._pool._processes or {}).values())
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.kill()
+            self._pool = None
+
+    def get_stats(self):
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "pending": len(self._tasks),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed
+        }
+
+# Global explainer instance
+explainer = AnomalyExplainer()
+
+def shutdown_explainer():
+    """Stop the explainer pool"""
+    explainer.shutdown()
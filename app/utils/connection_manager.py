@@ -1,28 +1,276 @@
-from fastapi import WebSocket
-from typing import List
+import asyncio
 import json
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from fastapi import WebSocket
+from app.utils.metrics import (broadcast_seconds, metrics, ws_disconnects_total, ws_dropped_total,
+                               ws_send_lag_seconds)
+from app.utils.pubsub import bus
+from app.config import (WS_SEND_QUEUE_SIZE, WS_DROP_POLICY, WS_SEND_TIMEOUT,
+                        TOPICS, STREAM_TICK_MS, STREAM_TICK_MAX_ITEMS)
+
+DROP_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+class ClientChannel:
+    """A WebSocket with its own bounded send queue drained by a dedicated task"""
+    
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        self.queue = deque()
+        self.dropped = 0
+        self.sent = 0
+        self.last_send_lag = 0.0
+        self.closed = False
+        # New clients hear everything until they narrow their subscription
+        self.topics = set(TOPICS)
+        self._wakeup = asyncio.Event()
+        self._sender = asyncio.create_task(self._drain())
+    
+    def enqueue(self, message: str, key: Optional[str] = None):
+        """Queue a message without waiting; apply the drop policy when full"""
+        if self.closed:
+            return
+        if len(self.queue) >= self.manager.max_queue:
+            policy = self.manager.drop_policy
+            if policy == "disconnect":
+                self.manager.disconnected_slow_clients += 1
+                ws_disconnects_total.inc()
+                self.manager.disconnect(self.websocket)
+                return
+            if policy == "coalesce" and key is not None and self._replace(key, message):
+                self.dropped += 1
+                ws_dropped_total.inc(policy)
+                return
+            self.queue.popleft()
+            self.dropped += 1
+            ws_dropped_total.inc(policy)
+        self.queue.append((key, message, time.monotonic()))
+        self._wakeup.set()
+    
+    def _replace(self, key: str, message: str) -> bool:
+        """Swap the oldest pending message with the same key for the newer one"""
+        for index, (queued_key, _, _) in enumerate(self.queue):
+            if queued_key == key:
+                del self.queue[index]
+                self.queue.append((key, message, time.monotonic()))
+                return True
+        return False
+    
+    async def _drain(self):
+        """Send queued messages in order until the client goes away"""
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.queue:
+                    _, message, queued_at = self.queue.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(message), WS_SEND_TIMEOUT)
+                    self.last_send_lag = time.monotonic() - queued_at
+                    ws_send_lag_seconds.observe(self.last_send_lag)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Failed or timed-out send: the client is gone or hopelessly slow
+            self.manager.disconnect(self.websocket)
+    
+    def close(self):
+        """Stop the sender and close the socket"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._sender.cancel()
+        asyncio.create_task(self._close_socket())
+    
+    async def _close_socket(self):
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+    
+    def get_stats(self):
+        return {
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_send_lag": self.last_send_lag,
+            "topics": sorted(self.topics)
+        }
+
+class TickCoalescer:
+    """Buffers high-rate items for a topic and sends them as one frame per tick"""
+    
+    def __init__(self, manager: "ConnectionManager", topic: str, frame_type: str,
+                 tick_ms: float = STREAM_TICK_MS, max_items: int = STREAM_TICK_MAX_ITEMS):
+        self.manager = manager
+        self.topic = topic
+        self.frame_type = frame_type
+        self.tick = tick_ms / 1000
+        self.items = deque(maxlen=max(1, max_items))
+        self.skipped = 0
+        self.frames_sent = 0
+        self._pending = 0
+        self._timer = None
+    
+    def add(self, item: Dict[str, Any]):
+        """Buffer one item; the first item after a flush arms the tick timer"""
+        if not self.manager.has_subscribers(self.topic):
+            return
+        if len(self.items) == self.items.maxlen:
+            self.skipped += 1
+        self.items.append(item)
+        self._pending += 1
+        if self._timer is None:
+            # Nothing is scheduled while idle, so a quiet topic costs nothing
+            self._timer = asyncio.get_running_loop().call_later(self.tick, self.flush)
+    
+    def flush(self):
+        """Serialize the buffered items once and fan the frame out"""
+        self._timer = None
+        if not self.items:
+            return
+        frame = {
+            "type": self.frame_type,
+            "timestamp": time.time(),
+            "count": self._pending,
+            "skipped": self.skipped,
+            "items": list(self.items)
+        }
+        self.items.clear()
+        self._pending = 0
+        self.skipped = 0
+        self.frames_sent += 1
+        self.manager.broadcast_nowait(json.dumps(frame), topic=self.topic)
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = WS_SEND_QUEUE_SIZE, drop_policy: str = WS_DROP_POLICY):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.max_queue = max(1, max_queue)
+        self.drop_policy = drop_policy
+        self.active_connections: Dict[WebSocket, ClientChannel] = {}
+        self.dropped_messages = 0
+        self.disconnected_slow_clients = 0
+        self.predictions = TickCoalescer(self, "predictions", "predictions")
+        self.actions: Dict[str, Callable[[WebSocket, Dict[str, Any]], Optional[str]]] = {}
+        self._subscription_listeners: List[Callable[[], None]] = []
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections[websocket] = ClientChannel(websocket, self)
+        self._subscriptions_changed()
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        channel = self.active_connections.pop(websocket, None)
+        if channel is not None:
+            self.dropped_messages += channel.dropped
+            channel.close()
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        channel = self.active_connections.get(websocket)
+        if channel is not None:
+            channel.enqueue(message)
+        else:
+            await websocket.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove disconnected connections
-                self.active_connections.remove(connection)
+    async def broadcast(self, message: str, key: Optional[str] = None, topic: Optional[str] = None):
+        """Queue a message for every subscribed client; never waits on a slow one"""
+        self.broadcast_nowait(message, key, topic)
+    
+    def broadcast_nowait(self, message: str, key: Optional[str] = None, topic: Optional[str] = None):
+        self.deliver(message, key, topic)
+        # Dashboards connected to other workers get it through the bus
+        bus.publish("ws.broadcast", {"message": message, "key": key, "topic": topic})
+    
+    def deliver(self, message: str, key: Optional[str] = None, topic: Optional[str] = None):
+        """Queue a message for this worker's own subscribed clients"""
+        start = time.perf_counter()
+        # Copy: a full queue under the disconnect policy removes its client
+        for channel in list(self.active_connections.values()):
+            if topic is None or topic in channel.topics:
+                channel.enqueue(message, key)
+        broadcast_seconds.observe(time.perf_counter() - start)
+    
+    def has_subscribers(self, topic: str) -> bool:
+        # Other workers' clients are not tracked here, so assume someone is listening
+        return bus.connected or any(topic in channel.topics for channel in self.active_connections.values())
+    
+    def publish_prediction(self, item: Dict[str, Any]):
+        """Add a prediction to the next batched "predictions" frame"""
+        self.predictions.add(item)
+    
+    def on_subscription_change(self, listener: Callable[[], None]):
+        """Call listener() whenever a client connects or subscribes to more topics"""
+        self._subscription_listeners.append(listener)
+    
+    def _subscriptions_changed(self):
+        for listener in self._subscription_listeners:
+            listener()
+    
+    def on_action(self, action: str, handler: Callable[[WebSocket, Dict[str, Any]], Optional[str]]):
+        """Answer {"action": action, ...} client messages with handler(websocket, request)"""
+        self.actions[action] = handler
+    
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str], replace: bool = False) -> List[str]:
+        channel = self.active_connections[websocket]
+        topics = {topic for topic in topics if topic in TOPICS}
+        channel.topics = topics if replace else channel.topics | topics
+        self._subscriptions_changed()
+        return sorted(channel.topics)
+    
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        channel = self.active_connections[websocket]
+        channel.topics -= set(topics)
+        return sorted(channel.topics)
+    
+    def handle_client_message(self, websocket: WebSocket, text: str) -> Optional[str]:
+        """Apply a subscription or registered action request; returns the reply, or None if it was not one"""
+        try:
+            request = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(request, dict) or websocket not in self.active_connections:
+            return None
+        
+        action = request.get("action")
+        topics = request.get("topics", [])
+        if action in ("subscribe", "unsubscribe") and not (
+                isinstance(topics, list) and all(isinstance(topic, str) for topic in topics)):
+            # A bare string would otherwise be read one character at a time
+            return json.dumps({"type": "error", "action": action,
+                               "detail": '"topics" must be a list of topic names'})
+        if action == "subscribe":
+            current = self.subscribe(websocket, topics, replace=request.get("replace", False))
+        elif action == "unsubscribe":
+            current = self.unsubscribe(websocket, topics)
+        elif action in self.actions:
+            return self.actions[action](websocket, request)
+        else:
+            return None
+        return json.dumps({"type": "subscriptions", "topics": current, "available": list(TOPICS)})
+    
+    def get_stats(self):
+        """Get fan-out statistics across clients"""
+        channels = list(self.active_connections.values())
+        return {
+            "active_connections": len(channels),
+            "drop_policy": self.drop_policy,
+            "max_queue": self.max_queue,
+            "queued": sum(len(channel.queue) for channel in channels),
+            "dropped_messages": self.dropped_messages + sum(channel.dropped for channel in channels),
+            "disconnected_slow_clients": self.disconnected_slow_clients,
+            "max_send_lag": max((channel.last_send_lag for channel in channels), default=0.0),
+            "prediction_frames_sent": self.predictions.frames_sent
+        }
 
 # Global manager instance
-manager = ConnectionManager() 
\ No newline at end of file
+manager = ConnectionManager() 
+
+bus.subscribe("ws.broadcast", lambda frame: manager.deliver(frame["message"], frame["key"], frame["topic"]))
+
+metrics.gauge("ztaatds_ws_connections", "Connected WebSocket clients", lambda: len(manager.active_connections))
+metrics.gauge("ztaatds_ws_queued_messages", "Messages waiting in all client send queues",
+              lambda: sum(len(channel.queue) for channel in manager.active_connections.values()))
@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+import torch
+from app.config import INFERENCE_EXECUTOR, INFERENCE_WORKERS, TORCH_NUM_THREADS
+
+def _pin_torch_threads(num_threads: int):
+    """Pin torch intra-op parallelism for the current process"""
+    torch.set_num_threads(num_threads)
+
+class InferenceExecutor:
+    """Runs model scoring on a dedicated pool so the event loop stays responsive"""
+    
+    def __init__(self, kind: str = "thread", workers: int = 1, torch_threads: int = 1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.torch_threads = max(1, torch_threads)
+        self._pool = None
+    
+    def _ensure_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_pin_torch_threads,
+                    initargs=(self.torch_threads,)
+                )
+            else:
+                # Thread workers share the process-wide torch thread pool
+                _pin_torch_threads(self.torch_threads)
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="inference"
+                )
+        return self._pool
+    
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on the inference pool and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure_pool(), fn, *args)
+    
+    def restart(self):
+        """Replace the pool; in-flight work finishes on the old one"""
+        if self.kind == "process" and self._pool is not None:
+            # Process workers hold their own model copy, so fork fresh ones
+            old_pool, self._pool = self._pool, None
+            old_pool.shutdown(wait=False)
+    
+    def shutdown(self):
+        """Shut the pool down, waiting for in-flight work"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+# Global inference executor instance
+inference_executor = InferenceExecutor(INFERENCE_EXECUTOR, INFERENCE_WORKERS, TORCH_NUM_THREADS)
+
+def shutdown_inference_executor():
+    """Stop the inference pool"""
+    inference_executor.shutdown()
@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter; label values are passed positionally in labelnames order"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+class Gauge:
+    """Current value, either set directly or read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self):
+        value = self.value
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                # A broken callback must not take the whole scrape down
+                return
+        yield self.name, "", value
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three additions"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), count
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Global registry instance
+metrics = MetricsRegistry()
+
+# Hot-path instruments shared across modules
+inference_seconds = metrics.histogram(
+    "ztaatds_inference_seconds", "Time to score one batch of feature vectors", ("path",))
+inference_batch_rows = metrics.histogram(
+    "ztaatds_inference_batch_rows", "Feature vectors scored per forward pass", ("path",), SIZE_BUCKETS)
+predictions_total = metrics.counter(
+    "ztaatds_predictions_total", "Feature vectors scored", ("result",))
+broadcast_seconds = metrics.histogram(
+    "ztaatds_broadcast_seconds", "Time to queue one message for every subscribed client")
+ws_send_lag_seconds = metrics.histogram(
+    "ztaatds_ws_send_lag_seconds", "Time a message waited in a client queue before it was sent")
+ws_dropped_total = metrics.counter(
+    "ztaatds_ws_dropped_messages_total", "Messages dropped from full client queues", ("policy",))
+ws_disconnects_total = metrics.counter(
+    "ztaatds_ws_slow_client_disconnects_total", "Clients disconnected for falling behind")
+alerts_total = metrics.counter(
+    "ztaatds_alerts_total", "Alerts sent", ("alert_type", "severity"))
+alerts_suppressed_total = metrics.counter(
+    "ztaatds_alerts_suppressed_total", "Alerts held back by cooldowns or storm mode", ("alert_type",))
+# Observed by the scheduler: how far past its deadline each periodic job woke up
+event_loop_lag_seconds = metrics.histogram(
+    "ztaatds_event_loop_lag_seconds", "How late the event loop woke a sleeping task")
+event_loop_lag = metrics.gauge(
+    "ztaatds_event_loop_lag_last_seconds", "Most recent event loop lag measurement")
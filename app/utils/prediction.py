@@ -1,40 +1,239 @@
-import torch
 import asyncio
-from app.models.autoencoder import LogAutoEncoder
+import time
+import numpy as np
+from app.models.registry import registry, source_models
 from app.utils.connection_manager import manager
-from app.utils.alerting import process_anomaly_alert
+from app.utils.alerting import process_anomaly_alert, process_batch_alert, record_prediction
+from app.utils.attribution import breakdown, explainer, top_features
+from app.utils.batching import MicroBatcher
+from app.utils.inference_executor import inference_executor
+from app.utils.pubsub import bus
+from app.utils.metrics import inference_batch_rows, inference_seconds, metrics, predictions_total
+from app.utils.quantiles import reset_thresholds, threshold_for
+from app.utils.rollups import rollups
+from app.utils.score_cache import score_cache
+from app.utils.storage import event_store
+from app.config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
 import json
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
 
-# Load model
-INPUT_DIM = 5  # Update based on your dataset
-model = LogAutoEncoder(INPUT_DIM)
-model.load_state_dict(torch.load("model.pt"))
-model.eval()
-
-async def predict_anomaly(features):
-    """Predict anomaly for given features"""
-    x = torch.tensor([features], dtype=torch.float32)
-    with torch.no_grad():
-        recon = model(x)
-        score = torch.nn.functional.mse_loss(x, recon).item()
-        is_anomalous = score > 0.05
-        
-        result = {
-            "anomaly_score": score, 
-            "is_anomalous": is_anomalous,
-            "timestamp": asyncio.get_event_loop().time()
+def error_matrix(x: np.ndarray, source: Optional[str] = None) -> np.ndarray:
+    """N x D per-feature reconstruction errors of an N x D float32 matrix, in one vectorized pass"""
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    if not x.flags.writeable:
+        # Arrays decoded straight from a request body are read-only views
+        x = x.copy()
+    return source_models.get(source).backend.feature_errors(x)
+
+def score_matrix(x: np.ndarray, source: Optional[str] = None) -> np.ndarray:
+    """Score every row of an N x D float32 matrix in one vectorized pass"""
+    return error_matrix(x, source).mean(axis=1)
+
+def _group_rows(sources: Sequence[Optional[str]], key=lambda source: source) -> Dict[Any, Tuple[Optional[str], np.ndarray]]:
+    """Row indices per key(source), with one representative source each"""
+    groups = {}
+    for index, source in enumerate(sources):
+        groups.setdefault(key(source), (source, []))[1].append(index)
+    return {group: (source, np.asarray(rows)) for group, (source, rows) in groups.items()}
+
+def error_rows(x: np.ndarray, sources: Union[None, str, Sequence[Optional[str]]] = None) -> np.ndarray:
+    """Per-feature errors with each row's source's model: one source for all rows, or one per row"""
+    if sources is None or isinstance(sources, str):
+        return error_matrix(x, sources)
+    x = np.asarray(x, dtype=np.float32)
+    errors = np.empty(x.shape, dtype=np.float32)
+    # Sources sharing a model (a group, or the global fallback) share one forward pass
+    for source, rows in _group_rows(sources, source_models.resolve).values():
+        errors[rows] = error_matrix(x[rows], source)
+    return errors
+
+def _score_features(batch):
+    features = np.asarray([row for row, _ in batch], dtype=np.float32)
+    errors = error_rows(features, [source for _, source in batch])
+    return list(zip(errors.mean(axis=1).tolist(), errors.tolist()))
+
+# Process workers must be re-forked to pick up a reloaded model
+registry.on_reload(lambda _: inference_executor.restart())
+registry.on_reload(lambda _: explainer.restart())
+# Cached scores came from the old model
+registry.on_reload(lambda _: score_cache.clear())
+
+# Reloads and threshold resets requested through another worker
+bus.subscribe("model.reload", lambda frame: asyncio.get_running_loop().run_in_executor(None, registry.reload, frame["path"]))
+bus.subscribe("model.invalidate", lambda frame: invalidate_source_model(frame["key"]))
+bus.subscribe("threshold.reset", lambda _: reset_thresholds())
+
+# Concurrent callers share forward passes through the batcher
+batcher = MicroBatcher(_score_features, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                       executor=inference_executor)
+
+metrics.gauge("ztaatds_batcher_queue_depth", "Single predictions waiting for a micro-batch",
+              lambda: batcher.get_stats()["queue_depth"])
+
+def invalidate_source_model(key: Optional[str] = None):
+    """Drop a cached per-source model so the next use reloads it from disk"""
+    source_models.invalidate(key)
+    explainer.restart()
+    score_cache.clear()
+
+async def _score_one(features, source: Optional[str]):
+    """(score, per-feature errors) of one vector, from the score cache if it was seen recently"""
+    if not score_cache.enabled:
+        return await batcher.submit((features, source))
+    key = score_cache.keys(features, [source_models.resolve(source)])[0]
+    generation = score_cache.generation
+    cached = score_cache.get_many([key])[0]
+    if cached is not None:
+        return cached
+    score, errors = await batcher.submit((features, source))
+    score_cache.put_many([key], [score], [errors], generation)
+    return score, errors
+
+async def _error_rows(x: np.ndarray, sources: Union[None, str, Sequence[Optional[str]]]) -> np.ndarray:
+    """error_rows on the inference executor, scoring only the rows the score cache misses"""
+    if not score_cache.covers(len(x)):
+        return await inference_executor.run(error_rows, x, sources)
+    per_row = sources is not None and not isinstance(sources, str)
+    model_keys = [source_models.resolve(source) for source in sources] if per_row \
+        else [source_models.resolve(sources)] * len(x)
+    keys = score_cache.keys(x, model_keys)
+    generation = score_cache.generation
+    cached = score_cache.get_many(keys)
+    misses = [row for row, entry in enumerate(cached) if entry is None]
+    if len(misses) == len(x):
+        errors = await inference_executor.run(error_rows, x, sources)
+    else:
+        errors = np.empty(np.shape(x), dtype=np.float32)
+        for row, entry in enumerate(cached):
+            if entry is not None:
+                errors[row] = entry[1]
+        if misses:
+            errors[misses] = await inference_executor.run(
+                error_rows, x[misses], [sources[row] for row in misses] if per_row else sources)
+    if misses:
+        fresh = errors[misses]
+        score_cache.put_many([keys[row] for row in misses], fresh.mean(axis=1).tolist(), fresh.tolist(),
+                             generation)
+    return errors
+
+async def predict_anomaly(features, source: Optional[str] = None):
+    """Predict anomaly for given features, with the source's own model and threshold"""
+    score, errors = await _score_one(features, source)
+    scores = threshold_for(source_models.resolve(source))
+    threshold = scores.threshold
+    is_anomalous = score > threshold
+    scores.update(score)
+    predictions_total.inc("anomalous" if is_anomalous else "normal")
+    event_store.add_prediction(time.time(), score, is_anomalous, source)
+    rollups.record(score, is_anomalous)
+    
+    result = {
+        "anomaly_score": score, 
+        "is_anomalous": is_anomalous,
+        "threshold": threshold,
+        "feature_errors": breakdown(errors),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+    if source is not None:
+        result["source"] = source
+    
+    # Broadcast anomaly detection to all connected WebSocket clients
+    if is_anomalous:
+        alert_data = {
+            "type": "anomaly_alert",
+            "data": result,
+            "message": f"Anomaly detected! Score: {score:.4f}"
         }
+        await manager.broadcast(json.dumps(alert_data), topic="alerts")
+        # The full SHAP breakdown follows as an anomaly_explanation message
+        explainer.submit(features, source, result)
         
-        # Broadcast anomaly detection to all connected WebSocket clients
-        if is_anomalous:
-            alert_data = {
-                "type": "anomaly_alert",
-                "data": result,
-                "message": f"Anomaly detected! Score: {score:.4f}"
-            }
-            await manager.broadcast(json.dumps(alert_data))
-            
-            # Process for alerting system
-            await process_anomaly_alert(result)
-        
-        return result 
\ No newline at end of file
+        # Process for alerting system
+        await process_anomaly_alert(result)
+    else:
+        # Normal scores still count towards the alerting windows' rates
+        record_prediction(score, False, source)
+    
+    return result
+
+async def predict_anomaly_batch(x: np.ndarray, sources: Union[None, str, Sequence[Optional[str]]] = None):
+    """Predict anomalies for every row of an N x D feature matrix
+
+    `sources` routes rows to per-source models and alert state: None, one
+    source for the whole batch, or one per row. With per-row sources from more
+    than one model, "threshold" is per row too.
+    """
+    if sources is not None and not isinstance(sources, str) and len(set(sources)) <= 1:
+        sources = sources[0] if len(sources) else None
+    start = time.perf_counter()
+    errors = await _error_rows(x, sources)
+    scores = errors.mean(axis=1)
+    inference_seconds.observe(time.perf_counter() - start, "bulk")
+    inference_batch_rows.observe(len(scores), "bulk")
+    
+    if sources is None or isinstance(sources, str):
+        by_model = {None: (sources, slice(None))}
+        by_source = by_model
+    else:
+        by_model = _group_rows(sources, source_models.resolve)
+        by_source = _group_rows(sources)
+    
+    thresholds = np.empty(len(scores), dtype=np.float64)
+    for source, rows in by_model.values():
+        model_threshold = threshold_for(source_models.resolve(source))
+        thresholds[rows] = model_threshold.threshold
+        model_threshold.update_many(scores[rows].tolist())
+    flags = scores > thresholds
+    threshold = float(thresholds[0]) if len(by_model) == 1 and len(scores) else thresholds.tolist()
+    timestamp = asyncio.get_event_loop().time()
+    
+    result = {
+        "count": int(len(scores)),
+        "anomaly_scores": scores.tolist(),
+        "is_anomalous": flags.tolist(),
+        "threshold": threshold,
+        "anomaly_count": int(flags.sum()),
+        "top_features": top_features(errors),
+        "timestamp": timestamp
+    }
+    predictions_total.inc("anomalous", amount=result["anomaly_count"])
+    predictions_total.inc("normal", amount=result["count"] - result["anomaly_count"])
+    event_store.add_predictions(time.time(), result["anomaly_scores"], result["is_anomalous"], sources)
+    rollups.record_batch(scores, flags)
+    
+    # One broadcast per batch, for the worst row, instead of one per anomaly
+    worst = int(scores.argmax()) if len(scores) else 0
+    if result["anomaly_count"]:
+        worst_data = _row_data(scores, flags, thresholds, worst, timestamp, sources)
+        worst_data["feature_errors"] = breakdown(errors[worst])
+        alert_data = {
+            "type": "anomaly_alert",
+            "data": worst_data,
+            "message": f"{result['anomaly_count']} anomalies detected in batch of {result['count']}! Max score: {scores[worst]:.4f}"
+        }
+        await manager.broadcast(json.dumps(alert_data), topic="alerts")
+        explainer.submit(x[worst], worst_data.get("source"), worst_data)
+    
+    # ...and one alert check per source, for that source's worst row
+    for source, rows in by_source.values():
+        rows = np.arange(len(scores)) if isinstance(rows, slice) else rows
+        group_worst = int(rows[scores[rows].argmax()]) if len(rows) else 0
+        group_data = _row_data(scores, flags, thresholds, group_worst, timestamp, sources, rows)
+        group_data["feature_errors"] = breakdown(errors[group_worst])
+        await process_batch_alert(scores[rows], flags[rows], group_data)
+    
+    return result
+
+def _row_data(scores, flags, thresholds, row, timestamp, sources, rows=None) -> Dict[str, Any]:
+    """Alert payload describing one row of a scored batch"""
+    data = {
+        "anomaly_score": float(scores[row]) if len(scores) else 0.0,
+        "is_anomalous": bool(flags.any() if rows is None else flags[rows].any()),
+        "threshold": float(thresholds[row]) if len(scores) else 0.0,
+        "timestamp": timestamp,
+        "row": row
+    }
+    source = sources if sources is None or isinstance(sources, str) else sources[row] if len(sources) else None
+    if source is not None:
+        data["source"] = source
+    return data
@@ -1,7 +1,42 @@
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
+import os
+import numpy as np
 
-def load_and_normalize(path):
-    df = pd.read_csv(path)
+# pandas and sklearn are only needed to fit a scaler, never to apply one,
+# so they are imported where used to keep them out of the inference path
+
+def scaler_path_for(model_path):
+    """Scaler parameters live next to the checkpoint they were trained with"""
+    return os.path.splitext(model_path)[0] + ".scaler.npz"
+
+def fit_scaler(path, chunk_size=100000):
+    """Fit a MinMaxScaler incrementally over a CSV or .npy file, chunk by chunk"""
+    from sklearn.preprocessing import MinMaxScaler
+    
     scaler = MinMaxScaler()
-    return scaler.fit_transform(df)
\ No newline at end of file
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        for start in range(0, len(data), chunk_size):
+            scaler.partial_fit(data[start:start + chunk_size])
+    else:
+        import pandas as pd
+        for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=np.float32):
+            scaler.partial_fit(chunk.to_numpy(dtype=np.float32))
+    return scaler
+
+def save_scaler(scaler, path):
+    """Persist a fitted scaler as a precomputed x * scale + offset transform"""
+    np.savez(path, scale=scaler.scale_.astype(np.float32), offset=scaler.min_.astype(np.float32),
+             data_min=scaler.data_min_, data_max=scaler.data_max_)
+
+def load_scaler(path):
+    """Load (scale, offset) float32 vectors, or None when no scaler was saved"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as params:
+        return params["scale"].astype(np.float32), params["offset"].astype(np.float32)
+
+def load_and_normalize(path):
+    import pandas as pd
+    
+    scaler = fit_scaler(path)
+    return scaler.transform(pd.read_csv(path).to_numpy(dtype=np.float32))
@@ -0,0 +1,189 @@
+import asyncio
+import fcntl
+import inspect
+import json
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+from app.config import PUBSUB_ENABLED, PUBSUB_SOCKET, PUBSUB_MAX_BUFFER
+
+class PubSubBus:
+    """Cross-worker pub/sub over a local UNIX socket
+
+    Every worker connects as a client. Whichever worker holds the lock file
+    also hosts the broker, which relays each frame to every other client, and
+    is the leader that owns shared state such as alert windows. If the leader
+    exits, the lock is released and a surviving worker takes over.
+    """
+
+    def __init__(self, path: str = PUBSUB_SOCKET, max_buffer: int = PUBSUB_MAX_BUFFER):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_buffer = max_buffer
+        self.worker_id = os.getpid()
+        self.is_leader = False
+        self.connected = False
+        self.handlers: Dict[str, List[Callable[[Any], Any]]] = defaultdict(list)
+        self._connect_listeners: List[Callable[[], None]] = []
+        self.published = 0
+        self.received = 0
+        self.relay_dropped = 0
+        self._lock_file = None
+        self._server = None
+        self._peers = set()
+        self._writer = None
+        self._outbox: List[str] = []
+        self._task = None
+
+    def subscribe(self, channel: str, handler: Callable[[Any], Any]):
+        """Call handler(payload) for frames other workers publish on channel"""
+        self.handlers[channel].append(handler)
+
+    def on_connect(self, listener: Callable[[], None]):
+        """Call listener() each time this worker (re)joins the group"""
+        self._connect_listeners.append(listener)
+
+    def publish(self, channel: str, payload: Any):
+        """Send a frame to every other worker; a no-op when not connected"""
+        if not self.connected:
+            return
+        if not self._outbox:
+            # Frames published in the same loop iteration go out in one write
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._outbox.append(json.dumps({"c": channel, "p": payload}) + "\n")
+        self.published += 1
+
+    def _flush(self):
+        frames, self._outbox = self._outbox, []
+        if self._writer is not None and frames:
+            self._writer.write("".join(frames).encode())
+
+    async def start(self):
+        self.worker_id = os.getpid()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            self._server = None
+        if self._lock_file is not None:
+            # Closing the file releases the flock for the next leader
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+
+    async def _run(self):
+        """Stay connected, taking over as broker whenever the lock is free"""
+        while True:
+            if not self.is_leader:
+                await self._try_lead()
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=self.max_buffer)
+            except OSError:
+                await asyncio.sleep(0.2)
+                continue
+
+            self.connected = True
+            for listener in self._connect_listeners:
+                listener()
+            try:
+                await self._read(reader)
+            finally:
+                self.connected = False
+                self._outbox.clear()
+                self._writer.close()
+                self._writer = None
+            await asyncio.sleep(0.1)
+
+    async def _try_lead(self):
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        # The lock proves any existing socket file is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._relay, self.path, limit=self.max_buffer)
+        self.is_leader = True
+        print(f"Worker {self.worker_id} is now the pub/sub leader")
+
+    async def _relay(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Broker side: forward each line from one worker to all the others"""
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    if peer is writer:
+                        continue
+                    if peer.transport.get_write_buffer_size() > self.max_buffer:
+                        # A stuck worker must not grow the broker without bound
+                        self.relay_dropped += 1
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        """Client side: dispatch frames in order; async handlers are awaited"""
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                frame = json.loads(line)
+            except ValueError:
+                continue
+            self.received += 1
+            for handler in self.handlers.get(frame["c"], ()):
+                try:
+                    result = handler(frame["p"])
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    print(f"Pub/sub handler for {frame['c']} failed: {e}")
+
+    def get_stats(self):
+        return {
+            "enabled": self._task is not None,
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "connected": self.connected,
+            "peers": len(self._peers) if self.is_leader else None,
+            "published": self.published,
+            "received": self.received,
+            "relay_dropped": self.relay_dropped
+        }
+
+# Global bus instance
+bus = PubSubBus()
+
+def is_follower() -> bool:
+    """True in a worker that must defer shared state to the leader"""
+    return bus.connected and not bus.is_leader
+
+async def start_pubsub():
+    """Join the other workers when running with more than one"""
+    if PUBSUB_ENABLED:
+        await bus.start()
+
+async def stop_pubsub():
+    await bus.stop()
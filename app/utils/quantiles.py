@@ -0,0 +1,168 @@
+import math
+from typing import Dict, Iterable, Optional
+from app.config import (ANOMALY_THRESHOLD, ADAPTIVE_THRESHOLD, THRESHOLD_PERCENTILE,
+                        HIGH_SCORE_PERCENTILE, THRESHOLD_MIN_SAMPLES, THRESHOLD_MAX_BATCH_UPDATES)
+
+class P2Quantile:
+    """Streaming quantile estimate in O(1) time and memory (Jain & Chlamtac P² algorithm)"""
+    
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Quantile must be in (0, 1), got {p}")
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+    
+    def add(self, x: float):
+        """Fold one observation into the five markers"""
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+        
+        positions = self._positions
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Nudge the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+    
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    def _linear(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+    
+    def value(self) -> Optional[float]:
+        """Current quantile estimate, or None before any observation"""
+        if not self._heights:
+            return None
+        if self.count <= 5:
+            # Too few points for markers: nearest-rank on what we have
+            return self._heights[min(len(self._heights) - 1, int(self.p * len(self._heights)))]
+        return self._heights[2]
+
+class AdaptiveThreshold:
+    """Anomaly cutoff tracking a percentile of the score distribution in bounded memory"""
+    
+    def __init__(self, percentile: float = THRESHOLD_PERCENTILE, high_percentile: float = HIGH_SCORE_PERCENTILE,
+                 static_threshold: float = ANOMALY_THRESHOLD, adaptive: bool = ADAPTIVE_THRESHOLD,
+                 min_samples: int = THRESHOLD_MIN_SAMPLES, tracked=(50.0, 90.0, 95.0, 99.0, 99.9)):
+        self.percentile = percentile
+        self.high_percentile = high_percentile
+        self.static_threshold = static_threshold
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self._tracked = sorted(set(tracked) | {percentile, high_percentile})
+        self.reset()
+    
+    def reset(self):
+        """Forget the observed distribution, e.g. after a workload change"""
+        self._estimators = {pct: P2Quantile(pct / 100) for pct in self._tracked}
+        self.count = 0
+    
+    def update(self, score: float):
+        """Fold one score into every tracked quantile; NaN or infinite scores are ignored"""
+        if not math.isfinite(score):
+            # One NaN would poison every marker height for good
+            return
+        self.count += 1
+        for estimator in self._estimators.values():
+            estimator.add(score)
+    
+    def update_many(self, scores: Iterable[float]):
+        """Fold a bulk batch in, sampling evenly so cost stays bounded per batch"""
+        scores = [score for score in scores if math.isfinite(score)]
+        stride = max(1, len(scores) // THRESHOLD_MAX_BATCH_UPDATES)
+        for score in scores[::stride]:
+            self.update(score)
+    
+    @property
+    def warmed_up(self) -> bool:
+        return self.adaptive and self.count >= self.min_samples
+    
+    def quantile(self, percentile: float) -> Optional[float]:
+        """Estimate for one of the tracked percentiles"""
+        return self._estimators[percentile].value()
+    
+    @property
+    def threshold(self) -> float:
+        """Score above which a prediction is anomalous"""
+        if not self.warmed_up:
+            return self.static_threshold
+        return self.quantile(self.percentile)
+    
+    @property
+    def high_threshold(self) -> float:
+        """Score above which an anomaly is considered severe"""
+        if not self.warmed_up:
+            return self.static_threshold * 2
+        return self.quantile(self.high_percentile)
+    
+    def quantiles(self) -> Dict[str, Optional[float]]:
+        return {f"p{pct:g}": self.quantile(pct) for pct in self._tracked}
+    
+    def get_stats(self):
+        """Get the current threshold and score distribution"""
+        return {
+            "threshold": self.threshold,
+            "high_threshold": self.high_threshold,
+            "percentile": self.percentile,
+            "high_percentile": self.high_percentile,
+            "adaptive": self.adaptive,
+            "warmed_up": self.warmed_up,
+            "samples": self.count,
+            "quantiles": self.quantiles()
+        }
+
+# Global threshold instance shared by prediction and alerting
+anomaly_threshold = AdaptiveThreshold()
+
+# Each per-source model has its own score scale, so its own threshold
+model_thresholds: Dict[str, AdaptiveThreshold] = {}
+
+def threshold_for(model_key: Optional[str]) -> AdaptiveThreshold:
+    """The threshold for a per-source model key, or the global one for None"""
+    if model_key is None:
+        return anomaly_threshold
+    threshold = model_thresholds.get(model_key)
+    if threshold is None:
+        threshold = model_thresholds[model_key] = AdaptiveThreshold()
+    return threshold
+
+def reset_thresholds():
+    """Forget the learned distribution of the global and every per-source model"""
+    anomaly_threshold.reset()
+    for threshold in model_thresholds.values():
+        threshold.reset()
@@ -1,10 +1,15 @@
 import asyncio
 import json
 import time
-import random
-from typing import AsyncGenerator, Dict, Any
+from typing import Dict, Any, List, Optional
+import numpy as np
+from app.models.registry import registry
 from app.utils.connection_manager import manager
-from app.utils.prediction import predict_anomaly
+from app.utils.metrics import metrics
+from app.utils.prediction import predict_anomaly_batch
+from app.utils.scheduler import scheduler
+from app.utils.sources import LogSource, SimulatedSource
+from app.config import INGEST_QUEUE_BATCHES, INGEST_BATCH_SIZE
 
 class RealTimeStreamer:
     """Real-time data streaming and processing utility"""
@@ -13,103 +18,143 @@ class RealTimeStreamer:
         self.is_running = False
         self.processed_count = 0
         self.anomaly_count = 0
+        self.rejected_count = 0
         self.start_time = None
+        self.source: Optional[LogSource] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._ingest_task = None
         
-    async def start_streaming(self):
+    async def start_streaming(self, source: Optional[LogSource] = None):
         """Start real-time data streaming"""
         self.is_running = True
         self.start_time = time.time()
+        self.source = source or SimulatedSource()
+        # Bounded: when scoring falls behind, the source is made to wait
+        self._queue = asyncio.Queue(maxsize=INGEST_QUEUE_BATCHES)
         
-        # Start background monitoring task
-        asyncio.create_task(self._background_monitoring())
-        
-        # Start data streaming
-        async for data in self._generate_log_data():
-            if not self.is_running:
-                break
-                
-            await self._process_log_data(data)
+        # Ingest in its own task; score batches here as they arrive
+        self._ingest_task = asyncio.create_task(self._ingest())
+        try:
+            while self.is_running:
+                batch = await self._queue.get()
+                if batch is None:
+                    break
+                # Fold in whatever else is already waiting, up to one scoring batch
+                while len(batch) < INGEST_BATCH_SIZE and not self._queue.empty():
+                    more = self._queue.get_nowait()
+                    if more is None:
+                        self.is_running = False
+                        break
+                    batch.extend(more)
+                await self._process_batch(batch)
+        finally:
+            await self._shutdown_source()
     
     async def stop_streaming(self):
         """Stop real-time data streaming"""
         self.is_running = False
+        if self._queue is not None:
+            # Wake the scoring loop if it is waiting on an idle source
+            try:
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
     
-    async def _generate_log_data(self) -> AsyncGenerator[Dict[str, Any], None]:
-        """Generate simulated log data in real-time"""
-        while self.is_running:
-            # Simulate log data generation
-            log_entry = {
-                "timestamp": time.time(),
-                "source": "system_logs",
-                "level": random.choice(["INFO", "WARNING", "ERROR"]),
-                "message": f"Log entry {self.processed_count}",
-                "features": [
-                    random.uniform(0, 5),  # Feature 1
-                    random.uniform(0, 5),  # Feature 2
-                    random.uniform(0, 5),  # Feature 3
-                    random.uniform(0, 5),  # Feature 4
-                    random.uniform(0, 5)   # Feature 5
-                ]
-            }
-            
-            yield log_entry
-            await asyncio.sleep(1)  # Generate data every second
+    async def _ingest(self):
+        """Move parsed batches from the source into the bounded queue"""
+        try:
+            async for batch in self.source.batches():
+                if not self.is_running:
+                    break
+                await self._queue.put(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error reading from log source {self.source.name}: {e}")
+            await self.stop_streaming()
+    
+    async def _shutdown_source(self):
+        if self._ingest_task is not None:
+            self._ingest_task.cancel()
+            self._ingest_task = None
+        if self.source is not None:
+            await self.source.close()
     
-    async def _process_log_data(self, log_data: Dict[str, Any]):
-        """Process log data through anomaly detection"""
+    async def _process_batch(self, entries: List[Dict[str, Any]]):
+        """Score a batch of log entries in one vectorized pass"""
         try:
-            # Extract features for anomaly detection
-            features = log_data["features"]
+            dim = registry.input_dim
+            valid = [entry for entry in entries if len(entry["features"]) == dim]
+            if valid:
+                x = np.asarray([entry["features"] for entry in valid], dtype=np.float32)
+                # NaN or infinite readings can't be scored meaningfully
+                finite = np.isfinite(x).all(axis=1)
+                if not finite.all():
+                    valid = [entry for entry, keep in zip(valid, finite) if keep]
+                    x = x[finite]
+            self.rejected_count += len(entries) - len(valid)
+            entries = valid
+            if not entries:
+                return
             
-            # Get prediction using the separate prediction module
-            result = await predict_anomaly(features)
+            # Each host is routed to its own model and alert windows
+            result = await predict_anomaly_batch(x, [entry.get("host") for entry in entries])
+            thresholds = result["threshold"]
+            if not isinstance(thresholds, list):
+                thresholds = [thresholds] * result["count"]
             
             # Update counters
-            self.processed_count += 1
-            if result["is_anomalous"]:
-                self.anomaly_count += 1
+            self.processed_count += result["count"]
+            self.anomaly_count += result["anomaly_count"]
             
-            # Broadcast real-time update
-            await self._broadcast_update(log_data, result)
+            for entry, score, is_anomalous, threshold, top_feature in zip(
+                    entries, result["anomaly_scores"], result["is_anomalous"], thresholds, result["top_features"]):
+                self._broadcast_update(entry, {
+                    "anomaly_score": score,
+                    "is_anomalous": is_anomalous,
+                    "threshold": threshold,
+                    "top_feature": top_feature,
+                    "timestamp": result["timestamp"]
+                })
             
         except Exception as e:
             print(f"Error processing log data: {e}")
     
-    async def _broadcast_update(self, log_data: Dict[str, Any], prediction_result: Dict[str, Any]):
-        """Broadcast real-time updates to connected clients"""
-        update_data = {
-            "type": "log_processed",
+    def _broadcast_update(self, log_data: Dict[str, Any], prediction_result: Dict[str, Any]):
+        """Stream real-time updates to clients subscribed to predictions"""
+        # Coalesced into one "predictions" frame per tick; counters go out on the stats topic
+        manager.publish_prediction({
+            "source": log_data["source"],
+            "host": log_data.get("host"),
+            "level": log_data["level"],
+            "timestamp": log_data["timestamp"],
+            "prediction": prediction_result
+        })
+    
+    async def broadcast_monitoring(self):
+        """Send streaming counters to dashboards"""
+        monitoring_data = {
+            "type": "system_monitoring",
             "timestamp": time.time(),
-            "log_data": log_data,
-            "prediction": prediction_result,
-            "stats": {
-                "processed_count": self.processed_count,
-                "anomaly_count": self.anomaly_count,
-                "uptime": time.time() - self.start_time if self.start_time else 0
-            }
+            "status": "active",
+            "processed_logs": self.processed_count,
+            "anomalies_detected": self.anomaly_count,
+            "uptime": time.time() - self.start_time if self.start_time else 0,
+            "throughput": self.processed_count / max(1, (time.time() - self.start_time)) if self.start_time else 0
         }
-        
-        await manager.broadcast(json.dumps(update_data))
-    
-    async def _background_monitoring(self):
-        """Background task for system monitoring"""
-        while self.is_running:
-            monitoring_data = {
-                "type": "system_monitoring",
-                "timestamp": time.time(),
-                "status": "active",
-                "processed_logs": self.processed_count,
-                "anomalies_detected": self.anomaly_count,
-                "uptime": time.time() - self.start_time if self.start_time else 0,
-                "throughput": self.processed_count / max(1, (time.time() - self.start_time)) if self.start_time else 0
-            }
-            
-            await manager.broadcast(json.dumps(monitoring_data))
-            await asyncio.sleep(5)  # Update every 5 seconds
+        await manager.broadcast(json.dumps(monitoring_data), key="system_monitoring", topic="stats")
 
 # Global streamer instance
 streamer = RealTimeStreamer()
 
+scheduler.every(5.0, streamer.broadcast_monitoring, name="system_monitoring", topic="stats",
+                when=lambda: streamer.is_running)
+
+metrics.gauge("ztaatds_ingest_queue_batches", "Ingested batches waiting to be scored",
+              lambda: streamer._queue.qsize() if streamer._queue else 0)
+metrics.gauge("ztaatds_ingest_dropped_records", "Records the current source dropped because the queue was full",
+              lambda: streamer.source.dropped if streamer.source else 0)
+
 async def start_realtime_streaming():
     """Start the real-time streaming service"""
     await streamer.start_streaming()
@@ -124,5 +169,8 @@ def get_streamer_stats():
         "is_running": streamer.is_running,
         "processed_count": streamer.processed_count,
         "anomaly_count": streamer.anomaly_count,
+        "rejected_count": streamer.rejected_count,
+        "queued_batches": streamer._queue.qsize() if streamer._queue else 0,
+        "source": streamer.source.get_stats() if streamer.source else None,
         "uptime": time.time() - streamer.start_time if streamer.start_time else 0
     } 
\ No newline at end of file
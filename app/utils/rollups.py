@@ -0,0 +1,288 @@
+import json
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.utils.connection_manager import manager
+from app.utils.pubsub import bus, is_follower
+from app.utils.scheduler import scheduler
+from app.config import ROLLUP_RESOLUTIONS, ROLLUP_SCORE_RANGE, ROLLUP_BINS_PER_DECADE
+
+PERCENTILES = (50, 90, 99)
+
+def _score_edges(low: float, high: float, per_decade: int) -> np.ndarray:
+    """Log-spaced histogram edges; scores outside [low, high) land in the end bins"""
+    decades = np.log10(high) - np.log10(low)
+    return np.logspace(np.log10(low), np.log10(high), int(round(decades * per_decade)) + 1)
+
+SCORE_EDGES = _score_edges(*ROLLUP_SCORE_RANGE, ROLLUP_BINS_PER_DECADE)
+# Each bin reports its geometric midpoint; the under/overflow bins report the range ends
+BIN_VALUES = np.concatenate(([SCORE_EDGES[0]], np.sqrt(SCORE_EDGES[:-1] * SCORE_EDGES[1:]), [SCORE_EDGES[-1]]))
+
+class RollupSeries:
+    """Fixed-size ring of time buckets, each holding counts and a score histogram
+
+    Bucket i holds slot `slots[i]` (bucket start // resolution); a slot that
+    comes round again simply overwrites the stale bucket in place.
+    """
+
+    def __init__(self, resolution: int, size: int):
+        self.resolution = resolution
+        self.size = size
+        self.slots = np.full(size, -1, dtype=np.int64)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.anomalies = np.zeros(size, dtype=np.int64)
+        self.score_sum = np.zeros(size, dtype=np.float64)
+        self.score_max = np.zeros(size, dtype=np.float64)
+        self.hist = np.zeros((size, len(BIN_VALUES)), dtype=np.int32)
+
+    def _bucket(self, slot: int) -> int:
+        index = slot % self.size
+        if self.slots[index] != slot:
+            self.slots[index] = slot
+            self.count[index] = 0
+            self.anomalies[index] = 0
+            self.score_sum[index] = 0.0
+            self.score_max[index] = 0.0
+            self.hist[index] = 0
+        return index
+
+    def add_scores(self, now: float, scores: np.ndarray, flags: np.ndarray):
+        """Fold a batch of scores into the bucket covering `now`"""
+        index = self._bucket(int(now // self.resolution))
+        self.count[index] += len(scores)
+        self.anomalies[index] += int(np.count_nonzero(flags))
+        self.score_sum[index] += float(scores.sum())
+        self.score_max[index] = max(self.score_max[index], float(scores.max()))
+        self.hist[index] += np.bincount(np.searchsorted(SCORE_EDGES, scores, side="right"),
+                                        minlength=len(BIN_VALUES)).astype(np.int32)
+
+    def add_score(self, now: float, score: float, is_anomalous: bool):
+        """Single-event fast path: no temporary arrays"""
+        index = self._bucket(int(now // self.resolution))
+        self.count[index] += 1
+        self.anomalies[index] += bool(is_anomalous)
+        self.score_sum[index] += score
+        if score > self.score_max[index]:
+            self.score_max[index] = score
+        self.hist[index, int(np.searchsorted(SCORE_EDGES, score, side="right"))] += 1
+
+    def merge(self, start: int, count: int, anomalies: int, score_sum: float, score_max: float,
+              hist: Sequence[int]):
+        """Add a finer bucket starting at `start` seconds into the bucket that contains it"""
+        index = self._bucket(start // self.resolution)
+        self.count[index] += count
+        self.anomalies[index] += anomalies
+        self.score_sum[index] += score_sum
+        self.score_max[index] = max(self.score_max[index], score_max)
+        self.hist[index] += np.asarray(hist, dtype=np.int32)
+
+    def rows(self, first_slot: int, last_slot: int) -> np.ndarray:
+        """Ring indices of the stored buckets in [first_slot, last_slot], oldest first"""
+        stored = (self.slots >= first_slot) & (self.slots <= last_slot)
+        indices = np.nonzero(stored)[0]
+        return indices[np.argsort(self.slots[indices])]
+
+    def raw(self, indices: np.ndarray) -> List[List[Any]]:
+        """Mergeable [start, count, anomalies, score_sum, score_max, hist] rows"""
+        return [[int(self.slots[i]) * self.resolution, int(self.count[i]), int(self.anomalies[i]),
+                 float(self.score_sum[i]), float(self.score_max[i]), self.hist[i].tolist()] for i in indices]
+
+    def export(self, indices: np.ndarray) -> Dict[str, Any]:
+        """Columnar summary of the given buckets"""
+        return summarize(self.slots[indices] * self.resolution, self.resolution, self.count[indices],
+                         self.anomalies[indices], self.score_sum[indices], self.score_max[indices],
+                         self.hist[indices])
+
+def summarize(starts, resolution, count, anomalies, score_sum, score_max, hist) -> Dict[str, Any]:
+    """Counts, anomaly rate and score percentiles per bucket, as parallel lists"""
+    safe = np.maximum(count, 1)
+    result = {
+        "resolution": resolution,
+        "start": np.asarray(starts).tolist(),
+        "count": count.tolist(),
+        "anomalies": anomalies.tolist(),
+        "rate": np.round(anomalies / safe, 4).tolist(),
+        "mean": np.round(score_sum / safe, 6).tolist(),
+        "max": np.round(score_max, 6).tolist()
+    }
+    cumulative = hist.cumsum(axis=1)
+    for p in PERCENTILES:
+        # First bin whose cumulative count reaches the rank; empty buckets report 0
+        rank = np.maximum(np.ceil(count * p / 100), 1)[:, None]
+        values = BIN_VALUES[(cumulative >= rank).argmax(axis=1)] if len(hist) else np.zeros(0)
+        result[f"p{p}"] = np.round(np.where(count > 0, values, 0.0), 6).tolist()
+    return result
+
+class Rollups:
+    """Pre-aggregated prediction history at several resolutions for dashboards
+
+    Predictions land in a short 1 s staging ring. Once a second has closed it
+    is merged into every resolution (in multi-worker mode, by the leader, which
+    then shares the merged rows), and newly closed buckets go out to dashboards
+    as one delta frame that is serialized once for all clients.
+    """
+
+    def __init__(self, resolutions: Sequence[Sequence[int]] = ROLLUP_RESOLUTIONS, settle: int = 1):
+        self.series = {resolution: RollupSeries(resolution, size) for resolution, size in resolutions}
+        self.staging = RollupSeries(1, 16)
+        # Followers' rows may arrive a little after the second closes
+        self.settle = settle
+        self.staged_until = int(time.time())
+        self.published_until = self.staged_until
+        self.deltas_sent = 0
+        self._snapshot = None
+        self._snapshot_until = None
+
+    def record(self, score: float, is_anomalous: bool, now: Optional[float] = None):
+        self.staging.add_score(time.time() if now is None else now, float(score), is_anomalous)
+
+    def record_batch(self, scores: np.ndarray, flags: np.ndarray, now: Optional[float] = None):
+        if len(scores):
+            self.staging.add_scores(time.time() if now is None else now, scores, flags)
+
+    def merge_rows(self, rows: List[List[Any]]):
+        """Fold closed 1 s rows into every resolution"""
+        for row in rows:
+            for series in self.series.values():
+                series.merge(*row)
+
+    def _drain_staging(self, now: float) -> List[List[Any]]:
+        """Raw rows for every staged second that has closed since the last drain"""
+        current = int(now)
+        rows = self.staging.raw(self.staging.rows(self.staged_until, current - 1))
+        self.staged_until = current
+        return [row for row in rows if row[1]]
+
+    def tick(self, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Move closed seconds out of staging; returns the delta to publish, if any"""
+        now = time.time() if now is None else now
+        rows = self._drain_staging(now)
+        if is_follower():
+            if rows:
+                bus.publish("rollups.add", rows)
+            return None
+        self.merge_rows(rows)
+
+        until = int(now) - self.settle
+        if until <= self.published_until:
+            return None
+        delta = self.export(since=self.published_until, until=until)
+        self.published_until = until
+        if bus.connected:
+            # Followers keep a copy for their own snapshot and time-series requests
+            closed = self.series[min(self.series)]
+            bus.publish("rollups.closed", {"until": until, "rows": closed.raw(
+                closed.rows(delta["since"], until - 1))})
+        return delta
+
+    def export(self, since: Optional[int] = None, until: Optional[int] = None) -> Dict[str, Any]:
+        """Closed buckets of every resolution that ended in (since, until]
+
+        With no `since`, every retained bucket; this is the snapshot.
+        """
+        until = self.published_until if until is None else until
+        resolutions = {}
+        for resolution, series in self.series.items():
+            # A bucket [start, start + resolution) is closed once start + resolution <= until
+            last = until // resolution - 1
+            first = 0 if since is None else since // resolution
+            indices = series.rows(first, last)
+            if len(indices):
+                resolutions[str(resolution)] = series.export(indices)
+        return {"since": since if since is not None else 0, "until": until, "resolutions": resolutions}
+
+    def snapshot_message(self) -> str:
+        """The full snapshot frame, serialized once per published second"""
+        if self._snapshot_until != self.published_until:
+            self._snapshot = json.dumps({"type": "rollup_snapshot", **self.export()})
+            self._snapshot_until = self.published_until
+        return self._snapshot
+
+    def sync(self, since: Optional[float] = None) -> str:
+        """Reply to a (re)connecting client: what it missed since `since`, or a full snapshot"""
+        finest = min(self.series)
+        oldest = self.published_until - finest * self.series[finest].size
+        # NaN compares false with everything, so it must be caught before int()
+        if since is None or not math.isfinite(since) or since < oldest or since > self.published_until:
+            return self.snapshot_message()
+        return json.dumps({"type": "rollup_delta", **self.export(since=int(since))})
+
+    def timeseries(self, start: float, end: float, points: int = 300,
+                   resolution: Optional[int] = None) -> Dict[str, Any]:
+        """Evenly spaced points over [start, end], merged from the finest resolution covering it"""
+        if end < start:
+            raise ValueError("end must not be before start")
+        end = min(end, self.published_until)
+        if resolution is None:
+            # The finest resolution that still retains the start of the range
+            covering = [r for r, series in sorted(self.series.items())
+                        if self.published_until - r * series.size <= start]
+            resolution = covering[0] if covering else max(self.series)
+        series = self.series[resolution]
+        # Nothing older than the ring is retained; clamping keeps the dense grid
+        # below one ring's worth of slots however far back the range starts
+        start = max(start, self.published_until - resolution * series.size)
+        first = int(start // resolution)
+        last = max(first, int(end // resolution) - 1)
+        # A range entirely older than the ring has no points at all
+        slots = np.arange(first, last + 1) if end > start else np.zeros(0, dtype=np.int64)
+
+        # Dense grid over the range; missing buckets count as empty
+        indices = slots % series.size
+        present = series.slots[indices] == slots
+        pick = lambda column: np.where(present.reshape((-1,) + (1,) * (column.ndim - 1)), column[indices], 0)
+        count, anomalies = pick(series.count), pick(series.anomalies)
+        score_sum, score_max, hist = pick(series.score_sum), pick(series.score_max), pick(series.hist)
+
+        # Merge runs of consecutive buckets down to at most `points` points
+        step = max(1, -(-len(slots) // max(1, points)))
+        groups = np.arange(0, len(slots), step)
+        result = summarize(slots[groups] * resolution, resolution * step,
+                           np.add.reduceat(count, groups), np.add.reduceat(anomalies, groups),
+                           np.add.reduceat(score_sum, groups), np.maximum.reduceat(score_max, groups),
+                           np.add.reduceat(hist, groups, axis=0))
+        result["source_resolution"] = resolution
+        return result
+
+    async def publish(self):
+        """Close the last second and send dashboards whatever buckets that completed"""
+        delta = self.tick()
+        if delta is not None and delta["resolutions"] and manager.has_subscribers("stats"):
+            self.deltas_sent += 1
+            await manager.broadcast(json.dumps({"type": "rollup_delta", **delta}), topic="stats")
+
+    def get_stats(self):
+        return {
+            "resolutions": {resolution: series.size for resolution, series in self.series.items()},
+            "published_until": self.published_until,
+            "deltas_sent": self.deltas_sent
+        }
+
+# Global rollups instance
+rollups = Rollups()
+
+def _apply_added(rows: List[List[Any]]):
+    """Leader side: fold in a follower's seconds; other followers get them back via rollups.closed"""
+    if bus.is_leader:
+        rollups.merge_rows(rows)
+
+def _apply_closed(frame: Dict[str, Any]):
+    """Follower side: mirror the leader's merged rows"""
+    rollups.merge_rows(frame["rows"])
+    rollups.published_until = max(rollups.published_until, frame["until"])
+
+bus.subscribe("rollups.add", _apply_added)
+bus.subscribe("rollups.closed", _apply_closed)
+
+def _handle_sync(websocket, request: Dict[str, Any]) -> str:
+    since = request.get("since")
+    if since is not None and (isinstance(since, bool) or not isinstance(since, (int, float))):
+        return json.dumps({"type": "error", "action": "sync",
+                           "detail": '"since" must be a time in epoch seconds'})
+    return rollups.sync(since)
+
+manager.on_action("sync", _handle_sync)
+
+# Runs even with no dashboards connected: staged seconds must still be merged
+scheduler.every(1.0, rollups.publish, name="rollup_delta", align=0.01)
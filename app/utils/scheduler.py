@@ -0,0 +1,195 @@
+import asyncio
+import inspect
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from app.utils.connection_manager import manager
+from app.utils.metrics import event_loop_lag, event_loop_lag_seconds
+from app.utils.pubsub import bus
+
+class PeriodicJob:
+    """A callable run every `interval` seconds on a fixed grid of ticks
+
+    With a `topic`, the job only runs while some client subscribes to it and
+    sleeps without waking at all otherwise; with `active`, likewise while it
+    returns True. `when` can skip individual ticks.
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], Any], topic: Optional[str] = None,
+                 when: Optional[Callable[[], bool]] = None, align: float = 0.0,
+                 active: Optional[Callable[[], bool]] = None):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.topic = topic
+        self.when = when
+        self.active = active
+        # Fire at wall-clock multiples of the interval plus `align`, e.g. just after each second
+        self.align = align
+        self.runs = 0
+        self.skipped = 0
+        self.missed = 0
+        self.failures = 0
+        self.last_duration = 0.0
+        self.last_lag = 0.0
+
+    def parked(self) -> bool:
+        """Whether the job has nothing to do until a subscription or wake() changes that"""
+        if self.topic is not None and not manager.has_subscribers(self.topic):
+            return True
+        return self.active is not None and not self.active()
+
+    def first_deadline(self, loop: asyncio.AbstractEventLoop) -> float:
+        """Next tick on the job's grid, in event loop time"""
+        now = time.time()
+        wall = (math.floor((now - self.align) / self.interval) + 1) * self.interval + self.align
+        return loop.time() + (wall - now)
+
+    def get_stats(self):
+        return {
+            "interval": self.interval,
+            "topic": self.topic,
+            "parked": self.parked(),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "missed_ticks": self.missed,
+            "failures": self.failures,
+            "last_duration": self.last_duration,
+            "last_lag": self.last_lag
+        }
+
+class Scheduler:
+    """Owns every periodic job and long-running background task of the app
+
+    Deadlines advance by exactly one interval per tick, so ticks don't drift
+    with how long the job or the wakeup took; a tick that is already over by
+    the time the previous run finishes is skipped rather than run late.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, PeriodicJob] = {}
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._subscribers_changed: Optional[asyncio.Event] = None
+        self.running = False
+        manager.on_subscription_change(self.wake)
+        # With other workers connected, every topic counts as subscribed
+        bus.on_connect(self.wake)
+
+    def every(self, interval: float, fn: Callable[[], Any], name: Optional[str] = None,
+              topic: Optional[str] = None, when: Optional[Callable[[], bool]] = None,
+              align: float = 0.0, active: Optional[Callable[[], bool]] = None) -> PeriodicJob:
+        """Run fn() (sync or async) every `interval` seconds once the scheduler starts"""
+        name = name or fn.__name__
+        if name in self.jobs:
+            raise ValueError(f"Job already scheduled: {name}")
+        job = self.jobs[name] = PeriodicJob(name, interval, fn, topic, when, align, active)
+        if self.running:
+            self._start_job(job)
+        return job
+
+    def cancel(self, name: str):
+        """Unschedule a job"""
+        self.jobs.pop(name, None)
+        task = self._job_tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    def spawn(self, coro: Awaitable[Any], name: Optional[str] = None) -> asyncio.Task:
+        """Start a background task that is cancelled on shutdown and whose errors are logged"""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+    def wake(self):
+        """Recheck parked jobs, e.g. after something an `active` condition reads changed"""
+        if self._subscribers_changed is not None:
+            self._subscribers_changed.set()
+
+    async def start(self):
+        """Start every scheduled job"""
+        if self.running:
+            return
+        self.running = True
+        self._subscribers_changed = asyncio.Event()
+        for job in self.jobs.values():
+            self._start_job(job)
+
+    def _start_job(self, job: PeriodicJob):
+        self._job_tasks[job.name] = self.spawn(self._run(job), name=f"job:{job.name}")
+
+    async def _run(self, job: PeriodicJob):
+        loop = asyncio.get_running_loop()
+        deadline = job.first_deadline(loop)
+        while True:
+            if job.parked():
+                # Park until a client subscribes or wake(); idle nodes don't wake at all
+                while job.parked():
+                    self._subscribers_changed.clear()
+                    await self._subscribers_changed.wait()
+                deadline = job.first_deadline(loop)
+
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = max(0.0, loop.time() - deadline)
+            job.last_lag = lag
+            event_loop_lag_seconds.observe(lag)
+            event_loop_lag.set(lag)
+
+            if job.when is not None and not job.when():
+                job.skipped += 1
+            else:
+                start = time.perf_counter()
+                try:
+                    result = job.fn()
+                    if inspect.isawaitable(result):
+                        await result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    job.failures += 1
+                    print(f"Scheduled job {job.name} failed: {e}")
+                job.runs += 1
+                job.last_duration = time.perf_counter() - start
+
+            deadline += job.interval
+            behind = loop.time() - deadline
+            if behind > 0:
+                # Drop the ticks that are already over instead of running them back to back
+                missed = math.floor(behind / job.interval) + 1
+                job.missed += missed
+                deadline += missed * job.interval
+
+    async def stop(self):
+        """Cancel every job and background task and wait for them to finish"""
+        self.running = False
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._job_tasks.clear()
+
+    def get_stats(self):
+        return {
+            "running": self.running,
+            "background_tasks": len(self._tasks) - len(self._job_tasks),
+            "jobs": {name: job.get_stats() for name, job in self.jobs.items()}
+        }
+
+# Global scheduler instance
+scheduler = Scheduler()
+
+async def start_scheduler():
+    """Start the periodic jobs registered so far"""
+    await scheduler.start()
+
+async def stop_scheduler():
+    """Stop every periodic job and background task"""
+    await scheduler.stop()
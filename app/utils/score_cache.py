@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+from app.utils.metrics import metrics
+from app.config import (SCORE_CACHE_ENABLED, SCORE_CACHE_SIZE, SCORE_CACHE_TTL_SECONDS,
+                        SCORE_CACHE_PRECISION, SCORE_CACHE_MAX_BATCH_ROWS)
+
+Key = Tuple[Any, bytes]
+
+score_cache_lookups_total = metrics.counter(
+    "ztaatds_score_cache_lookups_total", "Score cache lookups", ("result",))
+score_cache_evictions_total = metrics.counter(
+    "ztaatds_score_cache_evictions_total", "Score cache entries dropped, least recently used first")
+
+class ScoreCache:
+    """Bounded LRU of (score, per-feature errors) keyed on quantized feature vectors
+
+    Vectors that agree to within `precision` on every feature share an entry,
+    so steady telemetry from an idle host skips inference entirely. Entries
+    expire after `ttl` seconds and the whole cache is dropped on model reload.
+    """
+
+    def __init__(self, max_size: int = SCORE_CACHE_SIZE, ttl: Optional[float] = SCORE_CACHE_TTL_SECONDS,
+                 precision: float = SCORE_CACHE_PRECISION, max_batch_rows: int = SCORE_CACHE_MAX_BATCH_ROWS,
+                 enabled: bool = SCORE_CACHE_ENABLED):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.precision = precision
+        # Larger bulk batches are scored directly; per-row lookups would cost more than they save
+        self.max_batch_rows = max_batch_rows
+        self.enabled = enabled and max_size > 0
+        self._entries: "OrderedDict[Key, Tuple[float, float, List[float]]]" = OrderedDict()
+        # Bumped on every clear, so a score computed with the old model is never stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def covers(self, rows: int) -> bool:
+        """Whether a batch of this many rows should go through the cache"""
+        return self.enabled and rows <= self.max_batch_rows
+
+    def keys(self, x: np.ndarray, model_keys: Sequence[Any]) -> List[Key]:
+        """Cache keys of every row of an N x D matrix, each paired with its row's model key"""
+        quantized = np.rint(np.atleast_2d(np.asarray(x, dtype=np.float64)) / self.precision).astype(np.int64)
+        return [(model_key, row.tobytes()) for model_key, row in zip(model_keys, quantized)]
+
+    def get_many(self, keys: Sequence[Key]) -> List[Optional[Tuple[float, List[float]]]]:
+        """(score, errors) per key, or None where the entry is missing or expired"""
+        now = time.monotonic()
+        results = []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and now - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                results.append(None)
+                continue
+            self._entries.move_to_end(key)
+            results.append(entry[1:])
+        hits = sum(result is not None for result in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        score_cache_lookups_total.inc("hit", amount=hits)
+        score_cache_lookups_total.inc("miss", amount=len(results) - hits)
+        return results
+
+    def put_many(self, keys: Sequence[Key], scores: Sequence[float], errors: Sequence[List[float]],
+                 generation: int):
+        """Store results scored while the cache was at `generation`"""
+        if generation != self.generation:
+            return
+        now = time.monotonic()
+        entries = self._entries
+        for key, score, row_errors in zip(keys, scores, errors):
+            entries[key] = (now, score, row_errors)
+            entries.move_to_end(key)
+        evicted = 0
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            score_cache_evictions_total.inc(amount=evicted)
+
+    def clear(self):
+        """Forget every entry, e.g. because the model that produced them changed"""
+        self.generation += 1
+        # A fresh dict rather than clear(): reloads run off the event loop
+        self._entries = OrderedDict()
+        self.invalidations += 1
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "precision": self.precision,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+# Global score cache instance
+score_cache = ScoreCache()
+
+metrics.gauge("ztaatds_score_cache_entries", "Feature vectors with a cached score",
+              lambda: len(score_cache._entries))
@@ -0,0 +1,405 @@
+import asyncio
+import csv
+import glob
+import json
+import math
+import os
+import random
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+from app.config import (FEATURE_NAMES, INGEST_BATCH_SIZE, INGEST_POLL_INTERVAL,
+                        SIMULATED_INTERVAL, SYSLOG_HOST, SYSLOG_PORT)
+
+# Syslog severities 0-3 are errors, 4 is a warning, the rest informational
+SYSLOG_LEVELS = ["ERROR", "ERROR", "ERROR", "ERROR", "WARNING", "INFO", "INFO", "INFO"]
+
+def _features_from_mapping(record: Dict[str, Any]) -> List[float]:
+    if "features" in record:
+        return [float(value) for value in record["features"]]
+    return [float(record[name]) for name in FEATURE_NAMES]
+
+def _syslog_host(header: str) -> Optional[str]:
+    """Hostname from the header after <PRI>, in RFC 5424 or RFC 3164 layout"""
+    tokens = header.split()
+    if tokens and tokens[0].isdigit():
+        # RFC 5424: VERSION TIMESTAMP HOSTNAME APP-NAME ...
+        host = tokens[2] if len(tokens) > 2 else "-"
+    else:
+        # RFC 3164: Mmm dd hh:mm:ss HOSTNAME TAG
+        host = tokens[3] if len(tokens) > 3 else "-"
+    return None if host == "-" else host
+
+def parse_record(text: str, source: str, header: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """Parse a JSON line, CSV row or syslog-framed line of either into a log entry"""
+    text = text.strip()
+    if not text:
+        return None
+    
+    level = "INFO"
+    host = None
+    if text.startswith("<") and ">" in text[:5]:
+        # RFC 3164/5424 framing: <PRI>header... : payload
+        priority, text = text[1:].split(">", 1)
+        level = SYSLOG_LEVELS[int(priority) % 8]
+        if not text.lstrip().startswith("{") and ": " in text:
+            syslog_header, text = text.rsplit(": ", 1)
+            host = _syslog_host(syslog_header)
+        text = text.strip()
+    
+    timestamp = time.time()
+    if text.startswith("{"):
+        record = json.loads(text)
+        features = _features_from_mapping(record)
+        level = record.get("level", level)
+        timestamp = record.get("timestamp", timestamp)
+        message = record.get("message", "")
+        if record.get("host") is not None:
+            # Hosts pick per-source models and alert keys; a number or list would fail the whole batch
+            if not isinstance(record["host"], str):
+                raise ValueError(f"host must be a string, got {type(record['host']).__name__}")
+            host = record["host"]
+    else:
+        values = next(csv.reader([text]))
+        if header:
+            record = dict(zip(header, values))
+            features = _features_from_mapping(record)
+            host = record.get("host") or host
+        else:
+            features = [float(value) for value in values]
+        message = text
+    
+    return {
+        "timestamp": timestamp,
+        "source": source,
+        "host": host,
+        "level": level,
+        "message": message,
+        "features": features
+    }
+
+class LogSource:
+    """An async source of log entries, yielded in batches"""
+    
+    name = "base"
+    
+    def __init__(self):
+        self.received = 0
+        self.parse_errors = 0
+        self.dropped = 0
+    
+    def batches(self) -> AsyncGenerator[List[Dict[str, Any]], None]:
+        raise NotImplementedError
+    
+    async def close(self):
+        """Release sockets or files held by the source"""
+    
+    def _parse(self, text: str, header: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        try:
+            entry = parse_record(text, self.name, header)
+        except (ValueError, KeyError, TypeError, IndexError):
+            self.parse_errors += 1
+            return None
+        if entry is not None:
+            self.received += 1
+        return entry
+    
+    def get_stats(self):
+        return {
+            "source": self.name,
+            "received": self.received,
+            "parse_errors": self.parse_errors,
+            "dropped": self.dropped
+        }
+
+class SimulatedSource(LogSource):
+    """Random feature vectors at a fixed interval, for demos"""
+    
+    name = "system_logs"
+    
+    def __init__(self, interval: float = SIMULATED_INTERVAL):
+        super().__init__()
+        self.interval = interval
+    
+    async def batches(self):
+        while True:
+            self.received += 1
+            yield [{
+                "timestamp": time.time(),
+                "source": self.name,
+                "level": random.choice(["INFO", "WARNING", "ERROR"]),
+                "message": f"Log entry {self.received}",
+                "features": [random.uniform(0, 5) for _ in FEATURE_NAMES]
+            }]
+            await asyncio.sleep(self.interval)
+
+def rate_at(elapsed: float, rate: float, shape: str = "constant",
+            burst_factor: float = 5.0, period: float = 10.0) -> float:
+    """Target events/s at `elapsed` seconds into a load run"""
+    if shape == "constant":
+        return rate
+    if shape == "burst":
+        # Square wave: the first 20% of every period runs at burst_factor x rate
+        return rate * burst_factor if (elapsed % period) < period * 0.2 else rate
+    if shape == "ramp":
+        # Linear climb to the full rate over one period, then hold; the floor keeps
+        # the first interval from being effectively infinite
+        return rate * min(1.0, max(elapsed / period, 0.01))
+    if shape == "sine":
+        return rate * (1 + 0.5 * math.sin(2 * math.pi * elapsed / period))
+    raise ValueError(f"Unknown load shape: {shape}")
+
+class FeatureGenerator:
+    """Feature vectors replayed from a CSV or drawn at random, with injected anomalies"""
+    
+    def __init__(self, replay_path: Optional[str] = None, anomaly_ratio: float = 0.0,
+                 low: float = 0.0, high: float = 5.0, seed: Optional[int] = None):
+        self.replay_path = replay_path
+        self.anomaly_ratio = anomaly_ratio
+        self.low = low
+        self.high = high
+        self.random = random.Random(seed)
+        self._rows = None
+    
+    def _replay(self):
+        """Cycle through the CSV forever, streaming it rather than loading it"""
+        while True:
+            with open(self.replay_path, "r", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                for row in reader:
+                    try:
+                        yield _features_from_mapping(dict(zip(header, row)))
+                    except (KeyError, ValueError):
+                        yield [float(value) for value in row]
+    
+    def next(self):
+        """One feature vector and whether it was injected as an anomaly"""
+        if self.replay_path:
+            if self._rows is None:
+                self._rows = self._replay()
+            features = next(self._rows)
+        else:
+            features = [self.random.uniform(self.low, self.high) for _ in FEATURE_NAMES]
+        
+        if self.anomaly_ratio and self.random.random() < self.anomaly_ratio:
+            # Spike every feature well outside its normal range
+            return [value * self.random.uniform(5, 10) + self.high for value in features], True
+        return features, False
+
+class LoadSource(LogSource):
+    """Open-loop synthetic or replayed load at a target rate, for stress tests"""
+    
+    name = "loadgen"
+    
+    def __init__(self, rate: float = 100.0, shape: str = "constant", anomaly_ratio: float = 0.0,
+                 path: Optional[str] = None, burst_factor: float = 5.0, period: float = 10.0,
+                 tick: float = 0.01, batch_size: int = INGEST_BATCH_SIZE):
+        super().__init__()
+        self.rate = rate
+        self.shape = shape
+        self.burst_factor = burst_factor
+        self.period = period
+        self.tick = tick
+        self.batch_size = batch_size
+        # A path replays that CSV at the target rate instead of random vectors
+        self.generator = FeatureGenerator(path, anomaly_ratio)
+        self.injected = 0
+        rate_at(0, rate, shape)  # Validate the shape up front
+    
+    async def batches(self):
+        start = time.monotonic()
+        due = 0.0
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            # Accrue what the schedule owes since the last tick; a slow consumer means a backlog, not a lower rate
+            due += rate_at(now - start, self.rate, self.shape, self.burst_factor, self.period) * self.tick
+            while due >= 1:
+                count = min(int(due), self.batch_size)
+                due -= count
+                batch = []
+                for _ in range(count):
+                    features, injected = self.generator.next()
+                    self.injected += injected
+                    batch.append({
+                        "timestamp": time.time(),
+                        "source": self.name,
+                        "level": "ERROR" if injected else "INFO",
+                        "message": "Injected anomaly" if injected else "Generated load",
+                        "features": features
+                    })
+                self.received += count
+                yield batch
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["injected_anomalies"] = self.injected
+        return stats
+
+class FileTailSource(LogSource):
+    """Tails a CSV / JSON-lines file, or every such file in a directory"""
+    
+    name = "file"
+    patterns = ("*.csv", "*.jsonl", "*.json", "*.log")
+    
+    def __init__(self, path: str, from_start: bool = False,
+                 poll_interval: float = INGEST_POLL_INTERVAL, batch_size: int = INGEST_BATCH_SIZE):
+        super().__init__()
+        self.path = path
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._offsets: Dict[str, int] = {}
+        self._headers: Dict[str, List[str]] = {}
+        self._first_scan = True
+    
+    def _files(self) -> List[str]:
+        if os.path.isdir(self.path):
+            return sorted(f for pattern in self.patterns for f in glob.glob(os.path.join(self.path, pattern)))
+        return [self.path] if os.path.exists(self.path) else []
+    
+    def _read_new_lines(self, path: str) -> List[str]:
+        """Read complete lines appended since the last poll (runs in a thread)"""
+        size = os.path.getsize(path)
+        if path not in self._offsets:
+            # Files that appear after startup are new, so they are read whole
+            self._offsets[path] = 0 if self.from_start or not self._first_scan else size
+            if path.endswith(".csv"):
+                with open(path, "r") as f:
+                    self._headers[path] = next(csv.reader([f.readline()]), [])
+        elif size < self._offsets[path]:
+            # Truncated or rotated: start over; a repeated CSV header is skipped below
+            self._offsets[path] = 0
+        
+        limit = self.batch_size * 512
+        with open(path, "rb") as f:
+            f.seek(self._offsets[path])
+            # Cap each read so a huge backlog is consumed in bounded slices
+            data = f.read(limit)
+        end = data.rfind(b"\n")
+        if end < 0:
+            if len(data) == limit:
+                # A single line longer than a whole slice: skip it rather than stall
+                self._offsets[path] += limit
+                self.parse_errors += 1
+            return []
+        self._offsets[path] += end + 1
+        lines = data[:end].decode("utf-8", errors="replace").splitlines()
+        header = self._headers.get(path)
+        if header and lines and lines[0].split(",") == header:
+            lines = lines[1:]
+        return lines
+    
+    async def batches(self):
+        while True:
+            idle = True
+            for path in self._files():
+                lines = await asyncio.to_thread(self._read_new_lines, path)
+                header = self._headers.get(path)
+                for start in range(0, len(lines), self.batch_size):
+                    entries = [self._parse(line, header) for line in lines[start:start + self.batch_size]]
+                    entries = [entry for entry in entries if entry is not None]
+                    if entries:
+                        idle = False
+                        # The consumer's bounded queue makes this wait when scoring lags
+                        yield entries
+            self._first_scan = False
+            if idle:
+                await asyncio.sleep(self.poll_interval)
+
+class _QueueingSource(LogSource):
+    """Shared batching for network sources that receive lines into a bounded queue"""
+    
+    def __init__(self, host: str, port: int, batch_size: int, queue_size: int):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self._lines: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    
+    async def _start(self):
+        raise NotImplementedError
+    
+    async def batches(self):
+        await self._start()
+        while True:
+            lines = [await self._lines.get()]
+            while len(lines) < self.batch_size and not self._lines.empty():
+                lines.append(self._lines.get_nowait())
+            entries = [entry for entry in map(self._parse, lines) if entry is not None]
+            if entries:
+                yield entries
+
+class _SyslogDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, source: "SyslogUDPSource"):
+        self.source = source
+    
+    def datagram_received(self, data: bytes, addr):
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            try:
+                self.source._lines.put_nowait(line)
+            except asyncio.QueueFull:
+                # UDP senders cannot be slowed down, so excess is shed and counted
+                self.source.dropped += 1
+
+class SyslogUDPSource(_QueueingSource):
+    """Syslog-style UDP listener; one or more records per datagram"""
+    
+    name = "syslog_udp"
+    
+    def __init__(self, host: str = SYSLOG_HOST, port: int = SYSLOG_PORT,
+                 batch_size: int = INGEST_BATCH_SIZE, queue_size: int = INGEST_BATCH_SIZE * 16):
+        super().__init__(host, port, batch_size, queue_size)
+        self._transport = None
+    
+    async def _start(self):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _SyslogDatagramProtocol(self), local_addr=(self.host, self.port))
+    
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+class SyslogTCPSource(_QueueingSource):
+    """Syslog-style TCP listener; newline-delimited records per connection"""
+    
+    name = "syslog_tcp"
+    
+    def __init__(self, host: str = SYSLOG_HOST, port: int = SYSLOG_PORT,
+                 batch_size: int = INGEST_BATCH_SIZE, queue_size: int = INGEST_BATCH_SIZE * 16):
+        super().__init__(host, port, batch_size, queue_size)
+        self._server = None
+    
+    async def _start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+    
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Blocks when the queue is full, which stops reading and lets TCP push back
+                await self._lines.put(line.decode("utf-8", errors="replace"))
+        finally:
+            writer.close()
+    
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+def create_source(kind: str = "simulated", **options) -> LogSource:
+    """Build a log source by name: simulated, file, udp, tcp or load"""
+    sources = {
+        "simulated": SimulatedSource,
+        "file": FileTailSource,
+        "udp": SyslogUDPSource,
+        "tcp": SyslogTCPSource,
+        "load": LoadSource
+    }
+    if kind not in sources:
+        raise ValueError(f"Unknown log source: {kind}")
+    return sources[kind](**options)
@@ -0,0 +1,288 @@
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from app.config import (STORE_ENABLED, STORE_PATH, STORE_FLUSH_INTERVAL, STORE_FLUSH_ROWS,
+                        STORE_MAX_PENDING, STORE_RETENTION_SECONDS)
+
+SEVERITIES = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    score REAL NOT NULL,
+    is_anomalous INTEGER NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    alert_type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_ts ON alerts (ts);
+CREATE INDEX IF NOT EXISTS alerts_severity_ts ON alerts (severity, ts);
+"""
+
+class EventStore:
+    """Append-only SQLite history of predictions and alerts
+
+    Callers on the event loop only append to in-memory buffers; a single writer
+    thread owns the connection and commits each flush as one transaction.
+    """
+
+    def __init__(self, path: str = STORE_PATH, flush_interval: float = STORE_FLUSH_INTERVAL,
+                 flush_rows: int = STORE_FLUSH_ROWS, max_pending: int = STORE_MAX_PENDING,
+                 retention: Optional[float] = STORE_RETENTION_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.retention = retention
+        # Bounded: if the disk falls behind, the oldest unwritten predictions go first
+        self._predictions = deque(maxlen=max(1, max_pending))
+        self._alerts = deque()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-store")
+        self._connection = None
+        self._task = None
+        self._wakeup = None
+        self._last_prune = 0.0
+        self.written_predictions = 0
+        self.written_alerts = 0
+        self.dropped_predictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = self._connect()
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    async def start(self):
+        """Open the database and start the periodic flush task"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, self._open)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush what is buffered and close the database"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._connection.close)
+
+    def add_prediction(self, timestamp: float, score: float, is_anomalous: bool, source: Optional[str] = None):
+        self._append_predictions([(timestamp, float(score), int(is_anomalous), source)])
+
+    def add_predictions(self, timestamp: float, scores: Sequence[float], flags: Sequence[bool],
+                        sources: Union[None, str, Sequence[Optional[str]]] = None):
+        """Buffer a scored batch; `sources` is one source for every row, or one per row"""
+        if sources is None or isinstance(sources, str):
+            sources = itertools.repeat(sources)
+        self._append_predictions([(timestamp, float(score), int(flag), source)
+                                  for score, flag, source in zip(scores, flags, sources)])
+
+    def add_alert(self, alert: Dict[str, Any]):
+        if self._task is None:
+            return
+        self._alerts.append((alert["timestamp"], alert["alert_type"], alert["severity"],
+                             json.dumps(alert["data"], default=str)))
+        self._notify()
+
+    def _append_predictions(self, rows: List[tuple]):
+        if self._task is None:
+            return
+        overflow = len(self._predictions) + len(rows) - self._predictions.maxlen
+        if overflow > 0:
+            self.dropped_predictions += overflow
+        self._predictions.extend(rows)
+        if len(self._predictions) >= self.flush_rows:
+            self._notify()
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        """Flush on a timer, or early once enough rows are buffered"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                print(f"Event store flush failed: {e}")
+
+    async def flush(self):
+        """Hand everything buffered to the writer thread as one transaction"""
+        if not self._predictions and not self._alerts:
+            return
+        predictions = list(self._predictions)
+        alerts = list(self._alerts)
+        self._predictions.clear()
+        self._alerts.clear()
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._write, predictions, alerts)
+        self.written_predictions += len(predictions)
+        self.written_alerts += len(alerts)
+
+    def _write(self, predictions: List[tuple], alerts: List[tuple]):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO predictions (ts, score, is_anomalous, source) VALUES (?, ?, ?, ?)", predictions)
+            self._connection.executemany(
+                "INSERT INTO alerts (ts, alert_type, severity, data) VALUES (?, ?, ?, ?)", alerts)
+
+        now = time.time()
+        if self.retention and now - self._last_prune > 3600:
+            # Hourly, so pruning never dominates the write path
+            self._last_prune = now
+            with self._connection:
+                self._connection.execute("DELETE FROM predictions WHERE ts < ?", (now - self.retention,))
+                self._connection.execute("DELETE FROM alerts WHERE ts < ?", (now - self.retention,))
+
+    async def query_alerts(self, start: Optional[float] = None, end: Optional[float] = None,
+                           severity: Optional[Sequence[str]] = None, limit: int = 100,
+                           cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Newest-first page of alerts in [start, end]; pass next_cursor to continue"""
+        clauses, params = self._range(start, end, cursor)
+        if severity:
+            # One severity walks (severity, ts) in order; for several, "+" keeps SQLite on
+            # the ts index instead of merging per-severity runs with a sort
+            column = "severity" if len(severity) == 1 else "+severity"
+            clauses.append(f"{column} IN ({','.join('?' * len(severity))})")
+            params.extend(severity)
+        rows = await self._select(
+            "SELECT id, ts, alert_type, severity, data FROM alerts", clauses, params, limit)
+        items = [{
+            "id": row[0],
+            "timestamp": row[1],
+            "alert_type": row[2],
+            "severity": row[3],
+            "data": json.loads(row[4])
+        } for row in rows]
+        return self._page(items, limit)
+
+    async def query_scores(self, start: Optional[float] = None, end: Optional[float] = None,
+                           anomalous_only: bool = False, source: Optional[str] = None,
+                           limit: int = 1000, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Newest-first page of prediction scores in [start, end]"""
+        clauses, params = self._range(start, end, cursor)
+        if anomalous_only:
+            clauses.append("is_anomalous = 1")
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        rows = await self._select(
+            "SELECT id, ts, score, is_anomalous, source FROM predictions", clauses, params, limit)
+        items = [{
+            "id": row[0],
+            "timestamp": row[1],
+            "anomaly_score": row[2],
+            "is_anomalous": bool(row[3]),
+            "source": row[4]
+        } for row in rows]
+        return self._page(items, limit)
+
+    @staticmethod
+    def _range(start, end, cursor):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        if cursor is not None:
+            # Keyset paging on the (ts, id) order the ts index already stores,
+            # so a page never shifts under the reader and never sorts the range
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend(EventStore._parse_cursor(cursor))
+        return clauses, params
+
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[float, int]:
+        ts, _, row_id = cursor.partition(":")
+        try:
+            return float(ts), int(row_id)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    @staticmethod
+    def _page(items: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+        return {
+            "items": items,
+            "count": len(items),
+            "next_cursor": f"{items[-1]['timestamp']!r}:{items[-1]['id']}" if len(items) == limit else None
+        }
+
+    @staticmethod
+    def _sql(query: str, clauses: List[str]) -> str:
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        # id is the rowid, which every index carries: the ts indexes serve this order
+        return query + " ORDER BY ts DESC, id DESC LIMIT ?"
+
+    async def _select(self, query: str, clauses: List[str], params: List[Any], limit: int):
+        if self._task is None:
+            return []
+        query = self._sql(query, clauses)
+        params = params + [limit]
+
+        def run():
+            # WAL readers don't block the writer, so each query gets its own connection
+            connection = self._connect()
+            try:
+                return connection.execute(query, params).fetchall()
+            finally:
+                connection.close()
+
+        return await asyncio.to_thread(run)
+
+    def get_stats(self):
+        return {
+            "enabled": self._task is not None,
+            "path": self.path,
+            "pending_predictions": len(self._predictions),
+            "pending_alerts": len(self._alerts),
+            "written_predictions": self.written_predictions,
+            "written_alerts": self.written_alerts,
+            "dropped_predictions": self.dropped_predictions
+        }
+
+# Global store instance
+event_store = EventStore()
+
+async def start_event_store():
+    """Open the history database if storage is enabled"""
+    if STORE_ENABLED:
+        await event_store.start()
+
+async def stop_event_store():
+    """Flush and close the history database"""
+    await event_store.stop()
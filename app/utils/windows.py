@@ -0,0 +1,110 @@
+import time
+from typing import Dict, Iterable, Optional
+
+class CountWindow:
+    """The last N events in a fixed-size ring with running per-flag counters"""
+    
+    def __init__(self, size: int, flags: Iterable[str] = ("anomalous",)):
+        self.size = max(1, size)
+        self.flag_names = tuple(flags)
+        self._scores = [0.0] * self.size
+        self._flags = [0] * self.size
+        self._index = 0
+        self.count = 0
+        self.score_sum = 0.0
+        self.counts: Dict[str, int] = {name: 0 for name in self.flag_names}
+        self._bits = {name: 1 << bit for bit, name in enumerate(self.flag_names)}
+    
+    def add(self, score: float, **flags: bool):
+        """Record one event, evicting the oldest once full; O(1), no allocation"""
+        index = self._index
+        mask = 0
+        for name, value in flags.items():
+            if value:
+                mask |= self._bits[name]
+        
+        if self.count == self.size:
+            evicted = self._flags[index]
+            if evicted:
+                for name, bit in self._bits.items():
+                    if evicted & bit:
+                        self.counts[name] -= 1
+            self.score_sum -= self._scores[index]
+        else:
+            self.count += 1
+        
+        if mask:
+            for name, bit in self._bits.items():
+                if mask & bit:
+                    self.counts[name] += 1
+        self._scores[index] = score
+        self._flags[index] = mask
+        self.score_sum += score
+        self._index = (index + 1) % self.size
+    
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+    
+    def rate(self, flag: str = "anomalous") -> float:
+        return self.counts[flag] / self.count if self.count else 0.0
+    
+    def clear(self):
+        self.__init__(self.size, self.flag_names)
+
+class TimeWindow:
+    """Events in the trailing `seconds`, bucketed per `resolution` in a ring"""
+    
+    def __init__(self, seconds: float, resolution: float = 1.0, flags: Iterable[str] = ("anomalous",)):
+        self.seconds = seconds
+        self.resolution = resolution
+        self.flag_names = tuple(flags)
+        self.num_buckets = max(1, int(round(seconds / resolution)))
+        self._totals = [0] * self.num_buckets
+        self._flag_counts = {name: [0] * self.num_buckets for name in self.flag_names}
+        self._current = None
+        self.count = 0
+        self.counts: Dict[str, int] = {name: 0 for name in self.flag_names}
+    
+    def _advance(self, now: float):
+        """Expire buckets that fell out of the window; amortized O(1) per event"""
+        slot = int(now // self.resolution)
+        if self._current is None:
+            self._current = slot
+            return
+        steps = slot - self._current
+        if steps <= 0:
+            return
+        # Past a full revolution every bucket is stale; never loop more than once round
+        for offset in range(1, min(steps, self.num_buckets) + 1):
+            index = (self._current + offset) % self.num_buckets
+            self.count -= self._totals[index]
+            self._totals[index] = 0
+            for name in self.flag_names:
+                self.counts[name] -= self._flag_counts[name][index]
+                self._flag_counts[name][index] = 0
+        self._current = slot
+    
+    def add(self, now: Optional[float] = None, **flags: bool):
+        """Record one event at `now` (defaults to the wall clock)"""
+        self.add_counts(1, now, **flags)
+    
+    def add_counts(self, total: int, now: Optional[float] = None, **flag_counts: int):
+        """Record `total` events at once, `flag_counts[name]` of them flagged"""
+        now = time.time() if now is None else now
+        self._advance(now)
+        index = self._current % self.num_buckets
+        self._totals[index] += total
+        self.count += total
+        for name, value in flag_counts.items():
+            if value:
+                self._flag_counts[name][index] += int(value)
+                self.counts[name] += int(value)
+    
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Counts and rate over the window as of `now`"""
+        self._advance(time.time() if now is None else now)
+        result = {"window_seconds": self.seconds, "total": self.count}
+        result.update(self.counts)
+        result["rate"] = self.counts[self.flag_names[0]] / self.count if self.count and self.flag_names else 0.0
+        return result
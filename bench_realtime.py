@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+In-process benchmark suite for ZTA-ATDS hot paths
+
+Runs without a server: HTTP requests go through an ASGI transport and
+WebSocket clients are fakes with configurable send delays. Results are
+written as JSON so runs can be compared with --compare.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import sys
+import os
+import time
+import numpy as np
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def summarize(samples):
+    """Latency summary in microseconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1e6
+    return {
+        "n": int(len(values)),
+        "mean_us": round(float(values.mean()), 2),
+        "p50_us": round(float(np.percentile(values, 50)), 2),
+        "p90_us": round(float(np.percentile(values, 90)), 2),
+        "p99_us": round(float(np.percentile(values, 99)), 2),
+        "max_us": round(float(values.max()), 2)
+    }
+
+def features(rng, rows=None):
+    """Feature rows in the range the simulated streamer produces"""
+    shape = (rows, 5) if rows else (5,)
+    return rng.uniform(0, 5, size=shape).astype(np.float32)
+
+class FakeWebSocket:
+    """Stands in for a client socket; `delay` simulates a slow network"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = 0
+        self.target = None
+        self.done = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if self.target is not None and self.received >= self.target:
+            self.done.set()
+
+    async def close(self):
+        pass
+
+async def bench_predict_single(args, rng):
+    """Sequential and concurrent predict_anomaly calls"""
+    from app.utils.prediction import predict_anomaly
+
+    rows = features(rng, args.iterations).tolist()
+    for row in rows[:50]:
+        await predict_anomaly(row)
+
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        await predict_anomaly(row)
+        latencies.append(time.perf_counter() - start)
+
+    # Concurrent callers share forward passes through the micro-batcher
+    start = time.perf_counter()
+    await asyncio.gather(*(predict_anomaly(row) for row in rows))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sequential": summarize(latencies),
+        "concurrent_calls_per_second": round(len(rows) / elapsed, 1)
+    }
+
+async def bench_predict_batch(args, rng):
+    """predict_anomaly_batch latency and row throughput per batch size"""
+    from app.utils.prediction import predict_anomaly_batch
+
+    results = {}
+    for size in args.batch_sizes:
+        x = features(rng, size)
+        await predict_anomaly_batch(x)
+        latencies = []
+        repeats = max(5, min(args.iterations, 200_000 // size))
+        for _ in range(repeats):
+            start = time.perf_counter()
+            await predict_anomaly_batch(x)
+            latencies.append(time.perf_counter() - start)
+        summary = summarize(latencies)
+        summary["rows_per_second"] = round(size / (summary["mean_us"] / 1e6), 1)
+        results[str(size)] = summary
+    return results
+
+async def bench_http_predict(args, rng):
+    """/predict-anomaly/ request throughput through the ASGI app"""
+    import httpx
+    from app.main import app
+
+    rows = features(rng, args.iterations).tolist()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def request(row):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/predict-anomaly/", json={"features": row})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(request(row) for row in rows[:50]))
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(request(row) for row in rows))
+        elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies)
+    summary["requests_per_second"] = round(len(rows) / elapsed, 1)
+    summary["concurrency"] = args.concurrency
+    return summary
+
+async def bench_broadcast(args, rng):
+    """ConnectionManager.broadcast fan-out against fast and slow fake clients"""
+    from app.utils.connection_manager import ConnectionManager
+
+    message = json.dumps({"type": "alert", "data": {"anomaly_score": 1.0, "message": "x" * 200}})
+    messages = 100
+    results = {}
+    for clients in args.clients:
+        bench_manager = ConnectionManager()
+        slow = int(clients * args.slow_fraction)
+        sockets = [FakeWebSocket(args.slow_delay if i < slow else 0.0) for i in range(clients)]
+        for websocket in sockets:
+            await bench_manager.connect(websocket)
+        fast = sockets[slow:]
+        for websocket in fast:
+            websocket.target = messages
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(messages):
+            call = time.perf_counter()
+            await bench_manager.broadcast(message, topic="alerts")
+            latencies.append(time.perf_counter() - call)
+        # Fast clients must not be held back by the slow ones
+        await asyncio.gather(*(websocket.done.wait() for websocket in fast))
+        delivered = time.perf_counter() - start
+
+        stats = bench_manager.get_stats()
+        for websocket in sockets:
+            bench_manager.disconnect(websocket)
+        await asyncio.sleep(0)
+
+        summary = summarize(latencies)
+        summary.update({
+            "clients": clients,
+            "slow_clients": slow,
+            "fast_delivery_ms": round(delivered * 1000, 2),
+            "dropped_messages": stats.get("dropped_messages", 0)
+        })
+        results[str(clients)] = summary
+    return results
+
+async def bench_alerting(args, rng):
+    """AlertManager.process_anomaly and record cost per event"""
+    from app.utils.alerting import AlertManager
+
+    alerts = AlertManager()
+    scores = rng.uniform(0, 20, size=args.iterations)
+
+    latencies = []
+    for score in scores:
+        data = {"anomaly_score": float(score), "is_anomalous": True, "threshold": 0.05,
+                "timestamp": time.time()}
+        start = time.perf_counter()
+        await alerts.process_anomaly(data)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for score in scores:
+        alerts.record(float(score), False)
+    record_elapsed = time.perf_counter() - start
+
+    return {
+        "process_anomaly": summarize(latencies),
+        "record_per_event_us": round(record_elapsed / len(scores) * 1e6, 3),
+        "alerts_sent": len(alerts.alerts),
+        "suppression": alerts.suppressor.get_stats()
+    }
+
+BENCHMARKS = {
+    "predict_single": bench_predict_single,
+    "predict_batch": bench_predict_batch,
+    "http_predict": bench_http_predict,
+    "broadcast": bench_broadcast,
+    "alerting": bench_alerting
+}
+
+async def run_benchmarks(args):
+    """Run the selected benchmarks in one event loop"""
+    from app.models.registry import registry
+
+    rng = np.random.default_rng(args.seed)
+    registry.current()  # Load the model before anything is timed
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"⏱️  {name}...", file=sys.stderr)
+        # Alerts print a line each; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = await BENCHMARKS[name](args, rng)
+    return {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "model": registry.get_info(),
+        "results": results
+    }
+
+def _latency_metrics(results, prefix=""):
+    """Flatten every *_us metric into {"path.metric": value}"""
+    metrics = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_latency_metrics(value, f"{path}."))
+        elif key.endswith("_us") and key != "max_us":
+            metrics[path] = value
+    return metrics
+
+def compare(baseline, current, tolerance):
+    """Latency metrics that got slower than the baseline by more than tolerance"""
+    before = _latency_metrics(baseline["results"])
+    after = _latency_metrics(current["results"])
+    regressions = []
+    for path, value in after.items():
+        old = before.get(path)
+        if old and value > old * (1 + tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": value,
+                                "change": round(value / old - 1, 3)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process ZTA-ATDS benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--iterations", type=int, default=1000, help="Calls per latency benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024, 16384])
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight HTTP requests")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Fake WebSocket client counts for the broadcast benchmark")
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="Share of slow WebSocket clients")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="Seconds per send for slow clients")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Report regressions against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmarks(args))
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(json.load(f), report, args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if report.get("regressions"):
+        print(f"❌ {len(report['regressions'])} metrics regressed beyond {args.tolerance:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
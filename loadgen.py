@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Rate-controlled load generator for ZTA-ATDS
+
+Sends synthetic or replayed feature vectors to a running server on an
+open-loop schedule and reports achieved throughput and latency percentiles.
+Latency is measured from each request's scheduled send time, so a server
+that falls behind shows up as latency rather than as a lower offered rate.
+"""
+
+import argparse
+import asyncio
+import aiohttp
+import json
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.sources import FeatureGenerator, rate_at
+
+ENDPOINTS = {
+    "single": "/predict-anomaly/",
+    "stream": "/stream-predict/",
+    "batch": "/predict-anomaly/batch/"
+}
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class LoadRun:
+    """Counters and latency samples for one load generation run"""
+
+    def __init__(self):
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.rows = 0
+        self.injected = 0
+        self.flagged = 0
+        self.latencies = []
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_sent": self.sent,
+            "requests_ok": self.ok,
+            "errors": self.errors,
+            "rows": self.rows,
+            "injected_anomalies": self.injected,
+            "flagged_anomalies": self.flagged,
+            "requests_per_second": round(self.ok / elapsed, 2) if elapsed else 0.0,
+            "rows_per_second": round(self.rows / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": ms(percentile(latencies, 50)),
+                "p90": ms(percentile(latencies, 90)),
+                "p99": ms(percentile(latencies, 99)),
+                "p999": ms(percentile(latencies, 99.9)),
+                "max": ms(latencies[-1] if latencies else None)
+            }
+        }
+
+async def send(session, args, run, generator, scheduled, semaphore):
+    """Send one request and record its latency from the scheduled time"""
+    rows = [generator.next() for _ in range(args.batch_size if args.endpoint == "batch" else 1)]
+    run.injected += sum(injected for _, injected in rows)
+    if args.endpoint == "batch":
+        payload = {"features": [features for features, _ in rows]}
+    else:
+        payload = {"features": rows[0][0]}
+
+    async with semaphore:
+        run.sent += 1
+        try:
+            async with session.post(args.url + ENDPOINTS[args.endpoint], json=payload) as response:
+                data = await response.json()
+                if response.status != 200 or data.get("status") == "error":
+                    run.errors += 1
+                    return
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            run.errors += 1
+            return
+
+    run.latencies.append(time.perf_counter() - scheduled)
+    run.ok += 1
+    run.rows += len(rows)
+    if args.endpoint == "batch":
+        run.flagged += data.get("anomaly_count", 0)
+    else:
+        result = data.get("result", data)
+        run.flagged += bool(result.get("is_anomalous"))
+
+async def generate_load(args):
+    """Issue requests on an open-loop schedule for the configured duration"""
+    generator = FeatureGenerator(args.replay, args.anomaly_ratio, seed=args.seed)
+    run = LoadRun()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        pending = set()
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled - start < args.duration:
+            now = time.perf_counter()
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+            task = asyncio.create_task(send(session, args, run, generator, scheduled, semaphore))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+            # Requests are scheduled per row rate, so a batch request covers batch_size rows
+            rows_per_request = args.batch_size if args.endpoint == "batch" else 1
+            rate = rate_at(scheduled - start, args.rate, args.shape, args.burst_factor, args.period)
+            scheduled += rows_per_request / rate
+
+        if pending:
+            await asyncio.wait(pending)
+        elapsed = time.perf_counter() - start
+
+    return run.report(elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate-controlled load generator for ZTA-ATDS")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="single",
+                        help="single (/predict-anomaly/), stream (/stream-predict/) or batch")
+    parser.add_argument("--rate", type=float, default=100.0, help="Target rows per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load for")
+    parser.add_argument("--shape", choices=["constant", "burst", "ramp", "sine"], default="constant",
+                        help="How the rate varies over time")
+    parser.add_argument("--burst-factor", type=float, default=5.0, help="Rate multiplier during bursts")
+    parser.add_argument("--period", type=float, default=10.0, help="Seconds per burst/ramp/sine cycle")
+    parser.add_argument("--batch-size", type=int, default=64, help="Rows per request with --endpoint batch")
+    parser.add_argument("--anomaly-ratio", type=float, default=0.0, help="Fraction of rows injected as anomalies")
+    parser.add_argument("--replay", metavar="CSV", help="Replay feature rows from a CSV (e.g. data/logs.csv)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    args = parser.parse_args()
+
+    if not args.json:
+        source = args.replay or "synthetic vectors"
+        print(f"🚀 {args.shape} load at {args.rate:g} rows/s for {args.duration:g}s "
+              f"against {ENDPOINTS[args.endpoint]} ({source}, anomaly ratio {args.anomaly_ratio:g})")
+
+    report = asyncio.run(generate_load(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    latency = report["latency_ms"]
+    print(f"✅ {report['requests_ok']}/{report['requests_sent']} requests ok, {report['errors']} errors")
+    print(f"📈 Throughput: {report['rows_per_second']} rows/s ({report['requests_per_second']} req/s)")
+    print(f"⏱️  Latency ms: p50={latency['p50']} p90={latency['p90']} p99={latency['p99']} "
+          f"p99.9={latency['p999']} max={latency['max']}")
+    print(f"🚨 Injected {report['injected_anomalies']} anomalies, server flagged {report['flagged_anomalies']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,195 @@
 #!/usr/bin/env python3
 """
 Real-time ZTA-ATDS Startup Script
+
+Development (default): one process with auto-reload.
+Production (--production or ZTA_ENV=production): no reload, the app and model
+are loaded once and the listening socket is bound before forking the workers,
+so workers start instantly and share the model's memory copy-on-write.
 """
 
-import uvicorn
-import asyncio
-import sys
+import argparse
+import gc
 import os
+import signal
+import subprocess
+import sys
+import time
+import uvicorn
+
+def _installed(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB; PSS splits shared pages between their users"""
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        return None, None
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values.get("Rss"), values.get("Pss")
+
+def import_profile(module="app.main", top=10):
+    """Slowest imports of a fresh interpreter importing `module`, by cumulative time"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        # Only top-level packages and our own modules, or the list is all torch internals
+        if "." not in name or name.startswith("app"):
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+class PreforkServer(uvicorn.Server):
+    """A uvicorn worker on an inherited socket that reports when it is ready"""
+
+    def __init__(self, config, ready_fd=None):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if self.ready_fd is not None:
+            os.write(self.ready_fd, f"{os.getpid()}\n".encode())
+
+def serve_production(args, profile):
+    """Preload the app and model, bind once, then fork the workers"""
+    timings = {}
+    start = time.perf_counter()
+    from app.main import app
+    timings["import_app"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from app.models.registry import registry
+    registry.current()
+    timings["load_model"] = time.perf_counter() - start
+
+    # Everything allocated so far stays put: the collector won't touch (and dirty) those pages
+    gc.collect()
+    gc.freeze()
+
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        log_level="info",
+        access_log=False,
+        lifespan="on"
+    )
+    print(f"⚡ Event loop: {config.loop}, HTTP parser: {config.http}")
+    sock = config.bind_socket()
+    ready_read, ready_write = os.pipe()
+
+    def spawn(ready_fd=None):
+        pid = os.fork()
+        if pid == 0:
+            # Never fall back into the parent's code, whatever happens in the worker
+            try:
+                if ready_fd is not None:
+                    os.close(ready_read)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                PreforkServer(config, ready_fd).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        return pid
+
+    fork_start = time.perf_counter()
+    workers = {spawn(ready_write) for _ in range(args.workers)}
+    os.close(ready_write)
+    print(f"⚙️  {args.workers} workers forked from preloaded parent {os.getpid()}")
+
+    # Wait until every worker has run its startup hooks
+    ready = b""
+    with os.fdopen(ready_read, "rb", buffering=0) as pipe:
+        while ready.count(b"\n") < len(workers):
+            chunk = pipe.read(64)
+            if not chunk:
+                break
+            ready += chunk
+    timings["workers_ready"] = time.perf_counter() - fork_start
+    print(f"✅ Workers ready in {timings['workers_ready'] * 1000:.0f} ms")
+    if profile:
+        print_profile(timings, os.getpid(), sorted(workers))
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Supervise: replace workers that die, until asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"⚠️  Worker {pid} exited with status {status}, restarting")
+            workers.add(spawn())
+    sock.close()
+
+def print_profile(timings, parent, workers):
+    print("=" * 50)
+    print("⏱️  Startup profile")
+    for name, seconds in timings.items():
+        print(f"   {name:<16} {seconds * 1000:8.0f} ms")
+    print("📦 Slowest imports (cumulative)")
+    for cumulative_us, name in import_profile():
+        print(f"   {name:<40} {cumulative_us / 1000:8.0f} ms")
+    print("🧠 Memory (RSS / PSS, MB)")
+    for label, pid in [("parent", parent)] + [(f"worker {pid}", pid) for pid in workers]:
+        rss, pss = memory_kb(pid)
+        if rss is not None:
+            print(f"   {label:<16} {rss / 1024:8.1f} / {pss / 1024:.1f}")
+    print("=" * 50)
 
 def main():
     """Start the real-time ZTA-ATDS application"""
-    
+
     # Add the current directory to Python path
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    
+
+    parser = argparse.ArgumentParser(description="Start the ZTA-ATDS real-time server")
+    parser.add_argument("--production", action="store_true", default=os.getenv("ZTA_ENV") == "production",
+                        help="No reload; preload the model and fork workers (also ZTA_ENV=production)")
+    parser.add_argument("--workers", type=int, help="Worker processes, 0 = one per core (default ZTA_WORKERS)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--profile", action="store_true", help="Report import and startup times and worker memory")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        # Workers read ZTA_WORKERS when app.config is imported, which decides pub/sub
+        os.environ["ZTA_WORKERS"] = str(args.workers)
+    from app.config import WORKERS
+    args.workers = WORKERS
+
     print("🚀 Starting ZTA-ATDS Real-Time Application...")
     print("=" * 50)
     print("📊 Real-time threat detection system")
@@ -21,23 +197,35 @@ def main():
     print("📈 Live dashboard available")
     print("🚨 Real-time alerting system active")
     print("=" * 50)
-    
+
+    print(f"🌐 Server will be available at: http://localhost:{args.port}")
+    print(f"📊 Dashboard: http://localhost:{args.port}/")
+    print(f"🔌 WebSocket: ws://localhost:{args.port}/ws")
+    print("=" * 50)
+    print("Press Ctrl+C to stop the server")
+    print("=" * 50)
+
+    if args.production:
+        serve_production(args, args.profile)
+        print("✅ Application stopped successfully")
+        return
+
     # Configuration for real-time application
     config = {
-        "host": "0.0.0.0",
-        "port": 8000,
+        "host": args.host,
+        "port": args.port,
         "reload": True,
         "log_level": "info",
         "access_log": True
     }
-    
-    print(f"🌐 Server will be available at: http://localhost:{config['port']}")
-    print(f"📊 Dashboard: http://localhost:{config['port']}/")
-    print(f"🔌 WebSocket: ws://localhost:{config['port']}/ws")
-    print("=" * 50)
-    print("Press Ctrl+C to stop the server")
-    print("=" * 50)
-    
+
+    if args.workers > 1:
+        # Workers share broadcasts and alert state over the pub/sub socket;
+        # uvicorn cannot combine auto-reload with multiple workers
+        config["reload"] = False
+        config["workers"] = args.workers
+        print(f"⚙️  {args.workers} workers")
+
     try:
         uvicorn.run(
             "app.main:app",
@@ -48,4 +236,4 @@ def main():
         print("✅ Application stopped successfully")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
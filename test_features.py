@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+"""
+In-process tests for ZTA-ATDS features, using FastAPI's TestClient
+
+Run with: python -m pytest -q test_features.py
+"""
+
+import asyncio
+import functools
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from websockets.sync.client import connect
+from app.config import TOPICS
+
+@pytest.fixture(scope="module")
+def client():
+    """The app with its startup hooks run, minus the history database and explainer pool"""
+    from app.main import app
+    from app.utils import storage
+    from app.utils.attribution import explainer
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(storage, "STORE_ENABLED", False)
+        patch.setattr(explainer, "enabled", False)
+        with TestClient(app) as test_client:
+            yield test_client
+
+def test_batch_scores_json_and_binary_alike(client):
+    rows = np.random.default_rng(0).random((8, 5), dtype=np.float32)
+    from_json = client.post("/predict-anomaly/batch/", json={"features": rows.tolist()})
+    from_binary = client.post("/predict-anomaly/batch/", content=rows.astype("<f4").tobytes(),
+                              headers={"Content-Type": "application/octet-stream"})
+    assert from_json.status_code == from_binary.status_code == 200
+    assert from_json.json()["count"] == 8
+    assert np.allclose(from_json.json()["anomaly_scores"], from_binary.json()["anomaly_scores"])
+
+@pytest.mark.parametrize("body,content_type", [
+    ('{"features": [[NaN, 1, 2, 3, 4]]}', "application/json"),
+    ('{"features": [[Infinity, 1, 2, 3, 4]]}', "application/json"),
+    (np.array([[np.nan, 1, 2, 3, 4]], dtype="<f4").tobytes(), "application/octet-stream"),
+])
+def test_batch_rejects_non_finite_rows(client, body, content_type):
+    response = client.post("/predict-anomaly/batch/", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 400
+    assert "NaN" in response.json()["detail"]
+
+def _npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("array", [
+    np.full((2, 5), "a", dtype="<U1"),
+    np.ones((2, 5), dtype=bool),
+    np.ones((2, 5), dtype=complex),
+], ids=["str", "bool", "complex"])
+def test_batch_rejects_non_numeric_npy(client, array):
+    response = client.post("/predict-anomaly/batch/", content=_npy(array),
+                           headers={"Content-Type": "application/x-npy"})
+    assert response.status_code == 400
+
+def test_batch_accepts_integer_npy(client):
+    response = client.post("/predict-anomaly/batch/", content=_npy(np.ones((3, 5), dtype=np.int64)),
+                           headers={"Content-Type": "application/x-npy"})
+    assert response.status_code == 200 and response.json()["count"] == 3
+
+def test_batch_rejects_wrong_width(client):
+    response = client.post("/predict-anomaly/batch/", json={"features": [[1, 2, 3]]})
+    assert response.status_code == 400
+
+def test_threshold_ignores_non_finite_scores():
+    from app.utils.quantiles import AdaptiveThreshold
+
+    threshold = AdaptiveThreshold(percentile=90.0, min_samples=10)
+    threshold.update_many(np.linspace(0.0, 1.0, 100).tolist() + [float("nan"), float("inf")])
+    threshold.update(float("nan"))
+    assert threshold.count == 100
+    assert np.isfinite(threshold.threshold)
+    assert 0.8 < threshold.threshold < 1.0
+
+def test_single_prediction_rejects_non_finite_features(client):
+    response = client.post("/predict-anomaly/", content='{"features": [NaN, 1, 2, 3, 4]}',
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert np.isfinite(client.get("/threshold/").json()["threshold"])
+
+def _receive_type(ws, wanted):
+    """Next message of one of the wanted types, skipping heartbeats and other frames"""
+    while True:
+        message = json.loads(ws.receive_text())
+        if message.get("type") in wanted:
+            return message
+
+def test_subscriptions_filter_topics(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"action": "subscribe", "topics": ["status"], "replace": True}))
+        assert _receive_type(ws, {"subscriptions"})["topics"] == ["status"]
+        client.post("/test-anomaly/")
+        client.post("/reload-model/", json={})
+        # The alerts-topic test anomaly was sent first but never reaches this client
+        assert _receive_type(ws, {"test_anomaly", "model_reloaded"})["type"] == "model_reloaded"
+
+@pytest.mark.parametrize("topics", [5, "alerts", ["alerts", 7]])
+def test_subscribe_rejects_malformed_topics(client, topics):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"action": "subscribe", "topics": topics, "replace": True}))
+        assert _receive_type(ws, {"error", "subscriptions"})["type"] == "error"
+        # Still connected, and still subscribed to everything
+        ws.send_text(json.dumps({"action": "unsubscribe", "topics": []}))
+        assert _receive_type(ws, {"subscriptions"})["topics"] == sorted(TOPICS)
+
+class SlowWebSocket:
+    """Stands in for a client whose sends block until released"""
+
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+
+    async def send_text(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self):
+        pass
+
+def _fan_out(policy, messages):
+    """Deliver (key, message) pairs to one blocked client, then let it drain"""
+    from app.utils.connection_manager import ClientChannel, ConnectionManager
+
+    async def run():
+        manager = ConnectionManager(max_queue=2, drop_policy=policy)
+        ws = SlowWebSocket()
+        manager.active_connections[ws] = ClientChannel(ws, manager)
+        for key, message in messages:
+            manager.deliver(message, key)
+        ws.release.set()
+        await asyncio.sleep(0.05)
+        return manager, ws
+
+    return asyncio.run(run())
+
+def test_drop_oldest_keeps_newest_messages():
+    manager, ws = _fan_out("drop_oldest", [(None, f"m{i}") for i in range(5)])
+    assert ws.sent == ["m3", "m4"]
+    assert manager.get_stats()["dropped_messages"] == 3
+
+def test_coalesce_replaces_message_with_same_key():
+    manager, ws = _fan_out("coalesce", [("stats", "stats-1"), ("alert", "alert-1"), ("stats", "stats-2")])
+    assert ws.sent == ["alert-1", "stats-2"]
+
+def test_disconnect_policy_drops_slow_client():
+    manager, ws = _fan_out("disconnect", [(None, f"m{i}") for i in range(3)])
+    assert ws not in manager.active_connections
+    assert manager.disconnected_slow_clients == 1
+
+def test_alert_rule_comparisons():
+    from app.utils.alerting import AlertRule, AlertState
+
+    rule = AlertRule("score", "HIGH_ANOMALY_SCORE", "score", 1.0, comparison=">=", value_key="score")
+    assert rule.evaluate(AlertState(), {"anomaly_score": 0.5}) is None
+    fired = rule.evaluate(AlertState(), {"anomaly_score": 1.0})
+    assert fired["score"] == 1.0 and fired["threshold"] == 1.0
+    with pytest.raises(ValueError):
+        AlertRule("bad", "BAD", "no_such_metric", 1.0)
+
+def test_suppressor_cooldown_reports_repeats():
+    from app.utils.alerting import AlertSuppressor
+
+    suppressor = AlertSuppressor(storm_threshold=100, storm_window=10)
+    assert suppressor.admit("HIGH", cooldown=30, now=0.0) == 0
+    assert suppressor.admit("HIGH", cooldown=30, now=1.0) is None
+    assert suppressor.admit("HIGH", cooldown=30, now=2.0) is None
+    # Other keys have their own cooldown
+    assert suppressor.admit("RATE", cooldown=30, now=2.0) == 0
+    assert suppressor.admit("HIGH", cooldown=30, now=31.0) == 2
+
+def test_suppressor_storm_starts_and_ends():
+    from app.utils.alerting import AlertSuppressor
+
+    suppressor = AlertSuppressor(storm_threshold=3, storm_window=10)
+    for key in ("a", "b", "c"):
+        suppressor.admit(key, cooldown=0, now=1.0)
+    assert suppressor.storm_transition(1.0) == "started"
+    assert suppressor.admit("d", cooldown=0, now=2.0) is None
+    assert suppressor.storm_counts["d"] == 1
+    assert suppressor.storm_transition(20.0) == "ended"
+
+def test_alert_manager_deduplicates_repeated_anomalies():
+    from app.utils.alerting import AlertManager
+
+    alerts = AlertManager()
+    alerts.update_rule("high_anomaly_score", threshold=1.0)
+    anomaly = {"anomaly_score": 5.0, "is_anomalous": True, "source": "dedup-host"}
+
+    async def run():
+        for _ in range(5):
+            await alerts.process_anomaly(dict(anomaly))
+
+    asyncio.run(run())
+    high = [alert for alert in alerts.alerts if alert["alert_type"] == "HIGH_ANOMALY_SCORE"]
+    assert len(high) == 1
+    assert alerts.suppressor.total_suppressed >= 4
+
+def test_event_store_pages_history(tmp_path):
+    from app.utils.storage import EventStore
+
+    async def run():
+        store = EventStore(path=str(tmp_path / "history.db"), flush_interval=60, retention=None)
+        await store.start()
+        try:
+            store.add_predictions(100.0, [0.1, 0.9, 0.2, 0.8, 0.3], [False, True, False, True, False], "host-a")
+            store.add_prediction(200.0, 0.95, True, "host-b")
+            store.add_alert({"timestamp": 150.0, "alert_type": "HIGH_ANOMALY_SCORE", "severity": "HIGH",
+                             "data": {"score": 0.9}})
+            store.add_alert({"timestamp": 160.0, "alert_type": "ANOMALY_RATE", "severity": "LOW", "data": {}})
+            await store.flush()
+
+            pages, cursor = [], None
+            while True:
+                page = await store.query_scores(limit=2, cursor=cursor)
+                pages.append(page["items"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            anomalous = await store.query_scores(anomalous_only=True, source="host-a")
+            in_range = await store.query_scores(start=150.0)
+            high = await store.query_alerts(severity=["HIGH"])
+            with pytest.raises(ValueError):
+                await store.query_scores(cursor="not-a-cursor")
+            return pages, anomalous, in_range, high
+        finally:
+            await store.stop()
+
+    pages, anomalous, in_range, high = asyncio.run(run())
+    ids = [item["id"] for page in pages for item in page]
+    assert len(ids) == 6 and ids == sorted(ids, reverse=True)
+    assert [item["anomaly_score"] for item in anomalous["items"]] == pytest.approx([0.8, 0.9])
+    assert [item["source"] for item in in_range["items"]] == ["host-b"]
+    assert high["count"] == 1 and high["items"][0]["data"] == {"score": 0.9}
+
+def test_alert_rule_update_changes_threshold(client):
+    original = client.get("/alert-rules/").json()["consecutive_anomalies"]
+    response = client.post("/alert-rules/consecutive_anomalies/", json={"threshold": 7, "cooldown": 5})
+    try:
+        assert response.status_code == 200
+        assert response.json()["rule"]["threshold"] == 7
+        rule = client.get("/alert-rules/").json()["consecutive_anomalies"]
+        assert rule["threshold"] == 7 and rule["cooldown"] == 5
+    finally:
+        client.post("/alert-rules/consecutive_anomalies/",
+                    json={"threshold": original["threshold"], "cooldown": original["cooldown"]})
+
+@pytest.mark.parametrize("name,body,status", [
+    ("no_such_rule", {"threshold": 1}, 404),
+    ("consecutive_anomalies", {"comparison": "~"}, 400),
+])
+def test_alert_rule_update_rejects_bad_requests(client, name, body, status):
+    assert client.post(f"/alert-rules/{name}/", json=body).status_code == status
+
+@pytest.fixture(scope="module")
+def workers(tmp_path_factory):
+    """Base URL of a three-worker production server sharing one pub/sub socket"""
+    tmp = tmp_path_factory.mktemp("workers")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, ZTA_PUBSUB_SOCKET=str(tmp / "pubsub.sock"), ZTA_STORE_PATH=str(tmp / "events.db"))
+    with open(tmp / "server.log", "w") as log:
+        server = subprocess.Popen([sys.executable, "run_realtime.py", "--production", "--workers", "3",
+                                   "--host", "127.0.0.1", "--port", str(port)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        # Every worker answers, and the followers have found the leader
+        seen, deadline = {}, time.monotonic() + 60
+        while len(seen) < 3 or not all(stats["connected"] for stats in seen.values()):
+            assert time.monotonic() < deadline, (tmp / "server.log").read_text()
+            try:
+                stats = httpx.get(f"{url}/health").json()["pubsub"]
+                seen[stats["worker_id"]] = stats
+            except httpx.TransportError:
+                time.sleep(0.2)
+        yield url
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=30)
+
+def test_broadcasts_reach_clients_of_every_worker(workers):
+    with connect(workers.replace("http", "ws") + "/ws") as ws:
+        ws.send(json.dumps({"action": "subscribe", "topics": ["alerts"], "replace": True}))
+        while json.loads(ws.recv(timeout=10))["type"] != "subscriptions":
+            pass
+        # A new connection per request, so the kernel spreads them over the workers
+        sent = 30
+        for _ in range(sent):
+            assert httpx.post(f"{workers}/test-anomaly/").status_code == 200
+        received = 0
+        while received < sent:
+            if json.loads(ws.recv(timeout=10))["type"] == "test_anomaly":
+                received += 1
+
+def test_followers_ignore_each_others_rollup_rows(monkeypatch):
+    from app.utils import rollups as rollups_module
+    from app.utils.pubsub import bus
+
+    source = rollups_module.Rollups()
+    now = time.time()
+    source.record_batch(np.array([0.1, 0.2, 0.9]), np.array([False, False, True]), now=now)
+    rows = source._drain_staging(now + 2)
+    for is_leader, expected in [(False, 0), (True, 3)]:
+        target = rollups_module.Rollups()
+        monkeypatch.setattr(rollups_module, "rollups", target)
+        monkeypatch.setattr(bus, "is_leader", is_leader)
+        for handler in bus.handlers["rollups.add"]:
+            handler(rows)
+        finest = target.series[min(target.series)]
+        assert int(finest.count.sum()) == expected
+
+def _rollup_total(url):
+    snapshot = httpx.get(f"{url}/rollups/").json()["resolutions"]
+    return sum(snapshot[min(snapshot, key=int)]["count"]) if snapshot else 0
+
+def _settled_rollup_total(url, expected=None):
+    """The rollup row count once every worker answers the same, over new connections"""
+    deadline = time.monotonic() + 15
+    while True:
+        totals = {_rollup_total(url) for _ in range(12)}
+        if len(totals) == 1 and (expected is None or totals == {expected}):
+            return totals.pop()
+        assert time.monotonic() < deadline, f"workers disagree: {sorted(totals)}, expected {expected}"
+        time.sleep(0.5)
+
+def test_rollups_count_each_row_once_on_every_worker(workers):
+    before = _settled_rollup_total(workers)
+    rows = np.random.default_rng(1).random((50, 5), dtype=np.float32)
+    batches = 20
+    for _ in range(batches):
+        assert httpx.post(f"{workers}/predict-anomaly/batch/", json={"features": rows.tolist()}).status_code == 200
+    _settled_rollup_total(workers, before + batches * len(rows))
+
+def test_scheduler_parks_inactive_jobs_until_woken():
+    from app.utils.scheduler import Scheduler
+
+    async def run():
+        scheduler, state, counts = Scheduler(), {"active": False}, []
+        job = scheduler.every(0.02, lambda: None, name="storm", active=lambda: state["active"])
+        await scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+            counts.append(job.runs)
+            state["active"] = True
+            scheduler.wake()
+            await asyncio.sleep(0.1)
+            counts.append(job.runs)
+            state["active"] = False
+            await asyncio.sleep(0.05)
+            counts.append(job.runs)
+            await asyncio.sleep(0.1)
+            counts.append(job.runs)
+        finally:
+            await scheduler.stop()
+        return counts
+
+    idle, woken, stopping, parked = asyncio.run(run())
+    assert idle == 0 and woken > 0 and parked == stopping
+
+def test_single_worker_runs_no_idle_alert_timers():
+    from app.utils.alerting import alert_manager
+    from app.utils.scheduler import scheduler
+
+    assert not alert_manager.suppressor.in_storm
+    assert "alert_state_share" not in scheduler.jobs
+    assert scheduler.jobs["alert_storm_check"].parked()
+
+def _receive_until_seq(ws, seq):
+    """Reply frames from /ws/ingest until every row up to `seq` is acknowledged"""
+    frames = []
+    while not frames or frames[-1]["seq"] < seq:
+        frames.append(json.loads(ws.receive_text()))
+    return frames
+
+def test_ingest_acknowledges_every_row(client):
+    rows = np.random.default_rng(2).random((10, 5), dtype=np.float32)
+    lines = "\n".join(json.dumps(row) for row in rows.tolist())
+    with client.websocket_connect("/ws/ingest?source=agent-1") as ws:
+        ready = json.loads(ws.receive_text())
+        assert ready["type"] == "ready" and ready["mode"] == "ack"
+        for _ in range(3):
+            ws.send_text(lines)
+        ws.send_bytes(rows.astype("<f4").tobytes())
+        frames = _receive_until_seq(ws, 40)
+    assert all(frame["type"] == "ack" for frame in frames)
+    assert sum(frame["count"] for frame in frames) == 40
+
+def test_ingest_results_mode_returns_scores(client):
+    rows = np.random.default_rng(3).random((5, 5), dtype=np.float32)
+    with client.websocket_connect("/ws/ingest?mode=results") as ws:
+        ws.receive_text()
+        ws.send_bytes(rows.astype("<f4").tobytes())
+        frames = _receive_until_seq(ws, 5)
+    assert frames[0]["first_seq"] == 1
+    assert sum(len(frame["anomaly_scores"]) for frame in frames) == 5
+
+@pytest.mark.parametrize("frame", [
+    "[NaN, 1, 2, 3, 4]",
+    np.array([[1, 2, np.inf, 3, 4]], dtype="<f4").tobytes(),
+    "[1, 2, 3]",
+    '{"features": [1, 2, 3, 4, 5], "source": 7}',
+], ids=["nan", "binary-inf", "wrong-width", "numeric-source"])
+def test_ingest_rejects_bad_frames_without_using_sequence_numbers(client, frame):
+    with client.websocket_connect("/ws/ingest") as ws:
+        ws.receive_text()
+        if isinstance(frame, bytes):
+            ws.send_bytes(frame)
+        else:
+            ws.send_text(frame)
+        ws.send_text("[1, 2, 3, 4, 5]\n[5, 4, 3, 2, 1]")
+        frames = _receive_until_seq(ws, 2)
+    errors = [error for frame in frames for error in frame.get("errors", [])]
+    assert len(errors) == 1 and errors[0]["after_seq"] == 0
+    assert errors[0]["detail"].startswith("Invalid frame")
+
+class FakeAgent:
+    """An agent that sends `frames` frames of `rows` rows, then disconnects once everything is acked
+
+    With `leave_after_ready`, it is gone as soon as it has read the ready frame:
+    every later reply fails to send.
+    """
+
+    def __init__(self, frames, rows, leave_after_ready=False):
+        self.frames = [{"type": "websocket.receive", "bytes": np.ones((rows, 5), dtype="<f4").tobytes()}
+                       for _ in range(frames)]
+        self.total = frames * rows
+        self.leave_after_ready = leave_after_ready
+        self.replies = []
+        self.all_acked = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.leave_after_ready and self.replies:
+            raise RuntimeError("Cannot call send once a close message has been sent")
+        self.replies.append(json.loads(message))
+        if self.replies[-1].get("seq") == self.total:
+            self.all_acked.set()
+
+    async def receive(self):
+        if self.frames:
+            return self.frames.pop(0)
+        await self.all_acked.wait()
+        return {"type": "websocket.disconnect"}
+
+async def _fake_scores(x, sources):
+    return {"count": len(x), "anomaly_count": 0, "anomaly_scores": [0.0] * len(x),
+            "is_anomalous": [False] * len(x), "top_features": [None] * len(x),
+            "threshold": 1.0, "timestamp": time.time()}
+
+def test_ingest_window_pauses_reading_until_acked(monkeypatch):
+    from app.utils import agent_ingest
+
+    monkeypatch.setattr(agent_ingest, "predict_anomaly_batch", _fake_scores)
+    agent = FakeAgent(frames=10, rows=10)
+    session = agent_ingest.AgentSession(agent, window=20, ack_interval_ms=1)
+    asyncio.run(asyncio.wait_for(session.run(), 5))
+    assert session.pauses > 0
+    assert session.acked == agent.replies[-1]["seq"] == 100
+
+def test_ingest_session_ends_when_agent_leaves_with_window_closed(monkeypatch):
+    from app.utils import agent_ingest
+
+    monkeypatch.setattr(agent_ingest, "predict_anomaly_batch", _fake_scores)
+    monkeypatch.setattr(agent_ingest, "AgentSession",
+                        functools.partial(agent_ingest.AgentSession, window=20, ack_interval_ms=1))
+    agents = agent_ingest.AgentIngest()
+    agent = FakeAgent(frames=10, rows=10, leave_after_ready=True)
+    asyncio.run(asyncio.wait_for(agents.serve(agent), 5))
+    assert not agents.sessions
+
+def test_rollup_timeseries_clamps_to_retained_range():
+    from app.utils.rollups import Rollups
+
+    rollups = Rollups()
+    now = rollups.staged_until + 0.5
+    rollups.record_batch(np.array([0.5, 0.7]), np.array([False, True]), now=now)
+    now += 120
+    rollups.tick(now)
+    series = rollups.timeseries(1.0, now, points=100000)
+    coarsest = rollups.series[series["source_resolution"]]
+    assert len(series["count"]) <= coarsest.size
+    assert sum(series["count"]) == 2
+    assert rollups.timeseries(1.0, 100.0)["count"] == []
+    with pytest.raises(ValueError):
+        rollups.timeseries(now, now - 60)
+
+@pytest.mark.parametrize("query,status", [
+    ("start=0&end=60", 200),
+    ("end=0", 200),
+    ("start=0&end=0", 400),
+    ("start=60&end=0", 400),
+    ("start=nan", 400),
+    ("end=inf", 400),
+])
+def test_rollup_timeseries_time_parameters(client, query, status):
+    response = client.get(f"/rollups/timeseries/?{query}")
+    assert response.status_code == status
+    if status == 200:
+        assert response.json()["count"] == []
+
+@pytest.mark.parametrize("since,reply", [
+    ("yesterday", "error"),
+    ([1], "error"),
+    (True, "error"),
+    (float("nan"), "rollup_snapshot"),
+    (None, "rollup_snapshot"),
+])
+def test_rollup_sync_validates_since(client, since, reply):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"action": "sync", "since": since}))
+        assert _receive_type(ws, {"error", "rollup_snapshot", "rollup_delta"})["type"] == reply
+        # The connection survives a bad request
+        ws.send_text(json.dumps({"action": "unsubscribe", "topics": []}))
+        assert _receive_type(ws, {"subscriptions"})["type"] == "subscriptions"
+
+def test_history_pages_come_straight_from_the_time_index(tmp_path):
+    from app.utils.storage import EventStore
+
+    async def run():
+        store = EventStore(path=str(tmp_path / "history.db"))
+        await store.start()
+        selects = []
+
+        async def capture(query, clauses, params, limit):
+            selects.append((EventStore._sql(query, clauses), params + [limit]))
+            return []
+
+        store._select = capture
+        try:
+            await store.query_scores(start=0, end=9, cursor="5.0:3")
+            await store.query_scores(anomalous_only=True, source="host-a")
+            await store.query_alerts(severity=["HIGH"], cursor="5.0:3")
+            await store.query_alerts(start=0, severity=["HIGH", "LOW"])
+            return [store._connection.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                    for sql, params in selects]
+        finally:
+            await store.stop()
+
+    for plan in asyncio.run(run()):
+        assert not any("TEMP B-TREE" in step[-1] for step in plan), plan
+
+def test_suppressor_forgets_quiet_keys():
+    from app.utils.alerting import AlertSuppressor
+
+    suppressor = AlertSuppressor(storm_threshold=10 ** 6, storm_window=10)
+    for host in range(1000):
+        suppressor.admit(f"HIGH:host-{host}", cooldown=30, now=0.0)
+        suppressor.admit(f"HIGH:host-{host}", cooldown=30, now=1.0)
+    suppressor.admit("HIGH:host-new", cooldown=30, now=100.0)
+    assert set(suppressor._last_sent) == {"HIGH:host-new"}
+    assert not suppressor._suppressed
+
+def test_storm_exit_clears_storm_counts():
+    from app.utils.alerting import AlertSuppressor
+
+    suppressor = AlertSuppressor(storm_threshold=2, storm_window=10)
+    for host in range(5):
+        suppressor.admit(f"HIGH:host-{host}", cooldown=0, now=1.0)
+    assert suppressor.storm_transition(1.0) == "started"
+    assert suppressor.storm_transition(20.0) == "ended"
+    assert not suppressor.storm_counts
+
+def test_evicted_sources_lose_their_cooldowns():
+    from app.utils.alerting import AlertManager
+
+    alerts = AlertManager(max_sources=2)
+    alerts.update_rule("high_anomaly_score", threshold=1.0)
+
+    async def run():
+        for host in range(10):
+            await alerts.process_anomaly({"anomaly_score": 5.0, "is_anomalous": True, "source": f"host-{host}"})
+
+    asyncio.run(run())
+    sources = {key.split(":", 1)[1] for key in alerts.suppressor._last_sent if ":" in key}
+    assert sources <= set(alerts.source_states)
+
+@pytest.mark.parametrize("host", [7, ["web-1"], {"name": "web-1"}])
+def test_log_records_with_non_string_hosts_are_rejected_alone(host):
+    from app.utils.sources import LogSource
+
+    source = LogSource()
+    lines = [json.dumps({"features": [1, 2, 3, 4, 5], "host": "web-1"}),
+             json.dumps({"features": [1, 2, 3, 4, 5], "host": host}),
+             '<14>Oct 17 02:00:00 web-2 agent: {"features":[1,2,3,4,5],"host":null}']
+    entries = [source._parse(line) for line in lines]
+    assert [entry and entry["host"] for entry in entries] == ["web-1", None, "web-2"]
+    assert source.get_stats()["parse_errors"] == 1
+
+@pytest.mark.parametrize("spread", [1.0, 3.0])
+def test_backends_agree_with_eager_torch(spread):
+    from app.config import MODEL_PATH
+    from app.models.backends import EXACT_BACKENDS, QUANTIZED_RTOL, TorchBackend, compare_backends
+    from app.models.registry import load_model
+
+    model = load_model(MODEL_PATH)
+    x = np.random.default_rng(4).normal(0.0, spread, (256, model.encoder[0].in_features)).astype(np.float32)
+    largest = max(1.0, float(TorchBackend(model).score(x).max()))
+    results = compare_backends(model, x)
+    for name in EXACT_BACKENDS:
+        assert results[name]["max_abs_error"] <= 1e-5 * largest, (name, results[name])
+    assert results["quantized"]["max_abs_error"] <= QUANTIZED_RTOL * largest
+
+@pytest.fixture
+def scoring(monkeypatch):
+    """A fresh score cache, and a count of the rows that actually reach the model"""
+    from app.utils import prediction
+    from app.utils.score_cache import ScoreCache
+
+    cache = ScoreCache(max_size=100, ttl=None, precision=1e-3, max_batch_rows=1000, enabled=True)
+    scored = []
+
+    async def run(fn, x, *args):
+        scored.append(len(x))
+        return fn(x, *args)
+
+    monkeypatch.setattr(prediction, "score_cache", cache)
+    monkeypatch.setattr(prediction.inference_executor, "run", run)
+    return prediction, cache, scored
+
+def test_score_cache_hits_skip_scoring(scoring):
+    prediction, cache, scored = scoring
+    x = np.random.default_rng(5).random((4, 5), dtype=np.float32)
+    first = asyncio.run(prediction._error_rows(x, None))
+    # Two rows seen before, two new ones within the cache's precision of each other
+    again = np.concatenate([x[:2], x[2:] + 1.0])
+    second = asyncio.run(prediction._error_rows(again, None))
+    assert scored == [4, 2]
+    assert np.allclose(second[:2], first[:2])
+    assert cache.get_stats()["hits"] == 2
+
+def test_score_cache_drops_scores_from_a_replaced_model(scoring, monkeypatch):
+    prediction, cache, scored = scoring
+    x = np.random.default_rng(6).random((3, 5), dtype=np.float32)
+
+    async def reload_mid_flight(fn, x, *args):
+        cache.clear()  # As a reload would, while this batch is still being scored
+        return fn(x, *args)
+
+    monkeypatch.setattr(prediction.inference_executor, "run", reload_mid_flight)
+    asyncio.run(prediction._error_rows(x, None))
+    assert cache.get_stats()["size"] == 0
+
+def test_score_cache_cleared_on_model_reload():
+    from app.config import MODEL_PATH
+    from app.models.registry import registry
+    from app.utils.prediction import score_cache
+
+    key = score_cache.keys(np.zeros((1, 5)), [None])
+    score_cache.put_many(key, [0.5], [[0.5] * 5], score_cache.generation)
+    generation = score_cache.generation
+    registry.reload(MODEL_PATH)
+    assert score_cache.get_many(key) == [None]
+    assert score_cache.generation == generation + 1
+
+def test_score_cache_evicts_least_recently_used():
+    from app.utils.score_cache import ScoreCache
+
+    cache = ScoreCache(max_size=2, ttl=None, precision=1.0, enabled=True)
+    a, b, c = cache.keys(np.array([[1.0], [2.0], [3.0]]), [None] * 3)
+    cache.put_many([a, b], [1.0, 2.0], [[1.0], [2.0]], cache.generation)
+    cache.get_many([a])
+    cache.put_many([c], [3.0], [[3.0]], cache.generation)
+    assert cache.get_many([a, b, c]) == [(1.0, [1.0]), None, (3.0, [3.0])]
+    assert cache.evictions == 1
@@ -46,6 +46,29 @@ async def test_anomaly_detection():
                 print(f"❌ Anomaly detection failed: {response.status}")
                 return False
 
+async def test_batch_prediction():
+    """Test bulk anomaly detection endpoint"""
+    print("📦 Testing batch prediction...")
+    test_data = {
+        "features": [
+            [1.0, 2.0, 3.0, 4.0, 5.0],
+            [10.0, 10.0, 10.0, 10.0, 10.0]
+        ]
+    }
+    
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            "http://localhost:8000/predict-anomaly/batch/",
+            json=test_data
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                print(f"✅ Batch prediction: Scores={[round(s, 4) for s in data['anomaly_scores']]}, Anomalous={data['is_anomalous']}")
+                return len(data["anomaly_scores"]) == len(test_data["features"])
+            else:
+                print(f"❌ Batch prediction failed: {response.status}")
+                return False
+
 async def test_streaming_prediction():
     """Test streaming prediction endpoint"""
     print("📡 Testing streaming prediction...")
@@ -113,6 +136,7 @@ async def run_all_tests():
         ("Health Check", test_health_check),
         ("Dashboard Access", test_dashboard_access),
         ("Anomaly Detection", test_anomaly_detection),
+        ("Batch Prediction", test_batch_prediction),
         ("Streaming Prediction", test_streaming_prediction),
         ("WebSocket Connection", test_websocket_connection),
     ]
@@ -1,24 +1,213 @@
+import argparse
+import io
+import os
+import numpy as np
 import pandas as pd
 import torch
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
 from app.models.autoencoder import LogAutoEncoder
+from app.utils.preprocessing import fit_scaler, save_scaler, scaler_path_for
 
-df = pd.read_csv('data/logs.csv')
-X = torch.tensor(df.values, dtype=torch.float32)
-
-model = LogAutoEncoder(input_dim=X.shape[1])
-criterion = torch.nn.MSELoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-loader = DataLoader(TensorDataset(X), batch_size=2, shuffle=True)
-
-for epoch in range(10):
-    for batch in loader:
-        inp = batch[0]
-        out = model(inp)
-        loss = criterion(out, inp)
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-    print(f"Epoch {epoch+1}, Loss: {loss.item():.4f}")
-
-torch.save(model.state_dict(), "model.pt")
\ No newline at end of file
+def normalize(rows, scaler):
+    """Apply the same x * scale + offset transform the inference path uses"""
+    if scaler is None:
+        return rows
+    scale, offset = scaler
+    return rows * scale + offset
+
+class _ByteRange:
+    """File-like view of bytes [tell(), end) of an open file, for pandas to parse"""
+
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def read(self, size=-1):
+        remaining = max(0, self.end - self.f.tell())
+        return self.f.read(remaining if size is None or size < 0 else min(size, remaining))
+
+    def __iter__(self):
+        return iter(self.read().splitlines(keepends=True))
+
+def _line_start(f, offset, data_start):
+    """Offset of the first line starting at or after `offset`"""
+    if offset <= data_start:
+        return data_start
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+class CsvChunkDataset(IterableDataset):
+    """Streams shuffled mini-batches from a CSV read in fixed-size chunks
+
+    Each loader worker parses only its own byte range of the file, cut at line
+    boundaries, so parsing scales with the number of workers. Rows must not
+    contain quoted newlines.
+    """
+
+    def __init__(self, path, batch_size, chunk_size=100000, scaler=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.scaler = scaler
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+
+        with open(self.path, "rb") as f:
+            columns = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns
+            data_start = f.tell()
+            span = os.fstat(f.fileno()).st_size - data_start
+            # A line belongs to the shard it starts in, so every row is seen once per epoch
+            end = _line_start(f, data_start + span * (worker_id + 1) // num_workers, data_start)
+            f.seek(_line_start(f, data_start + span * worker_id // num_workers, data_start))
+
+            reader = pd.read_csv(_ByteRange(f, end), header=None, names=columns,
+                                 chunksize=self.chunk_size, dtype=np.float32)
+            for chunk in reader:
+                rows = torch.from_numpy(normalize(chunk.to_numpy(dtype=np.float32), self.scaler))
+                rows = rows[torch.randperm(len(rows))]
+                yield from rows.split(self.batch_size)
+
+class MemmapDataset(IterableDataset):
+    """Streams mini-batches from a memory-mapped .npy matrix in shuffled order"""
+
+    def __init__(self, path, batch_size, scaler=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.scaler = scaler
+        self.num_rows = np.load(path, mmap_mode="r").shape[0]
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+
+        data = np.load(self.path, mmap_mode="r")
+        starts = np.random.permutation(np.arange(0, self.num_rows, self.batch_size))
+        for start in starts[worker_id::num_workers]:
+            # Copy the slice out of the page cache so the batch is writable
+            batch = np.array(data[start:start + self.batch_size], dtype=np.float32)
+            yield torch.from_numpy(normalize(batch, self.scaler))
+
+def convert_csv_to_npy(csv_path, npy_path, chunk_size=100000):
+    """Convert a CSV to a .npy matrix chunk by chunk without loading it whole"""
+    columns = len(pd.read_csv(csv_path, nrows=0).columns)
+    rows = sum(len(chunk) for chunk in pd.read_csv(csv_path, chunksize=chunk_size, usecols=[0]))
+
+    out = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.float32, shape=(rows, columns))
+    offset = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, dtype=np.float32):
+        out[offset:offset + len(chunk)] = chunk.to_numpy(dtype=np.float32)
+        offset += len(chunk)
+    out.flush()
+    return rows, columns
+
+def open_dataset(path, batch_size, chunk_size, scaler=None):
+    """Pick the streaming dataset for a CSV or .npy file and its feature count"""
+    if path.endswith(".npy"):
+        dataset = MemmapDataset(path, batch_size, scaler)
+        input_dim = np.load(path, mmap_mode="r").shape[1]
+    else:
+        dataset = CsvChunkDataset(path, batch_size, chunk_size, scaler)
+        input_dim = len(pd.read_csv(path, nrows=0).columns)
+    return dataset, input_dim
+
+def save_checkpoint(path, model, optimizer, epoch, step):
+    """Write a resumable checkpoint atomically"""
+    tmp_path = f"{path}.tmp"
+    torch.save({
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "epoch": epoch,
+        "step": step
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+def train(args):
+    """Train the autoencoder over a streamed dataset"""
+    fitted, scaler = None, None
+    if args.normalize:
+        # One extra streaming pass; the scaler ships next to the model for inference
+        fitted = fit_scaler(args.data, args.chunk_size)
+        scaler = (fitted.scale_.astype(np.float32), fitted.min_.astype(np.float32))
+
+    dataset, input_dim = open_dataset(args.data, args.batch_size, args.chunk_size, scaler)
+
+    model = LogAutoEncoder(input_dim=input_dim)
+    criterion = torch.nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+
+    # Batches come pre-built from the dataset, so the loader does no collation
+    loader = DataLoader(
+        dataset,
+        batch_size=None,
+        num_workers=args.num_workers,
+        persistent_workers=args.num_workers > 0,
+        prefetch_factor=4 if args.num_workers > 0 else None
+    )
+
+    start_epoch, step = 0, 0
+    if args.resume:
+        checkpoint = torch.load(args.resume, map_location="cpu", weights_only=True)
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        # A mid-epoch checkpoint restarts that epoch from the beginning
+        start_epoch, step = checkpoint["epoch"], checkpoint["step"]
+        print(f"Resumed from {args.resume} at epoch {start_epoch + 1}, step {step}")
+
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.checkpoint_dir, "checkpoint.pt")
+
+    for epoch in range(start_epoch, args.epochs):
+        total_loss, batches = 0.0, 0
+        for inp in loader:
+            out = model(inp)
+            loss = criterion(out, inp)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item()
+            batches += 1
+            step += 1
+            if args.checkpoint_every and step % args.checkpoint_every == 0:
+                save_checkpoint(checkpoint_path, model, optimizer, epoch, step)
+
+        save_checkpoint(checkpoint_path, model, optimizer, epoch + 1, step)
+        print(f"Epoch {epoch+1}, Loss: {total_loss / max(1, batches):.4f}")
+
+    # The serving registry loads a plain state dict, plus the scaler beside it
+    torch.save(model.state_dict(), args.output)
+    if fitted is not None:
+        save_scaler(fitted, scaler_path_for(args.output))
+    elif os.path.exists(scaler_path_for(args.output)):
+        os.remove(scaler_path_for(args.output))
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the ZTA-ATDS log autoencoder")
+    parser.add_argument("--data", default="data/logs.csv", help="Training data (.csv or .npy)")
+    parser.add_argument("--output", default="model.pt", help="Where to write the trained state dict")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--chunk-size", type=int, default=100000, help="CSV rows read per chunk")
+    parser.add_argument("--num-workers", type=int, default=0, help="Data loading worker processes")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="Steps between checkpoints (0 = per epoch only)")
+    parser.add_argument("--no-normalize", dest="normalize", action="store_false",
+                        help="Train on raw features without fitting a MinMax scaler")
+    parser.add_argument("--resume", help="Checkpoint to resume training from")
+    parser.add_argument("--convert-npy", metavar="NPY_PATH",
+                        help="Convert --data from CSV to a memory-mappable .npy file and exit")
+    args = parser.parse_args()
+
+    if args.convert_npy:
+        rows, columns = convert_csv_to_npy(args.data, args.convert_npy, args.chunk_size)
+        print(f"Wrote {rows} x {columns} matrix to {args.convert_npy}")
+        return
+
+    train(args)
+
+if __name__ == "__main__":
+    main()